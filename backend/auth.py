@@ -1,17 +1,84 @@
+import asyncio
+import os
 import secrets
+import threading
+import time
 from datetime import datetime, timedelta
-from typing import Optional
-from sqlalchemy.orm import Session
+from typing import Dict, Optional, Tuple
+from fastapi import Header, HTTPException
+from sqlalchemy import delete, event, func, inspect, select, text
+from sqlalchemy.orm import Session, make_transient_to_detached
 from passlib.context import CryptContext
-from models import User, UserSession
-from database import get_db
+from jose import JWTError, jwt
+from models import User, UserSession, TokenRevocation
+from database import get_db, open_async_db
+from cache import TTLCache
+from password_pool import password_pool
+from metrics import SESSION_ROWS, SESSIONS_REAPED
 
 # Configuration du hachage des mots de passe
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Les hashes d'un coût différent de BCRYPT_ROUNDS sont recalculés à la connexion
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS)
 
 # Durée des sessions (7 jours)
 SESSION_EXPIRE_DAYS = 7
 
+# Suppression périodique des sessions expirées : lots de SESSION_REAP_BATCH_SIZE lignes,
+# espacés de SESSION_REAP_PAUSE secondes, toutes les SESSION_REAP_INTERVAL secondes
+SESSION_REAP_INTERVAL = float(os.getenv("SESSION_REAP_INTERVAL", "300"))
+SESSION_REAP_BATCH_SIZE = int(os.getenv("SESSION_REAP_BATCH_SIZE", "1000"))
+SESSION_REAP_PAUSE = float(os.getenv("SESSION_REAP_PAUSE", "0.1"))
+
+# Mode de session :
+# - cookie (défaut) : le cookie session_id est un identifiant opaque vérifié en base ;
+# - token : le cookie session_id est un jeton d'accès signé et court, vérifié sans
+#   requête SQL (l'utilisateur, actif, vient du cache des sessions) ; la session en
+#   base sert de jeton de rafraîchissement (POST /auth/refresh).
+SESSION_MODE = os.getenv("SESSION_MODE", "cookie").lower()
+SECRET_KEY = os.getenv("SECRET_KEY")
+TOKEN_ALGORITHM = "HS256"
+ACCESS_TOKEN_EXPIRE_SECONDS = int(os.getenv("ACCESS_TOKEN_EXPIRE_SECONDS", "900"))
+# Intervalle de synchronisation des révocations émises par les autres workers
+TOKEN_REVOCATION_SYNC_INTERVAL = float(os.getenv("TOKEN_REVOCATION_SYNC_INTERVAL", "5"))
+if SESSION_MODE == "token" and not SECRET_KEY:
+    raise RuntimeError("SESSION_MODE=token requires SECRET_KEY")
+
+# Jeton des endpoints d'exploitation (/admin/*, /metrics) : sans lui, ils sont désactivés
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+
+# Cache des sessions résolues (session_id -> utilisateur), propre à chaque worker.
+# Le TTL borne la durée pendant laquelle un autre worker peut encore accepter
+# une session invalidée ailleurs.
+SESSION_CACHE_TTL = float(os.getenv("SESSION_CACHE_TTL", "60"))
+SESSION_CACHE_SIZE = int(os.getenv("SESSION_CACHE_SIZE", "10000"))
+session_cache = TTLCache(maxsize=SESSION_CACHE_SIZE, ttl=SESSION_CACHE_TTL)
+
+def require_admin(authorization: Optional[str] = Header(None)):
+    """Endpoints d'exploitation : 404 sans ADMIN_TOKEN, sinon `Authorization: Bearer <ADMIN_TOKEN>` exigé"""
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    scheme, _, token = (authorization or "").partition(" ")
+    if scheme.lower() != "bearer" or not secrets.compare_digest(token.encode(), ADMIN_TOKEN.encode()):
+        raise HTTPException(status_code=401, detail="Admin token required", headers={"WWW-Authenticate": "Bearer"})
+
+def _snapshot_user(user: User) -> User:
+    """Copie détachée de l'utilisateur, réutilisable par d'autres sessions DB"""
+    snapshot = User(**{
+        attr.key: getattr(user, attr.key) for attr in inspect(User).column_attrs
+    })
+    make_transient_to_detached(snapshot)
+    return snapshot
+
+def invalidate_user_sessions(user_id: int) -> int:
+    """Retire du cache toutes les sessions d'un utilisateur"""
+    return session_cache.delete_where(lambda _, user: user.id == user_id)
+
+@event.listens_for(User, "after_update")
+def _invalidate_updated_user(mapper, connection, target):
+    """Profil modifié ou compte désactivé : les sessions en cache sont périmées"""
+    invalidate_user_sessions(target.id)
+
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Vérifie si le mot de passe correspond au hash"""
     return pwd_context.verify(plain_password, hashed_password)
@@ -23,16 +90,36 @@ def get_password_hash(password: str) -> str:
         password = password[:72]
     return pwd_context.hash(password)
 
+def verify_and_update_password(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """Vérifie le mot de passe et retourne un nouveau hash si le coût a changé"""
+    return pwd_context.verify_and_update(plain_password, hashed_password)
+
+async def hash_password_async(password: str) -> str:
+    """Hash un mot de passe dans le pool bcrypt dédié"""
+    return await password_pool.submit(get_password_hash, password)
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """Vérifie un mot de passe dans le pool bcrypt dédié (avec rehash éventuel)"""
+    return await password_pool.submit(verify_and_update_password, plain_password, hashed_password)
+
+def delete_user_sessions(db: Session, user_id: int) -> int:
+    """Supprime toutes les sessions de l'utilisateur (sans valider la transaction)"""
+    # Supprimer les sessions (index user_id) plutôt que les désactiver :
+    # la table ne garde que des sessions utilisables
+    deleted = db.execute(delete(UserSession).where(UserSession.user_id == user_id)).rowcount
+    invalidate_user_sessions(user_id)
+    if deleted and SESSION_MODE == "token":
+        # Les jetons d'accès des sessions supprimées ne doivent plus être acceptés
+        token_revocations.revoke(db, user_id)
+    return deleted
+
 def create_session(db: Session, user_id: int) -> str:
     """Crée une nouvelle session pour l'utilisateur"""
     session_id = secrets.token_urlsafe(32)
     expires_at = datetime.utcnow() + timedelta(days=SESSION_EXPIRE_DAYS)
     
-    # Désactiver les anciennes sessions
-    db.query(UserSession).filter(
-        UserSession.user_id == user_id,
-        UserSession.is_active == True
-    ).update({"is_active": False})
+    # Une seule session par utilisateur
+    delete_user_sessions(db, user_id)
     
     # Créer la nouvelle session
     db_session = UserSession(
@@ -46,46 +133,127 @@ def create_session(db: Session, user_id: int) -> str:
     
     return session_id
 
+def _find_session(db: Session, session_id: str):
+    """(user_id, expires_at) de la session active et non expirée, lus dans l'index idx_session_lookup"""
+    return db.execute(
+        select(UserSession.user_id, UserSession.expires_at).where(
+            UserSession.session_id == session_id,
+            UserSession.is_active == True,
+            UserSession.expires_at > datetime.utcnow()
+        )
+    ).first()
+
+def create_access_token(user_id: int) -> str:
+    """Jeton d'accès signé (HS256), valable ACCESS_TOKEN_EXPIRE_SECONDS secondes"""
+    issued_at = time.time()
+    return jwt.encode({
+        "sub": str(user_id),
+        # Date d'émission précise : comparée aux révocations de l'utilisateur
+        "iat": issued_at,
+        "exp": int(issued_at) + ACCESS_TOKEN_EXPIRE_SECONDS,
+    }, SECRET_KEY, algorithm=TOKEN_ALGORITHM)
+
+def decode_access_token(token: str) -> Optional[int]:
+    """Id de l'utilisateur si le jeton est valide, non expiré et non révoqué"""
+    try:
+        claims = jwt.decode(token, SECRET_KEY, algorithms=[TOKEN_ALGORITHM])
+        user_id = int(claims["sub"])
+        issued_at = float(claims["iat"])
+    except (JWTError, KeyError, ValueError):
+        return None
+    if token_revocations.is_revoked(user_id, issued_at):
+        return None
+    return user_id
+
 def get_current_user(session_id: str, db: Session) -> Optional[User]:
     """Récupère l'utilisateur à partir de la session"""
     if not session_id:
         return None
     
+    # Jeton signé : vérification sans requête SQL, utilisateur en cache par id
+    if SESSION_MODE == "token":
+        user_id = decode_access_token(session_id)
+        if user_id is None:
+            return None
+        cache_key = f"token:{user_id}"
+    else:
+        cache_key = session_id
+    
+    # Session déjà résolue : rattacher la copie en cache sans requête SQL
+    cached_user = session_cache.get(cache_key)
+    if cached_user is not None:
+        return db.merge(cached_user, load=False)
+    
+    if SESSION_MODE == "token":
+        # Compte désactivé : jeton refusé, comme une session en base
+        user = db.query(User).filter(User.id == user_id, User.is_active == True).first()
+        if user:
+            session_cache.set(cache_key, _snapshot_user(user))
+        return user
+    
     # Chercher la session active et non expirée
-    session = db.query(UserSession).filter(
-        UserSession.session_id == session_id,
-        UserSession.is_active == True,
-        UserSession.expires_at > datetime.utcnow()
-    ).first()
+    session = _find_session(db, session_id)
     
     if not session:
         return None
     
     # Retourner l'utilisateur associé
-    return db.query(User).filter(
+    user = db.query(User).filter(
         User.id == session.user_id,
         User.is_active == True
     ).first()
+    
+    if user:
+        # Ne jamais garder en cache au-delà de l'expiration de la session
+        remaining = (session.expires_at - datetime.utcnow()).total_seconds()
+        session_cache.set(session_id, _snapshot_user(user), ttl=remaining)
+    
+    return user
+
+def refresh_access_token(refresh_token: str, db: Session) -> Optional[str]:
+    """Nouveau jeton d'accès si la session de rafraîchissement est valide (mode token)"""
+    if not refresh_token:
+        return None
+    session = _find_session(db, refresh_token)
+    if not session:
+        return None
+    # Compte désactivé : plus de nouveau jeton
+    active = db.execute(select(User.id).where(User.id == session.user_id, User.is_active == True)).first()
+    if not active:
+        return None
+    return create_access_token(session.user_id)
 
 def invalidate_session(session_id: str, db: Session) -> bool:
     """Invalide une session (logout)"""
-    session = db.query(UserSession).filter(
-        UserSession.session_id == session_id,
-        UserSession.is_active == True
-    ).first()
+    session_cache.delete(session_id)
     
-    if session:
-        session.is_active = False
-        db.commit()
-        return True
-    return False
+    deleted = db.execute(delete(UserSession).where(UserSession.session_id == session_id)).rowcount
+    db.commit()
+    return deleted > 0
 
-def authenticate_user(username: str, password: str, db: Session) -> Optional[User]:
-    """Authentifie un utilisateur"""
-    user = db.query(User).filter(
+def invalidate_tokens(access_token: Optional[str], refresh_token: Optional[str], db: Session) -> bool:
+    """Logout en mode token : supprime la session de rafraîchissement et révoque les jetons d'accès"""
+    user_id = decode_access_token(access_token) if access_token else None
+    if user_id is None and refresh_token:
+        session = _find_session(db, refresh_token)
+        user_id = session.user_id if session else None
+    if refresh_token:
+        db.execute(delete(UserSession).where(UserSession.session_id == refresh_token))
+    if user_id is not None:
+        token_revocations.revoke(db, user_id)
+    db.commit()
+    return user_id is not None
+
+def get_active_user(username: str, db: Session) -> Optional[User]:
+    """Récupère un utilisateur actif par son nom"""
+    return db.query(User).filter(
         User.username == username,
         User.is_active == True
     ).first()
+
+def authenticate_user(username: str, password: str, db: Session) -> Optional[User]:
+    """Authentifie un utilisateur"""
+    user = get_active_user(username, db)
     
     if not user:
         return None
@@ -95,9 +263,153 @@ def authenticate_user(username: str, password: str, db: Session) -> Optional[Use
     
     return user
 
-def cleanup_expired_sessions(db: Session):
-    """Nettoie les sessions expirées"""
-    db.query(UserSession).filter(
-        UserSession.expires_at < datetime.utcnow()
-    ).update({"is_active": False})
-    db.commit()
\ No newline at end of file
+def delete_expired_sessions(db: Session, batch_size: int) -> int:
+    """Supprime un lot de sessions expirées, dans l'ordre de l'index expires_at"""
+    ids = [session_id for (session_id,) in db.execute(
+        select(UserSession.id).where(
+            UserSession.expires_at < datetime.utcnow()
+        ).order_by(UserSession.expires_at).limit(batch_size)
+    )]
+    if ids:
+        db.execute(delete(UserSession).where(UserSession.id.in_(ids)))
+    db.commit()
+    return len(ids)
+
+def count_sessions(db: Session) -> int:
+    """Nombre de lignes de user_sessions"""
+    if db.get_bind().dialect.name in ("mysql", "mariadb"):
+        # Estimation InnoDB : un COUNT(*) parcourrait toute la table
+        return db.execute(text(
+            "SELECT TABLE_ROWS FROM information_schema.TABLES "
+            "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'user_sessions'"
+        )).scalar() or 0
+    return db.execute(select(func.count(UserSession.id))).scalar()
+
+class SessionReaper:
+    """Suppression périodique des sessions expirées, par petits lots
+
+    Chaque lot est une transaction courte qui ne verrouille que les lignes
+    supprimées. Plusieurs workers peuvent tourner en parallèle : un lot
+    déjà supprimé ailleurs ne supprime simplement rien.
+    """
+
+    def __init__(self, interval: float, batch_size: int, pause: float):
+        self.interval = interval
+        self.batch_size = batch_size
+        self.pause = pause
+        self.runs = 0
+        self.reaped = 0
+        self.table_rows: Optional[int] = None
+
+    async def reap(self) -> int:
+        """Supprime toutes les sessions expirées et met à jour la taille de la table"""
+        total = 0
+        async with open_async_db() as db:
+            while True:
+                deleted = await db.run(delete_expired_sessions, self.batch_size)
+                total += deleted
+                SESSIONS_REAPED.inc(deleted)
+                if deleted < self.batch_size:
+                    break
+                # Laisser passer les requêtes des utilisateurs entre deux lots
+                await asyncio.sleep(self.pause)
+            self.table_rows = await db.run(count_sessions)
+        self.runs += 1
+        self.reaped += total
+        return total
+
+    async def run(self):
+        """Boucle de nettoyage (tâche de fond de l'application)"""
+        while True:
+            try:
+                reaped = await self.reap()
+                if reaped:
+                    print(f"🧹 {reaped} expired session(s) deleted")
+            except Exception as e:
+                print(f"⚠️ Could not delete expired sessions: {e}")
+            await asyncio.sleep(self.interval)
+
+    def stats(self) -> dict:
+        return {
+            "interval": self.interval,
+            "batch_size": self.batch_size,
+            "runs": self.runs,
+            "reaped": self.reaped,
+            "table_rows": self.table_rows,
+        }
+
+session_reaper = SessionReaper(SESSION_REAP_INTERVAL, SESSION_REAP_BATCH_SIZE, SESSION_REAP_PAUSE)
+SESSION_ROWS.set_function(lambda: session_reaper.table_rows)
+
+
+class TokenRevocationList:
+    """Révocations des jetons d'accès, par utilisateur (mode token)
+
+    Une révocation refuse tous les jetons de l'utilisateur émis avant elle
+    (une session par utilisateur : logout ou connexion ailleurs). Elle est
+    écrite en base pour les autres workers, qui la chargent toutes les
+    TOKEN_REVOCATION_SYNC_INTERVAL secondes, et n'est gardée que pendant la
+    durée de vie d'un jeton : la liste reste de la taille des déconnexions
+    récentes, et la vérification d'un jeton se fait en mémoire.
+    """
+
+    def __init__(self, ttl: float, interval: float):
+        self.ttl = ttl
+        self.interval = interval
+        self.syncs = 0
+        self._revoked: Dict[int, float] = {}
+        self._lock = threading.Lock()
+
+    def _remember(self, user_id: int, revoked_at: float):
+        with self._lock:
+            if revoked_at > self._revoked.get(user_id, 0):
+                self._revoked[user_id] = revoked_at
+
+    def revoke(self, db: Session, user_id: int):
+        """Révoque les jetons déjà émis (validé avec la transaction de l'appelant)"""
+        revoked_at = datetime.utcnow()
+        db.merge(TokenRevocation(user_id=user_id, revoked_at=revoked_at))
+        self._remember(user_id, _timestamp(revoked_at))
+
+    def is_revoked(self, user_id: int, issued_at: float) -> bool:
+        with self._lock:
+            return issued_at < self._revoked.get(user_id, 0)
+
+    def sync(self, db: Session) -> int:
+        """Charge les révocations encore utiles et supprime les autres"""
+        horizon = datetime.utcnow() - timedelta(seconds=self.ttl)
+        db.execute(delete(TokenRevocation).where(TokenRevocation.revoked_at < horizon))
+        rows = db.execute(
+            select(TokenRevocation.user_id, TokenRevocation.revoked_at).where(
+                TokenRevocation.revoked_at >= horizon
+            )
+        ).all()
+        db.commit()
+        for user_id, revoked_at in rows:
+            self._remember(user_id, _timestamp(revoked_at))
+        # Oublier les révocations plus anciennes que le plus vieux jeton valide
+        limit = _timestamp(horizon)
+        with self._lock:
+            self._revoked = {user_id: at for user_id, at in self._revoked.items() if at >= limit}
+        self.syncs += 1
+        return len(rows)
+
+    async def run(self):
+        """Boucle de synchronisation (tâche de fond de l'application)"""
+        while True:
+            try:
+                async with open_async_db() as db:
+                    await db.run(self.sync)
+            except Exception as e:
+                print(f"⚠️ Could not sync token revocations: {e}")
+            await asyncio.sleep(self.interval)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"revoked_users": len(self._revoked), "syncs": self.syncs}
+
+def _timestamp(value: datetime) -> float:
+    """Horodatage POSIX d'une date UTC naïve"""
+    return (value - datetime(1970, 1, 1)).total_seconds()
+
+token_revocations = TokenRevocationList(ACCESS_TOKEN_EXPIRE_SECONDS, TOKEN_REVOCATION_SYNC_INTERVAL)
\ No newline at end of file
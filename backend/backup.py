@@ -0,0 +1,189 @@
+"""Export et import en flux des données du forum (NDJSON, compressé ou non)
+
+Export : chaque table est lue avec un curseur côté serveur (stream_results),
+ligne à ligne, dans une seule transaction pour obtenir un instantané cohérent.
+Import : insertions par lots (executemany, sans ORM), une transaction par lot.
+Après chaque lot, la position dans le fichier est enregistrée dans un point
+de reprise : un import interrompu reprend là où il s'était arrêté. Un arrêt
+entre la validation d'un lot et l'écriture du point de reprise fait relire
+ce lot : le premier lot d'une reprise ignore donc les clés déjà présentes.
+
+La mémoire utilisée dépend de la taille des lots, pas de celle de la base.
+Les timelines matérialisées ne sont pas exportées : elles sont reconstruites
+à la lecture suivante.
+
+Usage :
+    python backup.py export forum.ndjson.gz [--batch-size 5000]
+    python backup.py import forum.ndjson.gz [--batch-size 5000] [--checkpoint forum.ndjson.gz.checkpoint]
+"""
+import argparse
+import gzip
+import json
+import os
+import time
+from datetime import date, datetime
+from typing import IO, Iterator, List, Optional, Tuple
+from sqlalchemy import DateTime, func, insert, select
+from sqlalchemy.engine import Connection
+from database import engine
+from models import User, Post, Comment, PostLike, CommentLike, UserSession, Follow
+from migrate import upgrade
+
+# Tables exportées, dans l'ordre des clés étrangères (les parents d'abord)
+EXPORT_MODELS = (User, Post, Comment, PostLike, CommentLike, UserSession, Follow)
+TABLES = {model.__tablename__: model.__table__ for model in EXPORT_MODELS}
+
+def open_dump(path: str, mode: str) -> IO[str]:
+    """Ouvre le fichier d'export en texte, compressé en gzip si son nom finit par .gz"""
+    if path.endswith(".gz"):
+        return gzip.open(path, mode + "t", encoding="utf-8")
+    return open(path, mode, encoding="utf-8")
+
+def _json_default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"Type not serializable: {type(value).__name__}")
+
+def export_rows(conn: Connection, table, batch_size: int) -> Iterator[dict]:
+    """Lignes d'une table par ordre d'id, lues par lots depuis un curseur côté serveur"""
+    result = conn.execution_options(stream_results=True, max_row_buffer=batch_size).execute(
+        select(table).order_by(table.c.id)
+    )
+    for partition in result.mappings().partitions(batch_size):
+        for row in partition:
+            yield row
+
+def export_data(path: str, batch_size: int = 5000) -> dict:
+    """Écrit toutes les tables dans `path`, retourne le nombre de lignes par table"""
+    report = {}
+    with engine.connect() as conn, open_dump(path, "w") as output:
+        # Une seule transaction : toutes les tables sont lues depuis le même instantané
+        with conn.begin():
+            for name, table in TABLES.items():
+                start = time.perf_counter()
+                count = 0
+                for row in export_rows(conn, table, batch_size):
+                    output.write(json.dumps({"table": name, "row": dict(row)}, default=_json_default) + "\n")
+                    count += 1
+                report[name] = count
+                print(f"✅ {name} : {count} ligne(s) en {time.perf_counter() - start:.1f}s")
+    return report
+
+def _datetime_columns(table) -> List[str]:
+    return [column.name for column in table.columns if isinstance(column.type, DateTime)]
+
+DATETIME_COLUMNS = {name: _datetime_columns(table) for name, table in TABLES.items()}
+
+def decode_row(name: str, row: dict) -> dict:
+    """Reconvertit les dates ISO 8601 de l'export"""
+    for column in DATETIME_COLUMNS[name]:
+        if row.get(column) is not None:
+            row[column] = datetime.fromisoformat(row[column])
+    if name == "users":
+        # Les timelines ne sont pas exportées : elles seront reconstruites à la première lecture
+        row["timeline_built_at"] = None
+        row["timeline_read_at"] = None
+    return row
+
+def read_checkpoint(path: str) -> Tuple[int, dict]:
+    """Nombre de lignes du fichier déjà importées et lignes insérées par table (0 sans point de reprise)"""
+    if not os.path.exists(path):
+        return 0, {}
+    with open(path, encoding="utf-8") as file:
+        state = json.load(file)
+    return state["line"], state["rows"]
+
+def write_checkpoint(path: str, line: int, report: dict):
+    # Écriture atomique : un arrêt pendant l'écriture laisse le point de reprise précédent intact
+    temporary = path + ".tmp"
+    with open(temporary, "w", encoding="utf-8") as file:
+        json.dump({"line": line, "rows": report}, file)
+    os.replace(temporary, path)
+
+def insert_batch(conn: Connection, table, batch: List[dict], ignore_duplicates: bool):
+    """Insère un lot ; avec `ignore_duplicates`, les lignes dont l'id existe déjà sont ignorées"""
+    stmt = insert(table)
+    if ignore_duplicates:
+        stmt = stmt.prefix_with("IGNORE", dialect="mysql").prefix_with(
+            "IGNORE", dialect="mariadb"
+        ).prefix_with("OR IGNORE", dialect="sqlite")
+    conn.execute(stmt, batch)
+
+def import_data(path: str, checkpoint: str, batch_size: int = 5000) -> dict:
+    """Importe `path` par lots, en reprenant après la dernière ligne enregistrée dans `checkpoint`"""
+    skip, imported = read_checkpoint(checkpoint)
+    resuming = os.path.exists(checkpoint)
+    if resuming:
+        print(f"↪️ Reprise après la ligne {skip}")
+    report = {name: imported.get(name, 0) for name in TABLES}
+    # Point de reprise initial : un arrêt après le premier lot est aussi une reprise
+    write_checkpoint(checkpoint, skip, report)
+    start = time.perf_counter()
+
+    with engine.connect() as conn, open_dump(path, "r") as source:
+        batch: List[dict] = []
+        batch_table: Optional[str] = None
+        batch_end = skip
+        line_number = 0
+
+        def flush():
+            nonlocal batch, resuming
+            if batch:
+                # Seul le premier lot d'une reprise peut avoir été validé sans point de reprise
+                with conn.begin():
+                    insert_batch(conn, TABLES[batch_table], batch, resuming)
+                # Lignes ignorées comprises : elles avaient été validées avant l'arrêt
+                report[batch_table] += len(batch)
+                resuming = False
+                batch = []
+                # Le lot est validé : une reprise repartira de la ligne suivante
+                write_checkpoint(checkpoint, batch_end, report)
+
+        for line in source:
+            line_number += 1
+            if line_number <= skip:
+                continue
+            record = json.loads(line)
+            name = record["table"]
+            if name not in TABLES:
+                raise SystemExit(f"❌ Ligne {line_number} : table inconnue {name!r}")
+            # Un lot ne contient qu'une table (une seule instruction INSERT)
+            if batch and (name != batch_table or len(batch) >= batch_size):
+                flush()
+            batch_table = name
+            batch.append(decode_row(name, record["row"]))
+            batch_end = line_number
+            if line_number % (batch_size * 50) == 0:
+                print(f"   ligne {line_number} ({(line_number - skip) / (time.perf_counter() - start):.0f}/s)")
+        flush()
+
+    print(f"✅ Import terminé en {time.perf_counter() - start:.1f}s")
+    return report
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export / import en flux des données du forum (NDJSON)")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    export_parser = subparsers.add_parser("export", help="Exporter la base dans un fichier NDJSON (.gz : compressé)")
+    export_parser.add_argument("path", help="Fichier de sortie")
+    export_parser.add_argument("--batch-size", type=int, default=5000, help="Lignes lues par aller-retour")
+    import_parser = subparsers.add_parser("import", help="Importer un fichier NDJSON dans une base vide")
+    import_parser.add_argument("path", help="Fichier d'export")
+    import_parser.add_argument("--batch-size", type=int, default=5000, help="Lignes par INSERT (et par transaction)")
+    import_parser.add_argument("--checkpoint", help="Point de reprise (défaut : <fichier>.checkpoint)")
+    args = parser.parse_args()
+
+    # Les instructions ne sont pas journalisées pendant l'export/import
+    engine.echo = False
+
+    if args.command == "export":
+        report = export_data(args.path, batch_size=args.batch_size)
+        print(f"✅ Export terminé : {report}")
+    else:
+        checkpoint = args.checkpoint or args.path + ".checkpoint"
+        upgrade(engine)
+        if not os.path.exists(checkpoint):
+            with engine.connect() as conn:
+                if conn.execute(select(func.count(User.id))).scalar():
+                    raise SystemExit("❌ La base contient déjà des utilisateurs : importez dans une base vide")
+        report = import_data(args.path, checkpoint, batch_size=args.batch_size)
+        print(f"✅ Lignes importées : {report}")
\ No newline at end of file
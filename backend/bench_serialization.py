@@ -0,0 +1,108 @@
+"""Banc d'essai de la sérialisation d'une page de posts (CPU, sans base de données)
+
+Compare, sur une page de posts construite en mémoire :
+- le chemin précédent : PostSchema.from_orm par post, revalidation contre
+  response_model par FastAPI (serialize_response), encodage par JSONResponse ;
+- le chemin rapide : RowSerializer et FastJSONResponse (orjson).
+
+Les deux corps de réponse sont d'abord comparés octet par octet.
+
+Usage :
+    python bench_serialization.py [--page-size 20] [--pages 2000]
+"""
+import argparse
+import asyncio
+import time
+from datetime import datetime, timedelta
+from typing import List
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_response_field
+from models import User, Post
+from schemas import Post as PostSchema
+from enrichment import serialize_post
+from serialization import FastJSONResponse
+
+def build_page(page_size: int) -> List[Post]:
+    """Page de posts transitoires (auteurs inclus), dates avec microsecondes"""
+    start = datetime(2024, 3, 1, 12, 30, 15, 123456)
+    authors = [
+        User(
+            id=index + 1,
+            username=f"user{index}",
+            email=f"user{index}@example.com",
+            display_name=f"Utilisateur n°{index} ✨",
+            bio="Développeur passionné 🚀" if index % 2 else None,
+            avatar_url=None,
+            is_active=True,
+            created_at=start,
+            updated_at=start + timedelta(days=index),
+        )
+        for index in range(5)
+    ]
+    return [
+        Post(
+            id=index + 1,
+            user_id=authors[index % len(authors)].id,
+            author=authors[index % len(authors)],
+            content=f"Post n°{index} : « bonjour » \"tout le monde\" 😊\n" * 3,
+            image_url=f"https://example.com/{index}.png" if index % 3 == 0 else None,
+            like_count=index * 7,
+            comment_count=index,
+            created_at=start - timedelta(minutes=index, microseconds=index),
+            updated_at=start,
+        )
+        for index in range(page_size)
+    ]
+
+async def previous_path(field, posts: List[Post], liked_ids: set) -> bytes:
+    result = []
+    for post in posts:
+        post_data = PostSchema.from_orm(post)
+        post_data.is_liked = post.id in liked_ids
+        result.append(post_data)
+    content = await serialize_response(field=field, response_content=result)
+    return JSONResponse(content).body
+
+def fast_path(posts: List[Post], liked_ids: set) -> bytes:
+    return FastJSONResponse([serialize_post(post, is_liked=post.id in liked_ids) for post in posts]).body
+
+async def measure(page_size: int, pages: int) -> dict:
+    field = create_response_field(name="Response_get_posts", type_=List[PostSchema], mode="serialization")
+    posts = build_page(page_size)
+    liked_ids = {post.id for post in posts[::2]}
+
+    previous_body = await previous_path(field, posts, liked_ids)
+    fast_body = fast_path(posts, liked_ids)
+    if previous_body != fast_body:
+        raise SystemExit("❌ Les deux chemins ne produisent pas les mêmes octets")
+
+    timings = {}
+    for name in ("previous", "fast"):
+        start = time.process_time()
+        for _ in range(pages):
+            if name == "previous":
+                await previous_path(field, posts, liked_ids)
+            else:
+                fast_path(posts, liked_ids)
+        timings[name] = (time.process_time() - start) / pages * 1e6
+    return {
+        "page_size": page_size,
+        "bytes": len(fast_body),
+        "previous_us": timings["previous"],
+        "fast_us": timings["fast"],
+        "saved_us": timings["previous"] - timings["fast"],
+        "speedup": timings["previous"] / timings["fast"],
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Banc d'essai de la sérialisation d'une page de posts")
+    parser.add_argument("--page-size", type=int, default=20, help="Posts par page")
+    parser.add_argument("--pages", type=int, default=2000, help="Pages sérialisées par chemin")
+    args = parser.parse_args()
+
+    report = asyncio.run(measure(args.page_size, args.pages))
+    print(f"✅ Réponses identiques ({report['bytes']} octets pour {report['page_size']} posts)")
+    print(f"   chemin précédent : {report['previous_us']:.0f} µs CPU par page")
+    print(f"   chemin rapide    : {report['fast_us']:.0f} µs CPU par page")
+    print(f"   gain             : {report['saved_us']:.0f} µs par page (x{report['speedup']:.1f})")
\ No newline at end of file
@@ -0,0 +1,106 @@
+"""Compression des réponses JSON selon Accept-Encoding (brotli ou gzip)
+
+Seules les réponses JSON complètes (un seul message de corps) d'au moins
+COMPRESSION_MIN_SIZE octets sont compressées : en dessous, le gain ne
+couvre pas le coût CPU. Les réponses en flux (export NDJSON), vides (304)
+ou déjà encodées passent telles quelles.
+
+brotli est préféré quand le module est installé et que le client l'accepte
+(qualité COMPRESSION_BROTLI_QUALITY, adaptée à du contenu dynamique) ;
+sinon gzip (niveau COMPRESSION_GZIP_LEVEL).
+"""
+import gzip
+import os
+from typing import Optional
+from starlette.datastructures import Headers, MutableHeaders
+from metrics import COMPRESSION_SAVED_BYTES, RESPONSE_BODY_BYTES
+
+try:
+    import brotli
+except ImportError:  # brotli non installé : gzip seulement
+    brotli = None
+
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
+COMPRESSION_GZIP_LEVEL = int(os.getenv("COMPRESSION_GZIP_LEVEL", "6"))
+COMPRESSION_BROTLI_QUALITY = int(os.getenv("COMPRESSION_BROTLI_QUALITY", "4"))
+
+# Encodages proposés, par ordre de préférence
+ENCODINGS = ("br", "gzip") if brotli is not None else ("gzip",)
+
+def choose_encoding(accept_encoding: str) -> Optional[str]:
+    """Encodage préféré parmi ceux acceptés par le client (q=0 : refusé), ou None"""
+    accepted = {}
+    for part in accept_encoding.split(","):
+        coding, _, params = part.partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[coding.strip().lower()] = quality
+    default = accepted.get("*", 0.0)
+    for encoding in ENCODINGS:
+        if accepted.get(encoding, default) > 0:
+            return encoding
+    return None
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=COMPRESSION_BROTLI_QUALITY)
+    # mtime=0 : même entrée, mêmes octets
+    return gzip.compress(body, compresslevel=COMPRESSION_GZIP_LEVEL, mtime=0)
+
+class CompressionMiddleware:
+    """Middleware ASGI : compression des réponses JSON au-delà du seuil"""
+
+    def __init__(self, app, minimum_size: int = COMPRESSION_MIN_SIZE):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        encoding = choose_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        start_message = None
+
+        async def send_compressed(message):
+            nonlocal start_message
+            if message["type"] == "http.response.start":
+                # Différé : les en-têtes dépendent du corps
+                start_message = message
+                return
+            if start_message is None:
+                # Suite d'une réponse en flux, déjà commencée
+                await send(message)
+                return
+            start, start_message = start_message, None
+            body = message.get("body", b"")
+            headers = MutableHeaders(scope=start)
+            if (
+                message.get("more_body")
+                or len(body) < self.minimum_size
+                or not headers.get("content-type", "").startswith("application/json")
+                or "content-encoding" in headers
+            ):
+                await send(start)
+                await send(message)
+                return
+
+            # La réponse dépend de Accept-Encoding (caches partagés)
+            headers.add_vary_header("Accept-Encoding")
+            if encoding is not None:
+                compressed = compress(body, encoding)
+                if len(compressed) < len(body):
+                    COMPRESSION_SAVED_BYTES.inc(len(body) - len(compressed), encoding)
+                    body = compressed
+                    headers["Content-Encoding"] = encoding
+                    headers["Content-Length"] = str(len(body))
+            RESPONSE_BODY_BYTES.inc(len(body), headers.get("content-encoding", "identity"))
+            await send(start)
+            await send({"type": "http.response.body", "body": body})
+
+        await self.app(scope, receive, send_compressed)
\ No newline at end of file
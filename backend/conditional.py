@@ -0,0 +1,110 @@
+"""Requêtes conditionnelles (ETag / If-None-Match) des routes de lecture
+
+L'ETag d'une page est calculé à partir des lignes déjà chargées, avant toute
+sérialisation : pour chaque élément, son id, son updated_at, ses compteurs
+dénormalisés et ses champs affichés, ainsi que ceux de son auteur, plus les
+likes de l'utilisateur courant et la variante de la réponse (liste, détail,
+compact). Si le client présente cet ETag dans If-None-Match, la route répond
+304 sans construire ni encoder le corps.
+
+Les ETag sont faibles (W/) : le corps peut être servi compressé ou non (voir
+compression.py). Cache-Control `private, no-cache` : le navigateur garde la
+réponse mais la revalide à chaque lecture, et aucun cache partagé ne la
+conserve (is_liked dépend de la session).
+"""
+from hashlib import blake2b
+from operator import attrgetter
+from typing import Iterable, Optional, Tuple
+from fastapi import Response
+from sqlalchemy.orm import Session
+from models import User
+from enrichment import liked_post_ids, liked_comment_ids, serialize_posts, serialize_comments
+from serialization import json_response
+
+CACHE_CONTROL = "private, no-cache"
+
+# Champs qui déterminent le rendu d'un élément et de son auteur
+POST_VERSION = attrgetter("id", "updated_at", "content", "image_url", "like_count", "comment_count")
+COMMENT_VERSION = attrgetter("id", "updated_at", "content", "like_count")
+AUTHOR_VERSION = attrgetter("id", "updated_at", "username", "display_name", "avatar_url")
+
+def page_etag(rows: list, version, liked_ids: Iterable[int], *variant) -> str:
+    """ETag faible d'une page d'éléments chargés avec leur auteur"""
+    digest = blake2b(digest_size=16)
+    digest.update(repr((variant, sorted(liked_ids))).encode("utf-8"))
+    for row in rows:
+        digest.update(repr((version(row), AUTHOR_VERSION(row.author))).encode("utf-8"))
+    return f'W/"{digest.hexdigest()}"'
+
+def posts_etag(posts: list, liked_ids: Iterable[int], *variant) -> str:
+    return page_etag(posts, POST_VERSION, liked_ids, "posts", *variant)
+
+def comments_etag(comments: list, liked_ids: Iterable[int], *variant) -> str:
+    return page_etag(comments, COMMENT_VERSION, liked_ids, "comments", *variant)
+
+def etag_matches(if_none_match: Optional[str], etag: Optional[str]) -> bool:
+    """Comparaison faible de If-None-Match avec l'ETag courant (liste ou *)"""
+    if not if_none_match or not etag:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    opaque = etag.removeprefix("W/")
+    return any(tag.strip().removeprefix("W/") == opaque for tag in if_none_match.split(","))
+
+def posts_page(
+    db: Session,
+    posts: list,
+    current_user: Optional[User],
+    compact: bool,
+    if_none_match: Optional[str]
+) -> Tuple[str, Optional[object]]:
+    """ETag d'une page de posts et la page sérialisée, ou None si le client l'a déjà"""
+    liked_ids = liked_post_ids(db, posts, current_user)
+    etag = posts_etag(posts, liked_ids, compact)
+    if etag_matches(if_none_match, etag):
+        return etag, None
+    return etag, serialize_posts(posts, liked_ids, compact)
+
+def comments_page(
+    db: Session,
+    comments: list,
+    current_user: Optional[User],
+    compact: bool,
+    if_none_match: Optional[str]
+) -> Tuple[str, Optional[object]]:
+    """ETag d'une page de commentaires et la page sérialisée, ou None si le client l'a déjà"""
+    liked_ids = liked_comment_ids(db, comments, current_user)
+    etag = comments_etag(comments, liked_ids, compact)
+    if etag_matches(if_none_match, etag):
+        return etag, None
+    return etag, serialize_comments(comments, liked_ids, compact)
+
+def validator_headers(etag: str) -> dict:
+    return {"ETag": etag, "Cache-Control": CACHE_CONTROL}
+
+def not_modified(etag: str, response: Optional[Response] = None) -> Response:
+    """Réponse 304 sans corps, avec les en-têtes de la réponse complète"""
+    result = Response(status_code=304, headers=validator_headers(etag))
+    if response is not None:
+        result.raw_headers.extend(response.headers.raw)
+    return result
+
+def conditional_response(content, etag: str, response: Optional[Response] = None) -> Response:
+    """json_response portant l'ETag de son contenu"""
+    result = json_response(content, response)
+    result.headers.update(validator_headers(etag))
+    return result
+
+def page_response(page: Tuple[str, Optional[object]], response: Optional[Response] = None) -> Response:
+    """Réponse d'un couple (etag, contenu) : 304 si le contenu n'a pas été construit"""
+    etag, content = page
+    if content is None:
+        return not_modified(etag, response)
+    return conditional_response(content, etag, response)
+
+def revalidate(cached: Response, if_none_match: Optional[str]) -> Response:
+    """Réponse en cache, ou 304 si le client en a déjà la version courante"""
+    etag = cached.headers.get("etag")
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag)
+    return cached
\ No newline at end of file
@@ -0,0 +1,110 @@
+from typing import Optional, List, Set, Union
+from sqlalchemy.orm import Session, contains_eager
+from models import User, Post, PostLike, Comment, CommentLike
+from schemas import (
+    Post as PostSchema, Comment as CommentSchema,
+    Author, CompactPost, CompactComment
+)
+from serialization import RowSerializer
+
+# Sérialiseurs des pages de posts et de commentaires (auteur inclus)
+serialize_post = RowSerializer(PostSchema, Post)
+serialize_comment = RowSerializer(CommentSchema, Comment)
+
+# Réponses compactes : éléments sans auteur, auteurs regroupés par id
+serialize_compact_post = RowSerializer(CompactPost, Post)
+serialize_compact_comment = RowSerializer(CompactComment, Comment)
+serialize_author = RowSerializer(Author, User)
+
+# Seules colonnes de l'auteur lues pour une réponse compacte (updated_at : ETag)
+AUTHOR_COLUMNS = [getattr(User, name) for name in Author.model_fields] + [User.updated_at]
+
+def _author_option(relationship, compact: bool):
+    option = contains_eager(relationship)
+    if compact:
+        option = option.load_only(*AUTHOR_COLUMNS)
+    return option
+
+def posts_query(db: Session, compact: bool = False):
+    """Requête de base des posts visibles, avec l'auteur chargé dans le même SELECT
+
+    En mode compact, seules les colonnes de la projection publique de
+    l'auteur sont lues.
+    """
+    return db.query(Post).join(Post.author).options(
+        _author_option(Post.author, compact)
+    ).filter(User.is_active == True, Post.deleted_at.is_(None))
+
+def compact_page(rows: list, serialize, liked_ids: set) -> dict:
+    """Page compacte : éléments portant user_id et table des auteurs distincts"""
+    items = []
+    users = {}
+    for row in rows:
+        items.append(serialize(row, is_liked=row.id in liked_ids))
+        # Clés de chaîne : les clés d'un objet JSON
+        key = str(row.user_id)
+        if key not in users:
+            users[key] = serialize_author(row.author)
+    return {"items": items, "users": users}
+
+def liked_post_ids(db: Session, posts: List[Post], current_user: Optional[User]) -> Set[int]:
+    """Posts de la page likés par l'utilisateur actuel, en une seule requête IN (...)"""
+    if not current_user or not posts:
+        return set()
+    return {
+        post_id for (post_id,) in db.query(PostLike.post_id).filter(
+            PostLike.user_id == current_user.id,
+            PostLike.post_id.in_([post.id for post in posts])
+        )
+    }
+
+def serialize_posts(posts: List[Post], liked_ids: Set[int], compact: bool = False) -> Union[List[dict], dict]:
+    if compact:
+        return compact_page(posts, serialize_compact_post, liked_ids)
+    return [serialize_post(post, is_liked=post.id in liked_ids) for post in posts]
+
+def enrich_posts(
+    db: Session,
+    posts: List[Post],
+    current_user: Optional[User] = None,
+    compact: bool = False
+) -> Union[List[dict], dict]:
+    """Enrichit une page de posts (is_liked) en un nombre fixe de requêtes
+
+    Les compteurs like_count / comment_count sont lus directement sur les
+    colonnes dénormalisées de Post. Les posts sont retournés sérialisés
+    (dicts conformes à PostSchema, voir serialization.py), ou en page
+    compacte (CompactPostPage).
+    """
+    return serialize_posts(posts, liked_post_ids(db, posts, current_user), compact)
+
+def comments_query(db: Session, compact: bool = False):
+    """Requête de base des commentaires visibles, avec l'auteur chargé dans le même SELECT"""
+    return db.query(Comment).join(Comment.author).options(
+        _author_option(Comment.author, compact)
+    ).filter(User.is_active == True)
+
+def liked_comment_ids(db: Session, comments: List[Comment], current_user: Optional[User]) -> Set[int]:
+    """Commentaires de la page likés par l'utilisateur actuel, en une seule requête IN (...)"""
+    if not current_user or not comments:
+        return set()
+    return {
+        comment_id for (comment_id,) in db.query(CommentLike.comment_id).filter(
+            CommentLike.user_id == current_user.id,
+            CommentLike.comment_id.in_([comment.id for comment in comments])
+        )
+    }
+
+def serialize_comments(comments: List[Comment], liked_ids: Set[int], compact: bool = False) -> Union[List[dict], dict]:
+    if compact:
+        return compact_page(comments, serialize_compact_comment, liked_ids)
+    return [serialize_comment(comment, is_liked=comment.id in liked_ids) for comment in comments]
+
+def enrich_comments(
+    db: Session,
+    comments: List[Comment],
+    current_user: Optional[User] = None,
+    compact: bool = False
+) -> Union[List[dict], dict]:
+    """Enrichit une page de commentaires (is_liked) en un nombre fixe de requêtes, sérialisés"""
+    return serialize_comments(comments, liked_comment_ids(db, comments, current_user), compact)
\ No newline at end of file
@@ -0,0 +1,229 @@
+"""Likes des posts et commentaires
+
+Chaque opération est idempotente et sans lecture préalable :
+- liker : INSERT IGNORE (la contrainte unique fait foi), le compteur n'est
+  incrémenté que si une ligne a réellement été insérée ;
+- unliker : DELETE, le compteur n'est décrémenté que si une ligne a été supprimée.
+
+Avec LIKE_COALESCE activé, les variations de compteur des contenus très
+likés (plus de LIKE_COALESCE_THRESHOLD likes par intervalle) sont cumulées
+en mémoire et appliquées toutes les LIKE_FLUSH_INTERVAL secondes : un post
+viral ne devient plus une file d'attente sur le verrou de sa ligne.
+"""
+import asyncio
+import os
+import threading
+from typing import Dict, Optional, Tuple
+from sqlalchemy import delete, insert, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from database import open_async_db
+from models import Post, PostLike, Comment, CommentLike
+
+# Configuration du regroupement des compteurs
+LIKE_COALESCE = os.getenv("LIKE_COALESCE", "false").lower() == "true"
+LIKE_COALESCE_THRESHOLD = int(os.getenv("LIKE_COALESCE_THRESHOLD", "5"))
+LIKE_FLUSH_INTERVAL = float(os.getenv("LIKE_FLUSH_INTERVAL", "1.0"))
+
+class LikeTable:
+    """Table de likes et contenu dont elle alimente le compteur `like_count`
+
+    `visible` : condition supplémentaire sur le contenu (posts masqués en
+    attente de purge traités comme inexistants).
+    """
+
+    def __init__(self, name: str, like_model, target_column, target_model, visible=None):
+        self.name = name
+        self.like_model = like_model
+        self.target_column = target_column
+        self.target_model = target_model
+        self.visible = visible
+
+    def target(self, target_id: int) -> list:
+        """Conditions désignant le contenu liké, s'il est visible"""
+        conditions = [self.target_model.id == target_id]
+        if self.visible is not None:
+            conditions.append(self.visible)
+        return conditions
+
+POST_LIKES = LikeTable("post", PostLike, PostLike.post_id, Post, Post.deleted_at.is_(None))
+COMMENT_LIKES = LikeTable("comment", CommentLike, CommentLike.comment_id, Comment)
+
+class LikeCounterBuffer:
+    """Variations de compteurs en attente, par contenu
+
+    Un contenu n'est regroupé qu'au-delà de `threshold` likes dans
+    l'intervalle courant : les contenus peu actifs gardent un compteur
+    exact immédiatement. Les variations sont additives, plusieurs workers
+    peuvent donc chacun vider leur propre tampon.
+    """
+
+    def __init__(self, enabled: bool, threshold: int, interval: float):
+        self.enabled = enabled
+        self.threshold = threshold
+        self.interval = interval
+        self.flushes = 0
+        self.coalesced = 0
+        self._activity: Dict[Tuple[str, int], int] = {}
+        self._pending: Dict[Tuple[str, int], int] = {}
+        self._lock = threading.Lock()
+
+    def should_buffer(self, table: LikeTable, target_id: int) -> bool:
+        """Compte l'activité du contenu et indique s'il doit être regroupé"""
+        if not self.enabled:
+            return False
+        key = (table.name, target_id)
+        with self._lock:
+            self._activity[key] = self._activity.get(key, 0) + 1
+            return key in self._pending or self._activity[key] > self.threshold
+
+    def add(self, table: LikeTable, target_id: int, delta: int):
+        key = (table.name, target_id)
+        with self._lock:
+            self._pending[key] = self._pending.get(key, 0) + delta
+            self.coalesced += 1
+
+    def pending(self, table: LikeTable, target_id: int) -> int:
+        """Variation pas encore appliquée en base pour ce contenu"""
+        with self._lock:
+            return self._pending.get((table.name, target_id), 0)
+
+    def flush(self, db: Session) -> int:
+        """Applique les variations en attente (une transaction pour tout le lot)"""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self._activity.clear()
+        tables = {table.name: table for table in (POST_LIKES, COMMENT_LIKES)}
+        try:
+            for (name, target_id), delta in pending.items():
+                if delta:
+                    model = tables[name].target_model
+                    # updated_at inchangé : un like n'est pas une modification du contenu
+                    db.execute(update(model).where(model.id == target_id).values(
+                        like_count=model.like_count + delta,
+                        updated_at=model.updated_at
+                    ))
+            db.commit()
+        except Exception:
+            # Remettre les variations en attente pour le prochain vidage
+            db.rollback()
+            with self._lock:
+                for key, delta in pending.items():
+                    self._pending[key] = self._pending.get(key, 0) + delta
+            raise
+        self.flushes += 1
+        return len(pending)
+
+    async def run(self):
+        """Boucle de vidage périodique (tâche de fond de l'application)"""
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.flush_async()
+            except Exception as e:
+                print(f"⚠️ Could not flush like counters: {e}")
+
+    async def flush_async(self):
+        async with open_async_db() as db:
+            await db.run(self.flush)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "threshold": self.threshold,
+                "interval": self.interval,
+                "pending": len(self._pending),
+                "coalesced": self.coalesced,
+                "flushes": self.flushes,
+            }
+
+like_buffer = LikeCounterBuffer(LIKE_COALESCE, LIKE_COALESCE_THRESHOLD, LIKE_FLUSH_INTERVAL)
+
+def _insert_like(db: Session, table: LikeTable, target_id: int, user_id: int) -> bool:
+    """Insère le like s'il n'existe pas ; True si une ligne a été insérée"""
+    stmt = insert(table.like_model).values({
+        table.target_column.key: target_id,
+        "user_id": user_id
+    }).prefix_with("IGNORE", dialect="mysql").prefix_with(
+        "IGNORE", dialect="mariadb"
+    ).prefix_with("OR IGNORE", dialect="sqlite")
+    try:
+        return db.execute(stmt).rowcount == 1
+    except IntegrityError:
+        # Contenu inexistant : SQLite n'ignore pas les clés étrangères (MariaDB si)
+        db.rollback()
+        return False
+
+def _delete_like(db: Session, table: LikeTable, target_id: int, user_id: int) -> bool:
+    """Supprime le like s'il existe ; True si une ligne a été supprimée"""
+    stmt = delete(table.like_model).where(
+        table.target_column == target_id,
+        table.like_model.user_id == user_id
+    )
+    return db.execute(stmt).rowcount == 1
+
+def _read_count(db: Session, table: LikeTable, target_id: int) -> Optional[int]:
+    model = table.target_model
+    return db.execute(select(model.like_count).where(*table.target(target_id))).scalar()
+
+def _apply_delta(db: Session, table: LikeTable, target_id: int, delta: int) -> Optional[int]:
+    """Applique la variation au compteur et retourne sa nouvelle valeur (None si absent)"""
+    model = table.target_model
+    # updated_at inchangé (onupdate / ON UPDATE CURRENT_TIMESTAMP) : un like n'est pas une modification
+    stmt = update(model).where(*table.target(target_id)).values(
+        like_count=model.like_count + delta,
+        updated_at=model.updated_at
+    )
+    if db.get_bind().dialect.update_returning:
+        # Une seule instruction : UPDATE ... RETURNING like_count
+        return db.execute(stmt.returning(model.like_count)).scalar()
+    if db.execute(stmt).rowcount == 0:
+        return None
+    return _read_count(db, table, target_id)
+
+def set_like(
+    db: Session,
+    table: LikeTable,
+    target_id: int,
+    user_id: int,
+    liked: bool
+) -> Optional[Tuple[bool, int]]:
+    """Met le like dans l'état demandé
+
+    Retourne (liké, nouveau compteur), ou None si le contenu n'existe pas.
+    """
+    if liked:
+        delta = 1 if _insert_like(db, table, target_id, user_id) else 0
+    else:
+        delta = -1 if _delete_like(db, table, target_id, user_id) else 0
+    count = _finish(db, table, target_id, delta)
+    return None if count is None else (liked, count)
+
+def toggle_like(db: Session, table: LikeTable, target_id: int, user_id: int) -> Optional[Tuple[bool, int]]:
+    """Inverse le like ; retourne (liké, nouveau compteur), ou None si le contenu n'existe pas"""
+    if _delete_like(db, table, target_id, user_id):
+        liked, delta = False, -1
+    else:
+        # Pas de like existant : une requête concurrente peut l'avoir inséré entre-temps
+        liked, delta = True, 1 if _insert_like(db, table, target_id, user_id) else 0
+    count = _finish(db, table, target_id, delta)
+    return None if count is None else (liked, count)
+
+def _finish(db: Session, table: LikeTable, target_id: int, delta: int) -> Optional[int]:
+    """Répercute la variation sur le compteur, valide et retourne le compteur affiché"""
+    buffered = delta != 0 and like_buffer.should_buffer(table, target_id)
+    if delta == 0 or buffered:
+        count = _read_count(db, table, target_id)
+    else:
+        count = _apply_delta(db, table, target_id, delta)
+
+    if count is None:
+        # Contenu inexistant : annuler l'éventuel like orphelin
+        db.rollback()
+        return None
+    db.commit()
+
+    if buffered:
+        like_buffer.add(table, target_id, delta)
+    return count + like_buffer.pending(table, target_id)
\ No newline at end of file
@@ -0,0 +1,332 @@
+"""Test de charge : charge mixte lecture/écriture contre une API en cours d'exécution
+
+À lancer sur une base remplie par seed_data.py (SQLite en local ou MariaDB),
+l'API étant démarrée à part (uvicorn main:app). Chaque client virtuel est un
+thread avec sa propre connexion HTTP keep-alive ; une partie des clients se
+connecte avec un compte généré, les autres restent anonymes.
+
+Le résultat (débit, p50/p95/p99 par endpoint) est écrit en JSON pour comparer
+les exécutions d'un commit à l'autre.
+
+Usage :
+    python loadtest.py [--base-url http://localhost:8000] [--duration 30]
+                       [--concurrency 16] [--users 10000] [--output result.json]
+"""
+import argparse
+import http.client
+import json
+import math
+import random
+import subprocess
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+from seed_data import LOADTEST_PASSWORD, username, power_law_weights, pick
+
+# Répartition par défaut de la charge (poids relatifs)
+DEFAULT_MIX = {
+    "list_posts": 40,
+    "get_post": 15,
+    "list_comments": 10,
+    "user_profile": 10,
+    "feed": 10,
+    "search": 3,
+    "like_post": 7,
+    "create_comment": 3,
+    "create_post": 2,
+}
+
+# Opérations nécessitant un compte connecté
+AUTHENTICATED_OPERATIONS = {"feed", "like_post", "create_comment", "create_post"}
+
+# Jeton d'accès rafraîchi (SESSION_MODE=token) quand il lui reste moins de ces secondes
+TOKEN_REFRESH_MARGIN = 30.0
+
+class Client:
+    """Client HTTP minimal (une connexion keep-alive, cookies de session)
+
+    Tous les en-têtes Set-Cookie sont conservés : en SESSION_MODE=token, la
+    connexion pose le jeton d'accès (session_id) et le jeton de
+    rafraîchissement (refresh_token, chemin /auth).
+    """
+
+    def __init__(self, base_url: str, timeout: float):
+        parts = urlsplit(base_url)
+        connection_class = http.client.HTTPSConnection if parts.scheme == "https" else http.client.HTTPConnection
+        self.connection = connection_class(parts.hostname, parts.port, timeout=timeout)
+        self.cookies: Dict[str, Tuple[str, str]] = {}  # nom -> (valeur, chemin)
+        # Échéance du cookie session_id (Max-Age), en temps monotone
+        self.session_expires_at: Optional[float] = None
+
+    def _store_cookies(self, set_cookies: List[str]):
+        for set_cookie in set_cookies:
+            pair, *attributes = set_cookie.split(";")
+            name, _, value = pair.strip().partition("=")
+            path, max_age = "/", None
+            for attribute in attributes:
+                key, _, attribute_value = attribute.strip().partition("=")
+                if key.lower() == "path":
+                    path = attribute_value or "/"
+                elif key.lower() == "max-age":
+                    max_age = int(attribute_value)
+            if not value or (max_age is not None and max_age <= 0):
+                self.cookies.pop(name, None)
+                continue
+            self.cookies[name] = (value, path)
+            if name == "session_id" and max_age is not None:
+                self.session_expires_at = time.monotonic() + max_age
+
+    def request(self, method: str, path: str, body: Optional[dict] = None) -> Tuple[int, dict, bytes]:
+        headers = {"Accept": "application/json"}
+        payload = None
+        if body is not None:
+            payload = json.dumps(body).encode("utf-8")
+            headers["Content-Type"] = "application/json"
+        cookies = [f"{name}={value}" for name, (value, cookie_path) in self.cookies.items() if path.startswith(cookie_path)]
+        if cookies:
+            headers["Cookie"] = "; ".join(cookies)
+        try:
+            self.connection.request(method, path, body=payload, headers=headers)
+            response = self.connection.getresponse()
+            data = response.read()
+        except (http.client.HTTPException, OSError):
+            # Connexion fermée par le serveur : la rouvrir pour la requête suivante
+            self.connection.close()
+            raise
+        self._store_cookies(response.msg.get_all("Set-Cookie") or [])
+        return response.status, {key.lower(): value for key, value in response.getheaders()}, data
+
+    def login(self, name: str) -> bool:
+        """Connexion avec un compte généré ; False si refusée ou si l'API ne répond pas"""
+        try:
+            status, _, _ = self.request("POST", "/auth/login", {"username": name, "password": LOADTEST_PASSWORD})
+        except (http.client.HTTPException, OSError):
+            return False
+        return status == 200 and "session_id" in self.cookies
+
+    def refresh_if_expiring(self) -> bool:
+        """Rafraîchit le jeton d'accès proche de son expiration (mode token) ; False si refusé ou en échec"""
+        if "refresh_token" not in self.cookies or self.session_expires_at is None:
+            return True
+        if time.monotonic() < self.session_expires_at - TOKEN_REFRESH_MARGIN:
+            return True
+        try:
+            status, _, _ = self.request("POST", "/auth/refresh")
+        except (http.client.HTTPException, OSError):
+            return False
+        return status == 200
+
+class Workload:
+    """Choix des opérations et de leurs cibles, avec la même asymétrie que les données"""
+
+    def __init__(self, users: int, max_post_id: int, mix: Dict[str, int], exponent: float, seed: int):
+        self.users = users
+        self.max_post_id = max_post_id
+        self.operations = list(mix)
+        self.cumulative_weights = []
+        total = 0
+        for operation in self.operations:
+            total += mix[operation]
+            self.cumulative_weights.append(total)
+        # Popularité des posts : les plus récents et quelques posts viraux concentrent l'activité
+        self.post_weights = power_law_weights(min(max_post_id, 100000), exponent)
+        self.user_weights = power_law_weights(users, exponent)
+        self.seed = seed
+
+    def rng(self, worker: int) -> random.Random:
+        return random.Random(self.seed * 1000 + worker)
+
+    def operation(self, rng: random.Random, authenticated: bool) -> str:
+        while True:
+            operation = self.operations[pick(rng, self.cumulative_weights)]
+            if authenticated or operation not in AUTHENTICATED_OPERATIONS:
+                return operation
+
+    def post_id(self, rng: random.Random) -> int:
+        return max(1, self.max_post_id - pick(rng, self.post_weights))
+
+    def username(self, rng: random.Random) -> str:
+        return username(pick(rng, self.user_weights))
+
+    def request(self, rng: random.Random, operation: str) -> Tuple[str, str, Optional[dict]]:
+        """(méthode, chemin, corps) de l'opération"""
+        if operation == "list_posts":
+            return "GET", "/posts/?limit=20", None
+        if operation == "get_post":
+            return "GET", f"/posts/{self.post_id(rng)}", None
+        if operation == "list_comments":
+            return "GET", f"/comments/post/{self.post_id(rng)}?limit=50", None
+        if operation == "user_profile":
+            return "GET", f"/users/{self.username(rng)}", None
+        if operation == "feed":
+            return "GET", "/feed/?limit=20", None
+        if operation == "search":
+            return "GET", f"/posts/search?q={rng.choice(SEARCH_TERMS)}&limit=20", None
+        if operation == "like_post":
+            return "PUT" if rng.random() < 0.7 else "DELETE", f"/posts/{self.post_id(rng)}/like", None
+        if operation == "create_comment":
+            return "POST", "/comments/", {"post_id": self.post_id(rng), "content": "Commentaire de test de charge"}
+        if operation == "create_post":
+            return "POST", "/posts/", {"content": "Post de test de charge"}
+        raise ValueError(f"Unknown operation: {operation}")
+
+SEARCH_TERMS = ("cache", "latence", "python", "timeline", "mariadb", "percentile")
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    """Percentile par rang le plus proche"""
+    if not sorted_values:
+        return 0.0
+    index = math.ceil(fraction * len(sorted_values)) - 1
+    return sorted_values[min(max(index, 0), len(sorted_values) - 1)]
+
+def summarize(samples: List[Tuple[str, int, float]], elapsed: float) -> dict:
+    """Débit et percentiles de latence (ms) par opération"""
+    by_operation: Dict[str, List[Tuple[int, float]]] = {}
+    for operation, status, latency in samples:
+        by_operation.setdefault(operation, []).append((status, latency))
+
+    endpoints = {}
+    for operation, results in sorted(by_operation.items()):
+        latencies = sorted(latency * 1000 for _, latency in results)
+        errors = sum(1 for status, _ in results if status == 0 or status >= 500)
+        statuses: Dict[str, int] = {}
+        for status, _ in results:
+            statuses[str(status)] = statuses.get(str(status), 0) + 1
+        endpoints[operation] = {
+            "requests": len(results),
+            "errors": errors,
+            "statuses": statuses,
+            "throughput_rps": round(len(results) / elapsed, 2),
+            "p50_ms": round(percentile(latencies, 0.50), 2),
+            "p95_ms": round(percentile(latencies, 0.95), 2),
+            "p99_ms": round(percentile(latencies, 0.99), 2),
+            "max_ms": round(latencies[-1], 2),
+            "mean_ms": round(sum(latencies) / len(latencies), 2),
+        }
+    return {
+        "duration_s": round(elapsed, 2),
+        "requests": len(samples),
+        "throughput_rps": round(len(samples) / elapsed, 2) if elapsed else 0.0,
+        "endpoints": endpoints,
+    }
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run(
+    base_url: str,
+    duration: float,
+    concurrency: int,
+    workload: Workload,
+    authenticated_ratio: float,
+    timeout: float = 10.0
+) -> dict:
+    """Lance les clients virtuels pendant `duration` secondes et agrège les mesures"""
+    samples: List[Tuple[str, int, float]] = []
+    lock = threading.Lock()
+    window = {}
+
+    def start_window():
+        # Exécuté une seule fois, avant de libérer les clients : tous voient la même échéance
+        window["start"] = time.perf_counter()
+        window["deadline"] = window["start"] + duration
+
+    ready = threading.Barrier(concurrency + 1, action=start_window)
+
+    def worker(index: int):
+        rng = workload.rng(index)
+        client = Client(base_url, timeout)
+        # Connexion hors mesure (bcrypt est volontairement coûteux)
+        authenticated = index < round(concurrency * authenticated_ratio)
+        if authenticated and not client.login(workload.username(rng)):
+            print(f"⚠️ Client {index} : connexion impossible, il reste anonyme")
+            authenticated = False
+        local_samples = []
+        ready.wait()
+        try:
+            while time.perf_counter() < window["deadline"]:
+                # Rafraîchissement du jeton d'accès hors mesure (longues exécutions en mode token)
+                if authenticated and not client.refresh_if_expiring():
+                    print(f"⚠️ Client {index} : jeton non rafraîchi, il continue anonyme")
+                    client.cookies.clear()
+                    authenticated = False
+                operation = workload.operation(rng, authenticated)
+                method, path, body = workload.request(rng, operation)
+                start = time.perf_counter()
+                try:
+                    status, _, _ = client.request(method, path, body)
+                except (http.client.HTTPException, OSError):
+                    status = 0
+                local_samples.append((operation, status, time.perf_counter() - start))
+        finally:
+            # Mesures conservées même si le client s'arrête sur une erreur inattendue
+            with lock:
+                samples.extend(local_samples)
+
+    threads = [threading.Thread(target=worker, args=(index,), daemon=True) for index in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    ready.wait()
+    for thread in threads:
+        thread.join()
+    return summarize(samples, time.perf_counter() - window["start"])
+
+def parse_mix(value: str) -> Dict[str, int]:
+    """Analyse une répartition "list_posts=50,like_post=10,..." """
+    mix = {}
+    for item in value.split(","):
+        name, _, weight = item.partition("=")
+        if name.strip() not in DEFAULT_MIX:
+            raise argparse.ArgumentTypeError(f"Opération inconnue : {name}")
+        mix[name.strip()] = int(weight)
+    # Un client anonyme (ou dont la connexion échoue) doit toujours avoir une opération possible
+    if not any(weight > 0 for name, weight in mix.items() if name not in AUTHENTICATED_OPERATIONS):
+        raise argparse.ArgumentTypeError(
+            f"La répartition doit contenir une opération anonyme (hors {', '.join(sorted(AUTHENTICATED_OPERATIONS))})"
+        )
+    return mix
+
+def latest_post_id(base_url: str) -> int:
+    status, _, data = Client(base_url, 10.0).request("GET", "/posts/?limit=1")
+    posts = json.loads(data) if status == 200 else []
+    if not posts:
+        raise SystemExit("❌ Aucun post : remplissez d'abord la base avec seed_data.py")
+    return posts[0]["id"]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Test de charge mixte lecture/écriture de l'API")
+    parser.add_argument("--base-url", default="http://localhost:8000", help="URL de l'API")
+    parser.add_argument("--duration", type=float, default=30, help="Durée de la mesure (secondes)")
+    parser.add_argument("--concurrency", type=int, default=16, help="Nombre de clients simultanés")
+    parser.add_argument("--users", type=int, default=10000, help="Nombre de comptes générés par seed_data.py")
+    parser.add_argument("--authenticated-ratio", type=float, default=0.5, help="Part des clients connectés")
+    parser.add_argument("--mix", type=parse_mix, default=DEFAULT_MIX, help="Répartition op=poids,...")
+    parser.add_argument("--exponent", type=float, default=1.1, help="Exposant de la popularité des posts et comptes")
+    parser.add_argument("--seed", type=int, default=42, help="Graine des clients (reproductibilité)")
+    parser.add_argument("--output", help="Fichier JSON de résultat (sortie standard sinon)")
+    args = parser.parse_args()
+
+    workload = Workload(args.users, latest_post_id(args.base_url), args.mix, args.exponent, args.seed)
+    result = run(args.base_url, args.duration, args.concurrency, workload, args.authenticated_ratio)
+    result["config"] = {
+        "base_url": args.base_url,
+        "concurrency": args.concurrency,
+        "authenticated_ratio": args.authenticated_ratio,
+        "mix": args.mix,
+        "seed": args.seed,
+        "commit": git_commit(),
+    }
+
+    output = json.dumps(result, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            file.write(output + "\n")
+        print(f"✅ {result['requests']} requêtes, {result['throughput_rps']} req/s → {args.output}")
+    else:
+        print(output)
\ No newline at end of file
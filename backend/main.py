@@ -1,6 +1,8 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import Depends, FastAPI, HTTPException
+from fastapi.responses import PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
+import asyncio
 import uvicorn
 import os
 
@@ -9,33 +11,70 @@ from routes_auth import router as auth_router
 from routes_posts import router as posts_router
 from routes_comments import router as comments_router
 from routes_users import router as users_router
+from routes_feed import router as feed_router
 
 # Import de la base de données
-from database import engine, Base
-from auth import cleanup_expired_sessions, get_db
+from database import engine, async_engine
+from auth import session_reaper, token_revocations, SESSION_MODE
+from pagination import NEXT_CURSOR_HEADER
+from password_pool import password_pool
+from auth import session_cache, require_admin
+from response_cache import response_cache
+from likes import like_buffer
+from purge import purger
+from migrate import migrate_on_startup
+from metrics import MetricsMiddleware, registry, pool_stats
+from compression import CompressionMiddleware
+from query_budget import QueryBudgetMiddleware, QUERY_COUNT_HEADER, DB_TIME_HEADER
+from replicas import replica_set, ReadYourWritesMiddleware
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Gestionnaire de cycle de vie de l'application"""
-    # Démarrage : créer les tables si elles n'existent pas
+    # Démarrage : mettre le schéma à jour
     print("🚀 Starting Forum API...")
     
-    # Créer les tables (si elles n'existent pas déjà)
-    # En production, utilisez Alembic pour les migrations
-    Base.metadata.create_all(bind=engine)
+    # Schéma versionné (migrate.py) : une seule lecture de schema_migrations si la base est à jour
+    migrate_on_startup(engine)
     
-    # Nettoyer les sessions expirées au démarrage
-    try:
-        db = next(get_db())
-        cleanup_expired_sessions(db)
-        print("✅ Expired sessions cleaned")
-    except Exception as e:
-        print(f"⚠️ Could not clean expired sessions: {e}")
+    # Suppression périodique des sessions expirées (premier passage au démarrage)
+    reaper_task = asyncio.create_task(session_reaper.run())
+    
+    # Purge par lots des gros posts et des comptes supprimés
+    purge_task = asyncio.create_task(purger.run())
+    
+    # Contrôles de santé et de retard des répliques de lecture
+    replica_task = None
+    if replica_set.replicas:
+        replica_task = asyncio.create_task(replica_set.run())
+    
+    # Jetons signés : révocations émises par les autres workers
+    revocation_task = None
+    if SESSION_MODE == "token":
+        revocation_task = asyncio.create_task(token_revocations.run())
+    
+    # Vidage périodique des compteurs de likes regroupés
+    flush_task = None
+    if like_buffer.enabled:
+        flush_task = asyncio.create_task(like_buffer.run())
     
     yield
     
     # Arrêt de l'application
     print("👋 Shutting down Forum API...")
+    reaper_task.cancel()
+    purge_task.cancel()
+    if revocation_task is not None:
+        revocation_task.cancel()
+    if replica_task is not None:
+        replica_task.cancel()
+        await replica_set.dispose()
+    if flush_task is not None:
+        flush_task.cancel()
+        await like_buffer.flush_async()
+    password_pool.shutdown()
+    if async_engine is not None:
+        await async_engine.dispose()
 
 # Créer l'application FastAPI
 app = FastAPI(
@@ -59,13 +98,27 @@ app.add_middleware(
     allow_credentials=True,  # Important pour les cookies de session
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER, QUERY_COUNT_HEADER, DB_TIME_HEADER, "ETag"],  # Pagination par curseur, budget SQL, ETag
 )
 
+# Lectures sur le primaire juste après une écriture du même client (répliques)
+app.add_middleware(ReadYourWritesMiddleware)
+
+# Budget de requêtes SQL par route (QUERY_BUDGET_MODE, développement et tests)
+app.add_middleware(QueryBudgetMiddleware)
+
+# Compression gzip/brotli des réponses JSON au-delà de COMPRESSION_MIN_SIZE
+app.add_middleware(CompressionMiddleware)
+
+# Latence par route et activité SQL par requête (GET /metrics)
+app.add_middleware(MetricsMiddleware)
+
 # Inclure les routes
 app.include_router(auth_router)
 app.include_router(posts_router)
 app.include_router(comments_router)
 app.include_router(users_router)
+app.include_router(feed_router)
 
 # Route de base pour vérifier que l'API fonctionne
 @app.get("/")
@@ -82,6 +135,32 @@ def read_root():
 def health_check():
     return {"status": "healthy", "service": "forum-api"}
 
+# Endpoints d'exploitation : réservés au jeton ADMIN_TOKEN (désactivés sans lui)
+
+# Statistiques des caches en mémoire (propres à ce worker)
+@app.get("/admin/cache", dependencies=[Depends(require_admin)])
+def cache_stats():
+    return {
+        "response_cache": response_cache.stats(),
+        "session_cache": session_cache.stats(),
+        "password_pool": password_pool.stats(),
+        "like_buffer": like_buffer.stats(),
+        "session_reaper": session_reaper.stats(),
+        "purger": purger.stats(),
+        "token_revocations": token_revocations.stats(),
+        "replicas": replica_set.stats()
+    }
+
+# État des pools de connexions (propres à ce worker) : dimensionnement de DB_POOL_SIZE
+@app.get("/admin/pool", dependencies=[Depends(require_admin)])
+def pool_report():
+    return {name: stats.stats() for name, stats in pool_stats.items()}
+
+# Métriques au format Prometheus (propres à ce worker)
+@app.get("/metrics", response_class=PlainTextResponse, dependencies=[Depends(require_admin)])
+def metrics():
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
 # Point d'entrée pour le développement
 if __name__ == "__main__":
     uvicorn.run(
@@ -0,0 +1,391 @@
+"""Métriques au format d'exposition texte Prometheus (GET /metrics)
+
+- latence des requêtes HTTP par modèle de route (middleware ASGI) ;
+- nombre d'instructions SQL et temps passé en base par requête
+  (événements du moteur SQLAlchemy) ;
+- état des pools de connexions : attente au checkout, connexions
+  utilisées et en dépassement, ouvertes, invalidées (pool_pre_ping)
+  et attentes expirées. Le détail par pool est aussi servi en JSON
+  par GET /admin/pool.
+
+Les métriques sont propres à chaque worker.
+"""
+import threading
+import time
+from collections import deque
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+from sqlalchemy import event, exc
+from sqlalchemy.engine import Engine
+from starlette.routing import Match
+
+# Bornes des histogrammes (secondes / nombre d'instructions)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+STATEMENT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+# Attentes de checkout conservées par pool pour les percentiles de GET /admin/pool
+POOL_WAIT_SAMPLES = 1000
+
+# Libellé des instructions exécutées hors d'une requête HTTP (tâches de fond, démarrage)
+NO_ROUTE = "background"
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    pairs = []
+    for name, value in zip(names, values):
+        value = str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        pairs.append(f'{name}="{value}"')
+    return "{" + ",".join(pairs) + "}"
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Counter:
+    """Compteur monotone, par combinaison de labels"""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, *labels: str):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for labels, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}")
+        return lines
+
+class Histogram:
+    """Histogramme à bornes fixes, par combinaison de labels"""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets) + (float("inf"),)
+        self._values: Dict[Tuple[str, ...], list] = {}  # labels -> [compteurs par borne, somme, total]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels: str):
+        with self._lock:
+            entry = self._values.get(labels)
+            if entry is None:
+                entry = self._values[labels] = [[0] * len(self.buckets), 0.0, 0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry[0][index] += 1
+                    break
+            entry[1] += value
+            entry[2] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        names = self.labelnames + ("le",)
+        with self._lock:
+            for labels, (counts, total, count) in sorted(self._values.items()):
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets, counts):
+                    cumulative += bucket_count
+                    bucket_labels = _format_labels(names, labels + (_format_value(bound),))
+                    lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+                label_text = _format_labels(self.labelnames, labels)
+                lines.append(f"{self.name}_sum{label_text} {_format_value(total)}")
+                lines.append(f"{self.name}_count{label_text} {count}")
+        return lines
+
+class GaugeCallback:
+    """Jauge dont les valeurs sont lues au moment de l'exposition"""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._callbacks: Dict[Tuple[str, ...], Callable[[], Optional[float]]] = {}
+
+    def set_function(self, fn: Callable[[], Optional[float]], *labels: str):
+        self._callbacks[labels] = fn
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} gauge"]
+        for labels, fn in sorted(self._callbacks.items()):
+            value = fn()
+            if value is not None:
+                lines.append(f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}")
+        return lines
+
+class Registry:
+    """Ensemble des métriques exposées par GET /metrics"""
+
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+registry = Registry()
+
+HTTP_REQUESTS = registry.register(Counter(
+    "http_requests_total", "HTTP requests by route template and status.",
+    ("method", "route", "status")
+))
+HTTP_LATENCY = registry.register(Histogram(
+    "http_request_duration_seconds", "HTTP request latency by route template.",
+    ("method", "route")
+))
+DB_STATEMENTS = registry.register(Counter(
+    "db_statements_total", "SQL statements executed, by route template.",
+    ("method", "route")
+))
+DB_TIME = registry.register(Counter(
+    "db_time_seconds_total", "Time spent executing SQL statements, by route template.",
+    ("method", "route")
+))
+DB_STATEMENTS_PER_REQUEST = registry.register(Histogram(
+    "db_statements_per_request", "SQL statements executed per HTTP request.",
+    ("method", "route"), buckets=STATEMENT_BUCKETS
+))
+POOL_CHECKOUT_WAIT = registry.register(Histogram(
+    "db_pool_checkout_wait_seconds", "Time spent waiting for a pooled connection.",
+    ("pool",)
+))
+POOL_SIZE = registry.register(GaugeCallback(
+    "db_pool_size", "Configured number of pooled connections.", ("pool",)
+))
+POOL_IN_USE = registry.register(GaugeCallback(
+    "db_pool_in_use", "Connections currently checked out of the pool.", ("pool",)
+))
+POOL_OVERFLOW = registry.register(GaugeCallback(
+    "db_pool_overflow", "Connections opened beyond the pool size.", ("pool",)
+))
+POOL_CONNECTIONS = registry.register(Counter(
+    "db_pool_connections_total", "New database connections opened by the pool.", ("pool",)
+))
+POOL_INVALIDATED = registry.register(Counter(
+    "db_pool_invalidated_total", "Pooled connections invalidated (failed pre-ping or disconnect).", ("pool",)
+))
+POOL_TIMEOUTS = registry.register(Counter(
+    "db_pool_checkout_timeouts_total", "Checkouts that gave up after waiting pool_timeout.", ("pool",)
+))
+REPLICA_HEALTHY = registry.register(GaugeCallback(
+    "db_replica_healthy", "1 if the read replica passed its last health check.", ("replica",)
+))
+REPLICA_LAG = registry.register(GaugeCallback(
+    "db_replica_lag_seconds", "Replication lag measured at the last health check.", ("replica",)
+))
+SESSION_ROWS = registry.register(GaugeCallback(
+    "user_sessions_rows", "Rows in user_sessions at the last reaper run (estimate on MariaDB)."
+))
+SESSIONS_REAPED = registry.register(Counter(
+    "user_sessions_reaped_total", "Expired sessions deleted by the background reaper."
+))
+PURGED_ROWS = registry.register(Counter(
+    "purge_rows_deleted_total", "Rows deleted in batches by the background purge of posts and accounts.",
+    ("table",)
+))
+RESPONSE_BODY_BYTES = registry.register(Counter(
+    "http_response_body_bytes_total", "JSON response body bytes sent, by content encoding.",
+    ("encoding",)
+))
+COMPRESSION_SAVED_BYTES = registry.register(Counter(
+    "http_compression_saved_bytes_total", "Bytes saved by compressing JSON responses.", ("encoding",)
+))
+
+class RequestStats:
+    """Activité SQL de la requête en cours"""
+
+    __slots__ = ("queries", "db_time", "statements", "parameters")
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        # Nombre d'exécutions par forme d'instruction (activé par query_budget)
+        self.statements: Optional[Dict[str, int]] = None
+        # Paramètres de la première exécution de chaque instruction (activé par QUERY_EXPLAIN)
+        self.parameters: Optional[Dict[str, Any]] = None
+
+# Statistiques de la requête en cours (propagées au threadpool et aux greenlets)
+current_request_stats: ContextVar[Optional[RequestStats]] = ContextVar("current_request_stats", default=None)
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start_time", []).append(time.perf_counter())
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["query_start_time"].pop()
+    stats = current_request_stats.get()
+    if stats is None:
+        DB_STATEMENTS.inc(1, "", NO_ROUTE)
+        DB_TIME.inc(elapsed, "", NO_ROUTE)
+    else:
+        stats.queries += 1
+        stats.db_time += elapsed
+        if stats.statements is not None:
+            stats.statements[statement] = stats.statements.get(statement, 0) + 1
+        if stats.parameters is not None and not executemany:
+            stats.parameters.setdefault(statement, parameters)
+
+class PoolStats:
+    """Activité d'un pool de connexions depuis le démarrage du worker (GET /admin/pool)"""
+
+    def __init__(self, name: str, engine: Engine):
+        self.name = name
+        self.engine = engine
+        self.checkouts = 0
+        self.connections = 0
+        self.invalidated = 0
+        self.timeouts = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.recent_waits = deque(maxlen=POOL_WAIT_SAMPLES)
+        self._lock = threading.Lock()
+
+    def record_wait(self, elapsed: float, timed_out: bool):
+        with self._lock:
+            self.checkouts += 1
+            self.wait_total += elapsed
+            self.wait_max = max(self.wait_max, elapsed)
+            self.recent_waits.append(elapsed)
+            if timed_out:
+                self.timeouts += 1
+
+    def stats(self) -> dict:
+        pool = self.engine.pool
+        with self._lock:
+            waits = sorted(self.recent_waits)
+            result = {
+                "pool": type(pool).__name__,
+                "checkouts": self.checkouts,
+                "connections_opened": self.connections,
+                "invalidated": self.invalidated,
+                "timeouts": self.timeouts,
+                "wait_mean_ms": round(self.wait_total / self.checkouts * 1000, 3) if self.checkouts else 0.0,
+                "wait_max_ms": round(self.wait_max * 1000, 3),
+            }
+        # Percentiles sur les POOL_WAIT_SAMPLES dernières attentes
+        for label, fraction in (("p50", 0.50), ("p95", 0.95), ("p99", 0.99)):
+            value = waits[min(int(fraction * len(waits)), len(waits) - 1)] if waits else 0.0
+            result[f"wait_{label}_ms"] = round(value * 1000, 3)
+        # Seuls les pools à file (QueuePool) ont une taille et un dépassement
+        if hasattr(pool, "overflow"):
+            result.update(
+                size=pool.size(),
+                max_overflow=pool._max_overflow,
+                timeout=pool.timeout(),
+                checked_in=pool.checkedin(),
+                checked_out=pool.checkedout(),
+                overflow=max(pool.overflow(), 0),
+            )
+        result["recycle"] = pool._recycle
+        return result
+
+# Pools instrumentés, par nom (primaire, async, répliques)
+pool_stats: Dict[str, PoolStats] = {}
+
+def instrument_engine(engine: Engine, name: str):
+    """Branche le comptage des instructions et les métriques du pool sur un moteur (sync)"""
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+    stats = pool_stats[name] = PoolStats(name, engine)
+    pool = engine.pool
+
+    def on_connect(dbapi_connection, connection_record):
+        stats.connections += 1
+        POOL_CONNECTIONS.inc(1, name)
+
+    def on_invalidate(dbapi_connection, connection_record, exception):
+        stats.invalidated += 1
+        POOL_INVALIDATED.inc(1, name)
+
+    event.listen(pool, "connect", on_connect)
+    event.listen(pool, "invalidate", on_invalidate)
+
+    # Aucun événement n'encadre l'attente d'une connexion : on mesure l'appel au pool
+    do_get = pool._do_get
+
+    def timed_do_get():
+        start = time.perf_counter()
+        timed_out = False
+        try:
+            return do_get()
+        except exc.TimeoutError:
+            timed_out = True
+            POOL_TIMEOUTS.inc(1, name)
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            POOL_CHECKOUT_WAIT.observe(elapsed, name)
+            stats.record_wait(elapsed, timed_out)
+
+    pool._do_get = timed_do_get
+
+    # Seuls les pools à file (QueuePool) ont une taille et un dépassement
+    if hasattr(pool, "overflow"):
+        POOL_SIZE.set_function(pool.size, name)
+        POOL_OVERFLOW.set_function(lambda: max(pool.overflow(), 0), name)
+    if hasattr(pool, "checkedout"):
+        POOL_IN_USE.set_function(pool.checkedout, name)
+
+def route_template(scope) -> Optional[str]:
+    """Modèle de la route servie (ex. /posts/{post_id}), pour borner la cardinalité des labels"""
+    app = scope.get("app")
+    if app is None:
+        return None
+    partial = None
+    for route in app.router.routes:
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return route.path
+        if match == Match.PARTIAL and partial is None:
+            partial = route.path
+    return partial
+
+class MetricsMiddleware:
+    """Middleware ASGI : latence et activité SQL de chaque requête HTTP"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats()
+        token = current_request_stats.set(stats)
+        status = 500
+        start = time.perf_counter()
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - start
+            current_request_stats.reset(token)
+            method = scope["method"]
+            route = route_template(scope) or "unmatched"
+            HTTP_REQUESTS.inc(1, method, route, str(status))
+            HTTP_LATENCY.observe(elapsed, method, route)
+            DB_STATEMENTS.inc(stats.queries, method, route)
+            DB_TIME.inc(stats.db_time, method, route)
+            DB_STATEMENTS_PER_REQUEST.observe(stats.queries, method, route)
\ No newline at end of file
@@ -0,0 +1,299 @@
+"""Migrations versionnées du schéma
+
+La version du schéma est enregistrée dans la table schema_migrations. Au
+démarrage, l'API lit seulement la dernière version appliquée (une requête,
+sans réflexion du schéma) et n'applique les migrations en attente que si
+DB_AUTO_MIGRATE est activé.
+
+- Base vide : le schéma courant est créé d'un coup depuis les modèles
+  (create_all, index plein texte) et toutes les versions sont marquées
+  appliquées.
+- Base existante sans schema_migrations (créée par init.sql ou par
+  create_all avant ce système) : elle est considérée en BASELINE_VERSION,
+  c'est-à-dire avec db/migrations/001 à 006 appliquées, après vérification
+  des colonnes, tables et index plein texte qu'elles ajoutent. S'il en
+  manque, la migration s'arrête en indiquant les scripts à appliquer.
+- Les migrations suivantes sont appliquées dans l'ordre et enregistrées.
+
+Sur MariaDB, les index sont construits en ligne (ALGORITHM=INPLACE,
+LOCK=NONE) : la table reste lisible et modifiable pendant la construction.
+Le DDL n'y étant pas transactionnel, chaque migration est idempotente
+(IF NOT EXISTS), et un verrou nommé empêche deux processus de migrer en
+même temps.
+
+Usage :
+    python migrate.py [upgrade]   # applique les migrations en attente
+    python migrate.py status      # version de la base et migrations en attente
+"""
+import argparse
+import os
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Callable, List, Optional, Sequence
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, func, insert, inspect, select, text
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.exc import DBAPIError
+from database import engine, Base
+import models  # noqa: F401 (déclare les tables sur Base)
+from search import SEARCH_TABLES, setup_search_index
+
+# Application des migrations au démarrage de l'API. À désactiver quand plusieurs
+# instances démarrent ensemble : lancer alors `python migrate.py` avant le déploiement.
+DB_AUTO_MIGRATE = os.getenv("DB_AUTO_MIGRATE", "true").lower() == "true"
+
+# Dernière migration SQL appliquée à la main (db/migrations/001 à 006)
+BASELINE_VERSION = 6
+
+# Colonnes et tables ajoutées par les scripts de la baseline (table: colonnes, [] : la table seule)
+BASELINE_SCHEMA = {
+    "001_denormalized_counters.sql": {"posts": ["like_count", "comment_count"], "comments": ["like_count"]},
+    "002_follow_graph.sql": {
+        "users": ["follower_count", "following_count", "timeline_built_at"],
+        "follows": [],
+        "timeline_entries": [],
+    },
+    "005_token_revocations.sql": {"token_revocations": []},
+    "006_deferred_purge.sql": {"posts": ["deleted_at"], "users": ["deleted_at"]},
+}
+
+# Verrou nommé MariaDB et attente max (secondes)
+MIGRATION_LOCK = "forum_schema_migrations"
+MIGRATION_LOCK_TIMEOUT = 600
+
+schema_migrations = Table(
+    "schema_migrations", MetaData(),
+    Column("version", Integer, primary_key=True),
+    Column("name", String(100), nullable=False),
+    Column("applied_at", DateTime, nullable=False),
+)
+
+class Migration:
+    """Changement de schéma numéroté (jamais modifié une fois publié)"""
+
+    def __init__(self, version: int, name: str, apply: Callable[[Connection], None]):
+        self.version = version
+        self.name = name
+        self.apply = apply
+
+MIGRATIONS: List[Migration] = []
+
+def migration(version: int, name: str):
+    """Déclare une migration, à la suite des précédentes"""
+    def decorator(apply):
+        MIGRATIONS.append(Migration(version, name, apply))
+        return apply
+    return decorator
+
+def head_version() -> int:
+    return MIGRATIONS[-1].version if MIGRATIONS else BASELINE_VERSION
+
+def _is_mysql(conn: Connection) -> bool:
+    return conn.dialect.name in ("mysql", "mariadb")
+
+def create_index(conn: Connection, table: str, name: str, columns: Sequence[str]):
+    """Crée un index s'il n'existe pas, sans bloquer les écritures sur MariaDB"""
+    if _is_mysql(conn):
+        conn.execute(text(
+            f"ALTER TABLE {table} ADD INDEX IF NOT EXISTS {name} ({', '.join(columns)}), "
+            "ALGORITHM=INPLACE, LOCK=NONE"
+        ))
+    else:
+        conn.execute(text(f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({', '.join(columns)})"))
+
+def drop_index(conn: Connection, table: str, name: str):
+    """Supprime un index s'il existe, sans bloquer les écritures sur MariaDB"""
+    if _is_mysql(conn):
+        conn.execute(text(f"ALTER TABLE {table} DROP INDEX IF EXISTS {name}, ALGORITHM=INPLACE, LOCK=NONE"))
+    else:
+        conn.execute(text(f"DROP INDEX IF EXISTS {name}"))
+
+@migration(7, "query_indexes")
+def query_indexes(conn: Connection):
+    """Index composites des prédicats les plus fréquents
+
+    - posts d'un profil : WHERE user_id = ? ORDER BY created_at DESC ;
+    - commentaires d'un post : WHERE post_id = ? ORDER BY created_at.
+    La vérification d'une session a déjà son index (idx_session_lookup, 004).
+    """
+    create_index(conn, "posts", "idx_posts_user_created", ["user_id", "created_at"])
+    create_index(conn, "comments", "idx_comments_post_created", ["post_id", "created_at"])
+    if _is_mysql(conn):
+        # Index simples devenus préfixes des composites (les clés étrangères utilisent ces derniers)
+        drop_index(conn, "posts", "idx_user_id")
+        drop_index(conn, "comments", "idx_post_id")
+    else:
+        # SQLite n'indexe pas les clés étrangères (MariaDB si) : purge et jointures par auteur
+        create_index(conn, "comments", "ix_comments_user_id", ["user_id"])
+        create_index(conn, "post_likes", "ix_post_likes_user_id", ["user_id"])
+        create_index(conn, "comment_likes", "ix_comment_likes_user_id", ["user_id"])
+        create_index(conn, "timeline_entries", "ix_timeline_entries_post_id", ["post_id"])
+        create_index(conn, "timeline_entries", "ix_timeline_entries_author_id", ["author_id"])
+
+@migration(8, "sqlite_second_timestamps")
+def sqlite_second_timestamps(conn: Connection):
+    """Dates de pagination à la seconde sur SQLite (models.Timestamp)
+
+    Les dates écrites depuis Python y étaient stockées avec `.000000`, celles
+    de CURRENT_TIMESTAMP sans : les curseurs ne les comparaient pas égales.
+    Rien à faire sur MariaDB (DATETIME à la seconde).
+    """
+    if _is_mysql(conn):
+        return
+    for table in ("posts", "comments", "timeline_entries"):
+        conn.execute(text(
+            f"UPDATE {table} SET created_at = substr(created_at, 1, 19) WHERE length(created_at) > 19"
+        ))
+
+@migration(9, "timeline_read_at")
+def timeline_read_at(conn: Connection):
+    """Date de dernière lecture des timelines (users.timeline_read_at)
+
+    Les timelines sont entretenues tant qu'elles sont lues, et non plus
+    TIMELINE_TTL_DAYS jours après leur construction. Les timelines existantes
+    partent de leur date de construction ; updated_at n'est pas modifié.
+    """
+    if _is_mysql(conn):
+        conn.execute(text(
+            "ALTER TABLE users ADD COLUMN IF NOT EXISTS timeline_read_at DATETIME NULL AFTER timeline_built_at"
+        ))
+    elif "timeline_read_at" not in {column["name"] for column in inspect(conn).get_columns("users")}:
+        conn.execute(text("ALTER TABLE users ADD COLUMN timeline_read_at DATETIME"))
+    conn.execute(text(
+        "UPDATE users SET timeline_read_at = timeline_built_at, updated_at = updated_at "
+        "WHERE timeline_read_at IS NULL AND timeline_built_at IS NOT NULL"
+    ))
+
+def current_version(conn: Connection) -> Optional[int]:
+    """Dernière version appliquée, None si la base n'a pas encore de schema_migrations"""
+    try:
+        version = conn.execute(select(func.max(schema_migrations.c.version))).scalar()
+    except DBAPIError:
+        conn.rollback()
+        return None
+    # Table vide : initialisation interrompue avant l'enregistrement des versions
+    return version or BASELINE_VERSION
+
+def _record(conn: Connection, version: int, name: str):
+    conn.execute(insert(schema_migrations).values(version=version, name=name, applied_at=datetime.utcnow()))
+
+def _has_search_index(conn: Connection, table: str) -> bool:
+    """Index plein texte de db/migrations/003 (tables FTS5 sur SQLite)"""
+    inspector = inspect(conn)
+    if _is_mysql(conn):
+        return any(index["name"] == f"ft_{table}_content" for index in inspector.get_indexes(table))
+    return inspector.has_table(f"{table}_fts")
+
+def missing_baseline(conn: Connection) -> List[str]:
+    """Scripts de la baseline dont les colonnes, tables ou index manquent dans la base"""
+    inspector = inspect(conn)
+    tables = set(inspector.get_table_names())
+    columns = {}
+    missing = []
+    for script, expected in BASELINE_SCHEMA.items():
+        for table, names in expected.items():
+            if table not in tables:
+                missing.append(script)
+                break
+            if table not in columns:
+                columns[table] = {column["name"] for column in inspector.get_columns(table)}
+            if not columns[table].issuperset(names):
+                missing.append(script)
+                break
+    if not all(_has_search_index(conn, table) for table in SEARCH_TABLES):
+        missing.append("003_fulltext_search.sql")
+    return sorted(missing)
+
+def bootstrap(conn: Connection) -> int:
+    """Crée schema_migrations et retourne la version de départ de la base"""
+    empty = not inspect(conn).has_table("users")
+    if empty:
+        # Base vide : le schéma des modèles inclut déjà toutes les migrations
+        Base.metadata.create_all(conn)
+        version = head_version()
+    else:
+        missing = missing_baseline(conn)
+        if missing:
+            raise RuntimeError(
+                f"Existing database without schema_migrations is older than version {BASELINE_VERSION}: "
+                f"apply {', '.join(f'db/migrations/{script}' for script in missing)} then run the migration again"
+            )
+        print(f"⚠️ No schema_migrations table: existing database assumed at version {BASELINE_VERSION}")
+        version = BASELINE_VERSION
+    schema_migrations.create(conn, checkfirst=True)
+    _record(conn, BASELINE_VERSION, "baseline")
+    for step in MIGRATIONS:
+        if step.version <= version:
+            _record(conn, step.version, step.name)
+    conn.commit()
+    if empty:
+        setup_search_index(conn.engine)
+    return version
+
+@contextmanager
+def migration_lock(conn: Connection):
+    """Un seul processus migre à la fois (SQLite : verrou d'écriture du fichier)"""
+    if not _is_mysql(conn):
+        yield
+        return
+    acquired = conn.execute(
+        text("SELECT GET_LOCK(:name, :timeout)"), {"name": MIGRATION_LOCK, "timeout": MIGRATION_LOCK_TIMEOUT}
+    ).scalar()
+    if acquired != 1:
+        raise RuntimeError("Could not acquire the schema migration lock")
+    try:
+        yield
+    finally:
+        conn.execute(text("SELECT RELEASE_LOCK(:name)"), {"name": MIGRATION_LOCK})
+
+def upgrade(engine: Engine) -> List[int]:
+    """Applique les migrations en attente et retourne les versions appliquées"""
+    applied = []
+    with engine.connect() as conn:
+        # Chemin habituel : base à jour, une seule requête
+        if current_version(conn) == head_version():
+            return applied
+        with migration_lock(conn):
+            # Relu sous le verrou : un autre processus a pu migrer entre-temps
+            version = current_version(conn)
+            if version is None:
+                version = bootstrap(conn)
+            for step in MIGRATIONS:
+                if step.version <= version:
+                    continue
+                print(f"🛠️ Migration {step.version}: {step.name}")
+                step.apply(conn)
+                _record(conn, step.version, step.name)
+                conn.commit()
+                applied.append(step.version)
+    return applied
+
+def migrate_on_startup(engine: Engine):
+    """Démarrage de l'API : migre (DB_AUTO_MIGRATE) ou signale un schéma en retard"""
+    if DB_AUTO_MIGRATE:
+        upgrade(engine)
+        return
+    with engine.connect() as conn:
+        version = current_version(conn)
+    if version != head_version():
+        print(f"⚠️ Database schema at version {version}, expected {head_version()}: run python migrate.py")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Migrations versionnées du schéma")
+    parser.add_argument("command", nargs="?", choices=("upgrade", "status"), default="upgrade")
+    args = parser.parse_args()
+
+    # Les instructions ne sont pas journalisées pendant la migration
+    engine.echo = False
+
+    if args.command == "status":
+        with engine.connect() as conn:
+            version = current_version(conn)
+        pending = [f"{step.version} {step.name}" for step in MIGRATIONS if version is None or step.version > version]
+        print(f"Version : {version if version is not None else 'aucune (base non initialisée)'} / {head_version()}")
+        print(f"En attente : {', '.join(pending) if pending else 'aucune'}")
+    else:
+        try:
+            applied = upgrade(engine)
+        except RuntimeError as e:
+            raise SystemExit(f"❌ {e}")
+        print(f"✅ Schéma en version {head_version()} ({len(applied)} migration(s) appliquée(s))")
\ No newline at end of file
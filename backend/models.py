@@ -1,8 +1,16 @@
-from sqlalchemy import Column, Integer, String, Text, Boolean, DateTime, ForeignKey, UniqueConstraint
+from sqlalchemy import Column, Integer, String, Text, Boolean, DateTime, ForeignKey, UniqueConstraint, Index
+from sqlalchemy.dialects import mysql, sqlite
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from database import Base
 
+# Dates de pagination (curseurs) : à la seconde sur SQLite, comme CURRENT_TIMESTAMP
+# et DATETIME sur MariaDB, pour qu'une même date n'ait qu'une forme texte
+Timestamp = DateTime().with_variant(
+    sqlite.DATETIME(storage_format="%(year)04d-%(month)02d-%(day)02d %(hour)02d:%(minute)02d:%(second)02d"),
+    "sqlite"
+)
+
 class User(Base):
     __tablename__ = "users"
     
@@ -16,50 +24,77 @@ class User(Base):
     created_at = Column(DateTime, server_default=func.now())
     updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
     is_active = Column(Boolean, default=True)
+    # Compteurs dénormalisés du graphe de suivi
+    follower_count = Column(Integer, nullable=False, default=0, server_default="0")
+    following_count = Column(Integer, nullable=False, default=0, server_default="0")
+    # Date de construction de la timeline matérialisée (NULL : jamais construite)
+    timeline_built_at = Column(DateTime)
+    # Dernière lecture de la timeline, à TIMELINE_READ_TOUCH_INTERVAL près (voir timeline.py)
+    timeline_read_at = Column(DateTime)
+    # Compte supprimé (désactivé), en attente de purge en tâche de fond
+    deleted_at = Column(DateTime, index=True)
     
-    # Relations
-    posts = relationship("Post", back_populates="author", cascade="all, delete-orphan")
-    comments = relationship("Comment", back_populates="author", cascade="all, delete-orphan")
-    post_likes = relationship("PostLike", back_populates="user", cascade="all, delete-orphan")
-    comment_likes = relationship("CommentLike", back_populates="user", cascade="all, delete-orphan")
-    sessions = relationship("UserSession", back_populates="user", cascade="all, delete-orphan")
+    # Relations (passive_deletes : les lignes filles sont supprimées par ON DELETE CASCADE,
+    # sans être chargées par l'ORM)
+    posts = relationship("Post", back_populates="author", cascade="all, delete-orphan", passive_deletes=True)
+    comments = relationship("Comment", back_populates="author", cascade="all, delete-orphan", passive_deletes=True)
+    post_likes = relationship("PostLike", back_populates="user", cascade="all, delete-orphan", passive_deletes=True)
+    comment_likes = relationship("CommentLike", back_populates="user", cascade="all, delete-orphan", passive_deletes=True)
+    sessions = relationship("UserSession", back_populates="user", cascade="all, delete-orphan", passive_deletes=True)
 
 class Post(Base):
     __tablename__ = "posts"
     
     id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
     content = Column(Text, nullable=False)
     image_url = Column(String(255))
-    created_at = Column(DateTime, server_default=func.now(), index=True)
+    # Compteurs dénormalisés (mis à jour dans la même transaction que les likes/commentaires)
+    like_count = Column(Integer, nullable=False, default=0, server_default="0")
+    comment_count = Column(Integer, nullable=False, default=0, server_default="0")
+    created_at = Column(Timestamp, server_default=func.now(), index=True)
     updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
+    # Post supprimé (masqué), en attente de purge en tâche de fond
+    deleted_at = Column(DateTime, index=True)
     
     # Relations
     author = relationship("User", back_populates="posts")
-    comments = relationship("Comment", back_populates="post", cascade="all, delete-orphan")
-    likes = relationship("PostLike", back_populates="post", cascade="all, delete-orphan")
+    comments = relationship("Comment", back_populates="post", cascade="all, delete-orphan", passive_deletes=True)
+    likes = relationship("PostLike", back_populates="post", cascade="all, delete-orphan", passive_deletes=True)
+    
+    # Posts d'un profil, du plus récent au plus ancien (sert aussi d'index sur user_id)
+    __table_args__ = (
+        Index('idx_posts_user_created', 'user_id', 'created_at'),
+    )
 
 class Comment(Base):
     __tablename__ = "comments"
     
     id = Column(Integer, primary_key=True, index=True)
-    post_id = Column(Integer, ForeignKey("posts.id"), nullable=False)
-    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    post_id = Column(Integer, ForeignKey("posts.id", ondelete="CASCADE"), nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True)
     content = Column(Text, nullable=False)
-    created_at = Column(DateTime, server_default=func.now(), index=True)
+    # Compteur dénormalisé des likes
+    like_count = Column(Integer, nullable=False, default=0, server_default="0")
+    created_at = Column(Timestamp, server_default=func.now(), index=True)
     updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
     
     # Relations
     post = relationship("Post", back_populates="comments")
     author = relationship("User", back_populates="comments")
-    likes = relationship("CommentLike", back_populates="comment", cascade="all, delete-orphan")
+    likes = relationship("CommentLike", back_populates="comment", cascade="all, delete-orphan", passive_deletes=True)
+    
+    # Commentaires d'un post par date (sert aussi d'index sur post_id)
+    __table_args__ = (
+        Index('idx_comments_post_created', 'post_id', 'created_at'),
+    )
 
 class PostLike(Base):
     __tablename__ = "post_likes"
     
     id = Column(Integer, primary_key=True, index=True)
-    post_id = Column(Integer, ForeignKey("posts.id"), nullable=False)
-    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    post_id = Column(Integer, ForeignKey("posts.id", ondelete="CASCADE"), nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True)
     created_at = Column(DateTime, server_default=func.now())
     
     # Relations
@@ -73,8 +108,8 @@ class CommentLike(Base):
     __tablename__ = "comment_likes"
     
     id = Column(Integer, primary_key=True, index=True)
-    comment_id = Column(Integer, ForeignKey("comments.id"), nullable=False)
-    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    comment_id = Column(Integer, ForeignKey("comments.id", ondelete="CASCADE"), nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True)
     created_at = Column(DateTime, server_default=func.now())
     
     # Relations
@@ -88,11 +123,54 @@ class UserSession(Base):
     __tablename__ = "user_sessions"
     
     id = Column(Integer, primary_key=True, index=True)
-    session_id = Column(String(255), unique=True, index=True, nullable=False)
-    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    session_id = Column(String(255), unique=True, nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True)
     created_at = Column(DateTime, server_default=func.now())
     expires_at = Column(DateTime, nullable=False, index=True)
     is_active = Column(Boolean, default=True)
     
     # Relations
-    user = relationship("User", back_populates="sessions")
\ No newline at end of file
+    user = relationship("User", back_populates="sessions")
+    
+    # Prédicat de get_current_user, couvrant user_id (lecture de l'index seul)
+    __table_args__ = (
+        Index('idx_session_lookup', 'session_id', 'is_active', 'expires_at', 'user_id'),
+    )
+
+class TokenRevocation(Base):
+    __tablename__ = "token_revocations"
+    
+    # Jetons d'accès de l'utilisateur émis avant revoked_at refusés (mode SESSION_MODE=token)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    # Microsecondes : un jeton émis juste après la révocation doit rester valide
+    revoked_at = Column(
+        DateTime().with_variant(mysql.DATETIME(fsp=6), "mysql", "mariadb"),
+        nullable=False,
+        index=True
+    )
+
+class Follow(Base):
+    __tablename__ = "follows"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    follower_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    followed_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True)
+    created_at = Column(DateTime, server_default=func.now())
+    
+    # Contrainte unique pour éviter les doublons (sert aussi d'index sur follower_id)
+    __table_args__ = (UniqueConstraint('follower_id', 'followed_id', name='unique_follow'),)
+
+class TimelineEntry(Base):
+    __tablename__ = "timeline_entries"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    post_id = Column(Integer, ForeignKey("posts.id", ondelete="CASCADE"), nullable=False, index=True)
+    author_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True)
+    # Copie de posts.created_at pour paginer la timeline sans jointure
+    created_at = Column(Timestamp, nullable=False)
+    
+    __table_args__ = (
+        UniqueConstraint('user_id', 'post_id', name='unique_timeline_entry'),
+        Index('idx_timeline_user_created', 'user_id', 'created_at', 'post_id'),
+    )
\ No newline at end of file
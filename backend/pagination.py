@@ -0,0 +1,78 @@
+import base64
+import json
+from datetime import datetime
+from typing import Optional, Tuple
+from fastapi import HTTPException, Response
+from sqlalchemy import and_, or_, literal
+
+# En-tête renvoyé par les listes paginées par curseur
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+# Taille maximale d'une page (borne la mémoire par requête)
+MAX_PAGE_SIZE = 100
+
+def encode_cursor(created_at: datetime, row_id: int) -> str:
+    """Encode la position (created_at, id) en curseur opaque"""
+    payload = json.dumps({"c": created_at.isoformat(sep=" "), "id": row_id}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii").rstrip("=")
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """Décode un curseur opaque en (created_at, id)"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        created_at = datetime.fromisoformat(payload["c"])
+        row_id = int(payload["id"])
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return created_at, row_id
+
+def encode_rank_cursor(rank: float, row_id: int) -> str:
+    """Encode la position (score de pertinence, id) en curseur opaque"""
+    payload = json.dumps({"r": rank, "id": row_id}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii").rstrip("=")
+
+def decode_rank_cursor(cursor: str) -> Tuple[float, int]:
+    """Décode un curseur opaque en (score de pertinence, id)"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        return float(payload["r"]), int(payload["id"])
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def keyset_before(model, cursor: str, id_column=None):
+    """Filtre des lignes situées après le curseur dans l'ordre (created_at DESC, id DESC)
+
+    `id_column` remplace `model.id` comme critère de départage si besoin.
+    """
+    created_at, row_id = decode_cursor(cursor)
+    id_column = model.id if id_column is None else id_column
+    # Date typée comme la colonne : le dialecte la formate comme il la stocke
+    created_at = literal(created_at, type_=model.created_at.type)
+    return or_(
+        model.created_at < created_at,
+        and_(model.created_at == created_at, id_column < row_id)
+    )
+
+def keyset_after(model, cursor: str):
+    """Filtre des lignes situées après le curseur dans l'ordre (created_at ASC, id ASC)"""
+    created_at, row_id = decode_cursor(cursor)
+    created_at = literal(created_at, type_=model.created_at.type)
+    return or_(
+        model.created_at > created_at,
+        and_(model.created_at == created_at, model.id > row_id)
+    )
+
+def next_cursor(rows: list, limit: int) -> Optional[str]:
+    """Curseur de la page suivante (None si la page n'est pas pleine)"""
+    if not rows or len(rows) < limit:
+        return None
+    last = rows[-1]
+    return encode_cursor(last.created_at, last.id)
+
+def set_next_cursor(response: Response, rows: list, limit: int):
+    """Ajoute l'en-tête X-Next-Cursor à la réponse si une page suivante existe"""
+    cursor = next_cursor(rows, limit)
+    if cursor:
+        response.headers[NEXT_CURSOR_HEADER] = cursor
\ No newline at end of file
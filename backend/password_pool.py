@@ -0,0 +1,63 @@
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, TypeVar
+from fastapi import HTTPException
+
+T = TypeVar("T")
+
+# Taille du pool dédié au hachage bcrypt et nombre de demandes en attente tolérées
+PASSWORD_WORKERS = int(os.getenv("PASSWORD_WORKERS", "2"))
+PASSWORD_QUEUE_LIMIT = int(os.getenv("PASSWORD_QUEUE_LIMIT", "32"))
+
+class WorkerPool:
+    """Pool de threads borné avec contrôle d'admission
+
+    bcrypt libère le GIL pendant le calcul : un petit pool de threads dédié
+    suffit, et isole ce travail CPU du threadpool de Starlette qui sert les
+    lectures. Au-delà de `workers + queue_limit` demandes en cours, les
+    nouvelles sont refusées avec une 503 plutôt que mises en file.
+    """
+
+    def __init__(self, workers: int, queue_limit: int, name: str = "worker"):
+        self.workers = workers
+        self.capacity = workers + queue_limit
+        self.pending = 0
+        self.completed = 0
+        self.rejected = 0
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=name)
+
+    async def submit(self, fn: Callable[..., T], *args) -> T:
+        """Exécute fn(*args) dans le pool, ou lève une 503 si la file est pleine"""
+        # Compteur manipulé uniquement depuis la boucle d'événements
+        if self.pending >= self.capacity:
+            self.rejected += 1
+            raise HTTPException(
+                status_code=503,
+                detail="Server busy, please retry",
+                headers={"Retry-After": "1"}
+            )
+
+        self.pending += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+        finally:
+            self.pending -= 1
+            self.completed += 1
+
+    def stats(self) -> dict:
+        """Statistiques du pool"""
+        return {
+            "workers": self.workers,
+            "capacity": self.capacity,
+            "pending": self.pending,
+            "completed": self.completed,
+            "rejected": self.rejected,
+        }
+
+    def shutdown(self):
+        """Arrête le pool (sans attendre les tâches en cours)"""
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+# Pool partagé pour le hachage et la vérification des mots de passe
+password_pool = WorkerPool(PASSWORD_WORKERS, PASSWORD_QUEUE_LIMIT, name="bcrypt")
\ No newline at end of file
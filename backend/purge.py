@@ -0,0 +1,202 @@
+"""Suppression en tâche de fond des gros posts et des comptes
+
+Les lignes filles (commentaires, likes, entrées de timeline...) sont
+supprimées par les clés étrangères ON DELETE CASCADE, jamais chargées par
+l'ORM. Un post avec au plus PURGE_THRESHOLD likes et commentaires est donc
+supprimé immédiatement par un seul DELETE.
+
+Au-delà, une seule transaction verrouillerait des millions de lignes : le
+post est seulement masqué (deleted_at) et ses lignes filles sont supprimées
+par lots de PURGE_BATCH_SIZE lignes par le Purger, avant la ligne du post.
+
+Un compte supprimé est désactivé immédiatement (profil, posts et
+commentaires masqués) puis toujours purgé en tâche de fond : ses likes,
+commentaires et abonnements sont supprimés par lots en corrigeant les
+compteurs dénormalisés des contenus et comptes concernés, puis ses posts,
+puis la ligne du compte.
+"""
+import asyncio
+import os
+from collections import Counter
+from typing import Dict, List, Optional
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from database import open_async_db
+from models import User, Post, Comment, PostLike, CommentLike, Follow, TimelineEntry
+from auth import session_cache
+from metrics import PURGED_ROWS
+
+# Nombre de likes + commentaires au-delà duquel un post est purgé en tâche de fond
+PURGE_THRESHOLD = int(os.getenv("PURGE_THRESHOLD", "1000"))
+# Recherche des posts masqués et comptes supprimés toutes les PURGE_INTERVAL secondes,
+# suppression par lots de PURGE_BATCH_SIZE lignes espacés de PURGE_PAUSE secondes
+PURGE_INTERVAL = float(os.getenv("PURGE_INTERVAL", "5"))
+PURGE_BATCH_SIZE = int(os.getenv("PURGE_BATCH_SIZE", "1000"))
+PURGE_PAUSE = float(os.getenv("PURGE_PAUSE", "0.05"))
+
+class PurgeStep:
+    """Lignes d'une table à supprimer par lots, et compteur dénormalisé qu'elles alimentent"""
+
+    def __init__(self, model, condition, counter_key=None, counter=None):
+        self.model = model
+        self.condition = condition
+        # Colonne de la ligne supprimée désignant la ligne comptée (ex. PostLike.post_id)
+        self.counter_key = counter_key
+        # Compteur à décrémenter (ex. Post.like_count)
+        self.counter = counter
+
+def post_steps(post_id: int) -> List[PurgeStep]:
+    """Lignes filles d'un post, supprimées avant la ligne du post"""
+    comment_ids = select(Comment.id).where(Comment.post_id == post_id)
+    return [
+        PurgeStep(CommentLike, CommentLike.comment_id.in_(comment_ids)),
+        PurgeStep(Comment, Comment.post_id == post_id),
+        PurgeStep(PostLike, PostLike.post_id == post_id),
+        PurgeStep(TimelineEntry, TimelineEntry.post_id == post_id),
+    ]
+
+def user_steps(user_id: int) -> List[PurgeStep]:
+    """Activité d'un compte chez les autres, avec les compteurs à corriger"""
+    comment_ids = select(Comment.id).where(Comment.user_id == user_id)
+    return [
+        PurgeStep(PostLike, PostLike.user_id == user_id, PostLike.post_id, Post.like_count),
+        PurgeStep(CommentLike, CommentLike.user_id == user_id, CommentLike.comment_id, Comment.like_count),
+        PurgeStep(CommentLike, CommentLike.comment_id.in_(comment_ids)),
+        PurgeStep(Comment, Comment.user_id == user_id, Comment.post_id, Post.comment_count),
+        PurgeStep(Follow, Follow.follower_id == user_id, Follow.followed_id, User.follower_count),
+        PurgeStep(Follow, Follow.followed_id == user_id, Follow.follower_id, User.following_count),
+        PurgeStep(TimelineEntry, TimelineEntry.user_id == user_id),
+        PurgeStep(TimelineEntry, TimelineEntry.author_id == user_id),
+    ]
+
+def delete_batch(db: Session, step: PurgeStep, batch_size: int) -> int:
+    """Supprime un lot de lignes de l'étape et décrémente les compteurs concernés"""
+    columns = [step.model.id] if step.counter is None else [step.model.id, step.counter_key]
+    # SKIP LOCKED : deux workers qui purgent en même temps ne décomptent pas deux fois les mêmes lignes
+    rows = db.execute(
+        select(*columns).where(step.condition).limit(batch_size).with_for_update(skip_locked=True)
+    ).all()
+    if rows:
+        db.query(step.model).filter(
+            step.model.id.in_([row[0] for row in rows])
+        ).delete(synchronize_session=False)
+        if step.counter is not None:
+            decrement_counters(db, step.counter, Counter(row[1] for row in rows))
+    db.commit()
+    return len(rows)
+
+def decrement_counters(db: Session, counter, decrements: Dict[int, int]):
+    """Décrémente le compteur des lignes concernées, une instruction par valeur de décrément"""
+    model = counter.class_
+    by_amount: Dict[int, List[int]] = {}
+    for target_id, amount in decrements.items():
+        by_amount.setdefault(amount, []).append(target_id)
+    for amount, target_ids in by_amount.items():
+        db.query(model).filter(model.id.in_(target_ids)).update(
+            {counter: counter - amount, model.updated_at: model.updated_at},
+            synchronize_session=False
+        )
+    if model is User:
+        # Compteurs d'abonnés modifiés : les utilisateurs en cache sont périmés
+        targets = set(decrements)
+        session_cache.delete_where(lambda _, user: user.id in targets)
+
+def pending_ids(db: Session, model, batch_size: int, user_id: Optional[int] = None) -> List[int]:
+    """Lignes marquées supprimées (ou posts d'un compte supprimé), les plus anciennes d'abord"""
+    query = db.query(model.id)
+    if user_id is None:
+        query = query.filter(model.deleted_at.isnot(None)).order_by(model.deleted_at)
+    else:
+        query = query.filter(Post.user_id == user_id)
+    return [row_id for (row_id,) in query.limit(batch_size)]
+
+def delete_row(db: Session, model, row_id: int):
+    """Supprime la ligne une fois ses lignes filles purgées (le reste part par ON DELETE CASCADE)"""
+    db.query(model).filter(model.id == row_id).delete(synchronize_session=False)
+    db.commit()
+
+class Purger:
+    """Purge par lots des posts masqués et des comptes supprimés
+
+    Chaque lot est une transaction courte ; la boucle rend la main aux
+    requêtes des utilisateurs entre deux lots. Une purge interrompue
+    (redémarrage) reprend au passage suivant, et plusieurs workers peuvent
+    purger en parallèle.
+    """
+
+    def __init__(self, interval: float, batch_size: int, pause: float):
+        self.interval = interval
+        self.batch_size = batch_size
+        self.pause = pause
+        self.runs = 0
+        self.posts_purged = 0
+        self.users_purged = 0
+        self.rows_deleted = 0
+
+    async def purge_steps(self, db, steps: List[PurgeStep]) -> int:
+        total = 0
+        for step in steps:
+            while True:
+                deleted = await db.run(delete_batch, step, self.batch_size)
+                total += deleted
+                PURGED_ROWS.inc(deleted, step.model.__tablename__)
+                if deleted < self.batch_size:
+                    break
+                # Laisser passer les requêtes des utilisateurs entre deux lots
+                await asyncio.sleep(self.pause)
+        self.rows_deleted += total
+        return total
+
+    async def purge_post(self, db, post_id: int):
+        await self.purge_steps(db, post_steps(post_id))
+        await db.run(delete_row, Post, post_id)
+        self.posts_purged += 1
+
+    async def purge_user(self, db, user_id: int):
+        await self.purge_steps(db, user_steps(user_id))
+        while True:
+            post_ids = await db.run(pending_ids, Post, self.batch_size, user_id)
+            for post_id in post_ids:
+                await self.purge_post(db, post_id)
+            if len(post_ids) < self.batch_size:
+                break
+        # Sessions et révocations partent par ON DELETE CASCADE
+        await db.run(delete_row, User, user_id)
+        self.users_purged += 1
+
+    async def purge(self) -> int:
+        """Purge les posts masqués puis les comptes supprimés, retourne le nombre de lignes principales"""
+        purged = 0
+        async with open_async_db() as db:
+            for post_id in await db.run(pending_ids, Post, self.batch_size):
+                await self.purge_post(db, post_id)
+                purged += 1
+            for user_id in await db.run(pending_ids, User, self.batch_size):
+                await self.purge_user(db, user_id)
+                purged += 1
+        self.runs += 1
+        return purged
+
+    async def run(self):
+        """Boucle de purge (tâche de fond de l'application)"""
+        while True:
+            try:
+                purged = await self.purge()
+                if purged:
+                    print(f"🗑️ {purged} deleted post(s)/account(s) purged")
+            except Exception as e:
+                print(f"⚠️ Could not purge deleted rows: {e}")
+            await asyncio.sleep(self.interval)
+
+    def stats(self) -> dict:
+        return {
+            "threshold": PURGE_THRESHOLD,
+            "interval": self.interval,
+            "batch_size": self.batch_size,
+            "runs": self.runs,
+            "posts_purged": self.posts_purged,
+            "users_purged": self.users_purged,
+            "rows_deleted": self.rows_deleted,
+        }
+
+purger = Purger(PURGE_INTERVAL, PURGE_BATCH_SIZE, PURGE_PAUSE)
\ No newline at end of file
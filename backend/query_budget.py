@@ -0,0 +1,176 @@
+"""Budget de requêtes SQL par requête HTTP et détection des N+1
+
+Mode de développement et de test (QUERY_BUDGET_MODE) :
+- off (défaut) : rien n'est ajouté ;
+- report : en-têtes X-Query-Count et X-DB-Time, avertissement quand une
+  route dépasse son budget ou répète la même instruction (motif N+1) ;
+- strict : la requête échoue (500) dans ces deux cas, pour qu'une suite
+  de tests détecte les explosions de requêtes avant le déploiement.
+
+Avec QUERY_EXPLAIN, chaque SELECT exécuté par une route est aussi passé à
+EXPLAIN (une fois par instruction et par processus) : une lecture complète
+de table est signalée, ou fait échouer la requête en mode strict.
+
+Le budget d'une route se déclare avec le décorateur `query_budget`, placé
+sous le décorateur de route :
+
+    @router.get("/")
+    @query_budget(4)
+    async def get_posts(...):
+
+Une route qui parcourt volontairement une table (liste paginée de toute la
+table) la déclare : `@query_budget(3, scans=("users",))`.
+"""
+import json
+import os
+import re
+from typing import Any, Dict, List, Optional, Tuple
+from sqlalchemy.engine import Connection
+from sqlalchemy.exc import DBAPIError
+from starlette.concurrency import run_in_threadpool
+from database import engine
+from metrics import RequestStats, current_request_stats
+
+QUERY_BUDGET_MODE = os.getenv("QUERY_BUDGET_MODE", "off").lower()  # off / report / strict
+QUERY_BUDGET_DEFAULT = int(os.getenv("QUERY_BUDGET_DEFAULT", "20"))
+# Au-delà de ce nombre d'exécutions d'une même instruction, la requête est signalée comme N+1
+N_PLUS_ONE_THRESHOLD = int(os.getenv("N_PLUS_ONE_THRESHOLD", "5"))
+# Plan d'exécution des SELECT des routes (modes report et strict)
+QUERY_EXPLAIN = os.getenv("QUERY_EXPLAIN", "false").lower() == "true"
+
+QUERY_COUNT_HEADER = "X-Query-Count"
+DB_TIME_HEADER = "X-DB-Time"
+
+def query_budget(max_queries: int, scans: Tuple[str, ...] = ()):
+    """Déclare le nombre maximal d'instructions SQL d'une route et les tables qu'elle peut lire en entier"""
+    def decorator(endpoint):
+        endpoint.__query_budget__ = max_queries
+        endpoint.__query_scans__ = scans
+        return endpoint
+    return decorator
+
+def check_budget(stats: RequestStats, budget: int) -> Optional[str]:
+    """Décrit la violation de budget ou le motif N+1 détecté, ou None"""
+    if stats.queries > budget:
+        return f"Query budget exceeded: {stats.queries} statements (budget {budget})"
+    if stats.statements:
+        statement, count = max(stats.statements.items(), key=lambda item: item[1])
+        if count > N_PLUS_ONE_THRESHOLD:
+            return f"N+1 pattern: statement executed {count} times: {' '.join(statement.split())[:200]}"
+    return None
+
+# Plan SQLite d'une lecture complète : "SCAN posts" (sans index ni table virtuelle)
+SQLITE_FULL_SCAN = re.compile(r"^SCAN (?:TABLE )?(\w+)(?: AS \w+)?$")
+
+# Tables lues en entier par chaque instruction déjà expliquée
+_full_scans: Dict[str, List[str]] = {}
+
+def full_scans(conn: Connection, statement: str, parameters) -> List[str]:
+    """Tables lues en entier par l'instruction, d'après son plan d'exécution"""
+    if conn.dialect.name in ("mysql", "mariadb"):
+        rows = conn.exec_driver_sql("EXPLAIN " + statement, parameters).mappings().all()
+        # <derived2>, <subquery3>... : résultats intermédiaires, pas des tables
+        return [row["table"] for row in rows if row["type"] == "ALL" and not row["table"].startswith("<")]
+    tables = []
+    for row in conn.exec_driver_sql("EXPLAIN QUERY PLAN " + statement, parameters):
+        match = SQLITE_FULL_SCAN.match(row[-1])
+        if match:
+            tables.append(match.group(1))
+    return tables
+
+def explain_statements(parameters: Dict[str, Any]) -> List[Tuple[str, List[str]]]:
+    """Instructions de la requête qui lisent une table en entier, avec ces tables"""
+    # Les EXPLAIN ne comptent pas dans les statistiques de la requête
+    current_request_stats.set(RequestStats())
+    pending = [
+        statement for statement in parameters
+        if statement not in _full_scans and statement.lstrip()[:6].upper() in ("SELECT", "WITH")
+    ]
+    if pending:
+        with engine.connect() as conn:
+            for statement in pending:
+                try:
+                    _full_scans[statement] = full_scans(conn, statement, parameters[statement])
+                except DBAPIError as e:
+                    conn.rollback()
+                    _full_scans[statement] = []
+                    print(f"⚠️ Could not explain statement: {str(e).splitlines()[0]}")
+    return [(statement, _full_scans[statement]) for statement in parameters if _full_scans.get(statement)]
+
+def check_scans(scans: List[Tuple[str, List[str]]], allowed: Tuple[str, ...]) -> Optional[str]:
+    """Décrit la première lecture complète d'une table non déclarée par la route, ou None"""
+    for statement, tables in scans:
+        tables = [table for table in tables if table not in allowed]
+        if tables:
+            return f"Full table scan of {', '.join(tables)}: {' '.join(statement.split())[:200]}"
+    return None
+
+class QueryBudgetMiddleware:
+    """Middleware ASGI : compteurs SQL en en-têtes et application des budgets"""
+
+    def __init__(self, app, mode: str = QUERY_BUDGET_MODE, explain: bool = QUERY_EXPLAIN):
+        self.app = app
+        self.mode = mode
+        self.explain = explain
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or self.mode == "off":
+            await self.app(scope, receive, send)
+            return
+
+        # Réutiliser les statistiques du middleware de métriques s'il est en amont
+        stats = current_request_stats.get()
+        token = None
+        if stats is None:
+            stats = RequestStats()
+            token = current_request_stats.set(stats)
+        stats.statements = {}
+        stats.parameters = {} if self.explain else None
+        rejected = False
+
+        async def send_with_budget(message):
+            nonlocal rejected
+            if message["type"] == "http.response.start":
+                # Le routeur a renseigné l'endpoint servi dans le scope
+                endpoint = scope.get("endpoint")
+                budget = getattr(endpoint, "__query_budget__", QUERY_BUDGET_DEFAULT)
+                violation = check_budget(stats, budget)
+                if violation is None and stats.parameters:
+                    scans = await run_in_threadpool(explain_statements, stats.parameters)
+                    violation = check_scans(scans, getattr(endpoint, "__query_scans__", ()))
+                if violation:
+                    print(f"⚠️ {scope['method']} {scope['path']}: {violation}")
+                if violation and self.mode == "strict":
+                    rejected = True
+                    message = self._error_start(stats)
+                    await send(message)
+                    await send({
+                        "type": "http.response.body",
+                        "body": json.dumps({"detail": violation}).encode("utf-8")
+                    })
+                    return
+                message["headers"] = list(message.get("headers", [])) + self._headers(stats)
+            elif rejected:
+                # Corps de la réponse d'origine, remplacé par l'erreur
+                return
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_budget)
+        finally:
+            if token is not None:
+                current_request_stats.reset(token)
+
+    @staticmethod
+    def _headers(stats: RequestStats) -> list:
+        return [
+            (QUERY_COUNT_HEADER.lower().encode("latin-1"), str(stats.queries).encode("latin-1")),
+            (DB_TIME_HEADER.lower().encode("latin-1"), f"{stats.db_time * 1000:.2f}ms".encode("latin-1")),
+        ]
+
+    def _error_start(self, stats: RequestStats) -> dict:
+        return {
+            "type": "http.response.start",
+            "status": 500,
+            "headers": [(b"content-type", b"application/json")] + self._headers(stats),
+        }
\ No newline at end of file
@@ -0,0 +1,87 @@
+"""Réconciliation des compteurs dénormalisés (like_count, comment_count)
+
+Parcourt les tables par lots de clés primaires et corrige uniquement les
+lignes dont le compteur a dérivé. Chaque lot est une transaction courte :
+seules les lignes du lot sont verrouillées, jamais la table entière.
+
+Refuse de s'exécuter avec LIKE_COALESCE activé : les variations encore en
+attente dans le tampon des workers (likes.LikeCounterBuffer) seraient
+réappliquées au prochain vidage, par-dessus le compteur corrigé. Arrêter
+l'API (le tampon est vidé à l'arrêt), puis lancer la réconciliation avec
+LIKE_COALESCE=false.
+
+Usage :
+    python reconcile_counters.py [--batch-size 1000] [--pause 0.05]
+"""
+import argparse
+import time
+from sqlalchemy import select, func
+from sqlalchemy.orm import Session
+from database import SessionLocal
+from likes import like_buffer
+from models import Post, PostLike, Comment, CommentLike
+
+def _counters():
+    """Compteurs à réconcilier : (modèle, colonne, sous-requête de comptage)"""
+    return [
+        (Post, Post.like_count,
+         select(func.count(PostLike.id)).where(PostLike.post_id == Post.id).scalar_subquery()),
+        (Post, Post.comment_count,
+         select(func.count(Comment.id)).where(Comment.post_id == Post.id).scalar_subquery()),
+        (Comment, Comment.like_count,
+         select(func.count(CommentLike.id)).where(CommentLike.comment_id == Comment.id).scalar_subquery()),
+    ]
+
+def reconcile_batch(db: Session, model, column, count_subquery, ids) -> int:
+    """Corrige un lot de lignes et retourne le nombre de lignes réparées"""
+    repaired = db.query(model).filter(
+        model.id.in_(ids),
+        column != count_subquery
+    ).update({column: count_subquery, model.updated_at: model.updated_at}, synchronize_session=False)
+    db.commit()
+    return repaired
+
+def reconcile_counters(db: Session, batch_size: int = 1000, pause: float = 0.0) -> dict:
+    """Réconcilie tous les compteurs, lot par lot, et retourne les réparations par compteur"""
+    if like_buffer.enabled:
+        raise RuntimeError(
+            "LIKE_COALESCE is enabled: stop the API, then run the reconciliation with LIKE_COALESCE=false"
+        )
+    report = {}
+    for model, column, count_subquery in _counters():
+        name = f"{model.__tablename__}.{column.key}"
+        repaired = 0
+        last_id = 0
+        while True:
+            # Pagination par clé primaire : chaque lot est lu via l'index
+            ids = [row_id for (row_id,) in db.query(model.id).filter(
+                model.id > last_id
+            ).order_by(model.id).limit(batch_size)]
+            if not ids:
+                break
+
+            repaired += reconcile_batch(db, model, column, count_subquery, ids)
+            last_id = ids[-1]
+
+            if pause:
+                time.sleep(pause)
+
+        report[name] = repaired
+    return report
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Réconcilie les compteurs de likes et de commentaires")
+    parser.add_argument("--batch-size", type=int, default=1000, help="Nombre de lignes par transaction")
+    parser.add_argument("--pause", type=float, default=0.05, help="Pause (secondes) entre deux lots")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        report = reconcile_counters(db, batch_size=args.batch_size, pause=args.pause)
+    except RuntimeError as e:
+        raise SystemExit(f"❌ {e}")
+    finally:
+        db.close()
+
+    for name, repaired in report.items():
+        print(f"✅ {name} : {repaired} ligne(s) corrigée(s)")
\ No newline at end of file
@@ -0,0 +1,176 @@
+"""Lecture sur les répliques MariaDB
+
+Les routes de lecture (GET de posts, commentaires et utilisateurs) reçoivent
+leur session par `get_read_db` : une réplique saine, choisie à tour de rôle,
+ou le primaire à défaut. Les écritures restent sur le primaire (`get_async_db`).
+
+- Santé : toutes les REPLICA_CHECK_INTERVAL secondes, chaque réplique est
+  interrogée (SHOW SLAVE STATUS) ; une réplique injoignable, dont la
+  réplication est arrêtée ou en retard de plus de REPLICA_MAX_LAG secondes
+  n'est plus utilisée jusqu'au contrôle suivant.
+- Lire ses propres écritures : une écriture réussie pose un cookie qui
+  renvoie les lectures de ce client vers le primaire pendant
+  REPLICA_STICKY_SECONDS secondes (valable quel que soit le worker).
+
+Sans DATABASE_REPLICA_URLS, toutes les lectures vont au primaire.
+"""
+import asyncio
+import itertools
+import os
+import time
+from contextlib import asynccontextmanager
+from typing import List, Optional
+from fastapi import Request
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+from starlette.concurrency import run_in_threadpool
+from database import DB_MODE, SessionLocal, AsyncSessionLocal, session_scope, to_async_url, engine_options
+from metrics import instrument_engine, REPLICA_HEALTHY, REPLICA_LAG
+
+# URLs des répliques, séparées par des virgules
+DATABASE_REPLICA_URLS = [url.strip() for url in os.getenv("DATABASE_REPLICA_URLS", "").split(",") if url.strip()]
+REPLICA_MAX_LAG = float(os.getenv("REPLICA_MAX_LAG", "5"))
+REPLICA_CHECK_INTERVAL = float(os.getenv("REPLICA_CHECK_INTERVAL", "5"))
+# Doit dépasser REPLICA_MAX_LAG : après ce délai, une réplique saine a reçu l'écriture
+REPLICA_STICKY_SECONDS = int(os.getenv("REPLICA_STICKY_SECONDS", "10"))
+
+STICKY_COOKIE = "db_primary_until"
+
+# Méthodes HTTP sans écriture
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+
+class Replica:
+    """Moteur(s) d'une réplique et résultat du dernier contrôle de santé"""
+
+    def __init__(self, name: str, url: str):
+        self.name = name
+        self.engine = create_engine(url, **engine_options(url))
+        instrument_engine(self.engine, name)
+        self.session_factory = sessionmaker(autocommit=False, autoflush=False, bind=self.engine)
+        self.async_engine = None
+        self.async_session_factory = None
+        if DB_MODE == "async":
+            from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+
+            async_url = to_async_url(url)
+            self.async_engine = create_async_engine(async_url, **engine_options(async_url))
+            instrument_engine(self.async_engine.sync_engine, f"{name}-async")
+            self.async_session_factory = async_sessionmaker(self.async_engine, autoflush=False)
+        # Pas de lecture avant le premier contrôle réussi
+        self.healthy = False
+        self.lag: Optional[float] = None
+        self.error: Optional[str] = None
+        REPLICA_HEALTHY.set_function(lambda: 1 if self.healthy else 0, name)
+        REPLICA_LAG.set_function(lambda: self.lag, name)
+
+    def measure_lag(self) -> Optional[float]:
+        """Retard de réplication en secondes (None si la réplication est arrêtée)"""
+        with self.engine.connect() as conn:
+            if self.engine.dialect.name not in ("mysql", "mariadb"):
+                # SQLite (développement local) : pas de réplication, seulement la connexion
+                conn.execute(text("SELECT 1"))
+                return 0.0
+            row = conn.execute(text("SHOW SLAVE STATUS")).mappings().first()
+            if row is None:
+                # Serveur qui n'est pas (ou plus) une réplique : à jour par définition
+                return 0.0
+            lag = row["Seconds_Behind_Master"]
+            return None if lag is None else float(lag)
+
+    def check(self):
+        try:
+            self.lag = self.measure_lag()
+            self.error = None if self.lag is not None else "replication stopped"
+        except Exception as e:
+            self.lag = None
+            self.error = str(e).splitlines()[0]
+        was_healthy = self.healthy
+        self.healthy = self.lag is not None and self.lag <= REPLICA_MAX_LAG
+        if was_healthy != self.healthy:
+            state = "✅ healthy" if self.healthy else f"⚠️ unhealthy ({self.error or f'lag {self.lag}s'})"
+            print(f"{state}: {self.name}")
+
+    def stats(self) -> dict:
+        return {"name": self.name, "healthy": self.healthy, "lag": self.lag, "error": self.error}
+
+class ReplicaSet:
+    """Répliques de lecture, choisies à tour de rôle parmi les saines"""
+
+    def __init__(self, urls: List[str], interval: float):
+        self.replicas = [Replica(f"replica{index}", url) for index, url in enumerate(urls)]
+        self.interval = interval
+        self.replica_reads = 0
+        self.primary_reads = 0
+        self.sticky_reads = 0
+        self._counter = itertools.count()
+
+    def choose(self, sticky_until: Optional[str]) -> Optional[Replica]:
+        """Réplique pour une lecture, ou None pour lire sur le primaire"""
+        if not self.replicas:
+            return None
+        if sticky_until and sticky_until.isdigit() and int(sticky_until) > time.time():
+            self.sticky_reads += 1
+            return None
+        healthy = [replica for replica in self.replicas if replica.healthy]
+        if not healthy:
+            self.primary_reads += 1
+            return None
+        self.replica_reads += 1
+        return healthy[next(self._counter) % len(healthy)]
+
+    async def run(self):
+        """Boucle des contrôles de santé (tâche de fond de l'application)"""
+        while True:
+            for replica in self.replicas:
+                await run_in_threadpool(replica.check)
+            await asyncio.sleep(self.interval)
+
+    async def dispose(self):
+        for replica in self.replicas:
+            replica.engine.dispose()
+            if replica.async_engine is not None:
+                await replica.async_engine.dispose()
+
+    def stats(self) -> dict:
+        return {
+            "replicas": [replica.stats() for replica in self.replicas],
+            "replica_reads": self.replica_reads,
+            "primary_reads": self.primary_reads,
+            "sticky_reads": self.sticky_reads,
+        }
+
+replica_set = ReplicaSet(DATABASE_REPLICA_URLS, REPLICA_CHECK_INTERVAL)
+
+# Dependency des routes de lecture : réplique saine ou primaire
+async def get_read_db(request: Request):
+    replica = replica_set.choose(request.cookies.get(STICKY_COOKIE))
+    if replica is None:
+        factories = (SessionLocal, AsyncSessionLocal)
+    else:
+        factories = (replica.session_factory, replica.async_session_factory)
+    async with session_scope(*factories) as db:
+        yield db
+
+# Session de lecture hors injection de dépendances (réponses en streaming)
+open_read_db = asynccontextmanager(get_read_db)
+
+class ReadYourWritesMiddleware:
+    """Middleware ASGI : après une écriture réussie, lectures du client sur le primaire"""
+
+    def __init__(self, app, window: int = REPLICA_STICKY_SECONDS):
+        self.app = app
+        self.window = window
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] in SAFE_METHODS or not replica_set.replicas:
+            await self.app(scope, receive, send)
+            return
+
+        async def send_with_cookie(message):
+            if message["type"] == "http.response.start" and message["status"] < 400:
+                until = int(time.time()) + self.window + 1
+                cookie = f"{STICKY_COOKIE}={until}; Max-Age={self.window}; Path=/; HttpOnly; SameSite=Lax"
+                message["headers"] = list(message.get("headers", [])) + [(b"set-cookie", cookie.encode("latin-1"))]
+            await send(message)
+
+        await self.app(scope, receive, send_with_cookie)
\ No newline at end of file
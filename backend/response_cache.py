@@ -0,0 +1,186 @@
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, Optional, Set
+from fastapi import Response
+from serialization import dumps
+
+# Configuration du cache des réponses anonymes
+RESPONSE_CACHE_BACKEND = os.getenv("RESPONSE_CACHE_BACKEND", "memory")  # memory / none
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", "10"))
+RESPONSE_CACHE_MAX_BYTES = int(os.getenv("RESPONSE_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+
+# Tags d'invalidation
+TAG_POST_LISTS = "posts:list"
+
+def post_tag(post_id: int) -> str:
+    return f"post:{post_id}"
+
+def user_tag(user_id: int) -> str:
+    return f"user:{user_id}"
+
+class CacheBackend:
+    """Interface d'un backend de cache de réponses
+
+    Les valeurs sont des octets et les entrées portent des tags : un backend
+    externe (Redis, memcached...) n'a qu'à implémenter ces méthodes.
+    """
+
+    async def get(self, key: str) -> Optional[bytes]:
+        raise NotImplementedError
+
+    async def set(self, key: str, value: bytes, tags: Iterable[str], ttl: float):
+        raise NotImplementedError
+
+    async def invalidate_tags(self, tags: Iterable[str]) -> int:
+        raise NotImplementedError
+
+    async def clear(self):
+        raise NotImplementedError
+
+    def stats(self) -> dict:
+        raise NotImplementedError
+
+class NullBackend(CacheBackend):
+    """Backend désactivé : rien n'est jamais mis en cache"""
+
+    async def get(self, key: str) -> Optional[bytes]:
+        return None
+
+    async def set(self, key: str, value: bytes, tags: Iterable[str], ttl: float):
+        pass
+
+    async def invalidate_tags(self, tags: Iterable[str]) -> int:
+        return 0
+
+    async def clear(self):
+        pass
+
+    def stats(self) -> dict:
+        return {"backend": "none"}
+
+class MemoryBackend(CacheBackend):
+    """Backend LRU en mémoire, borné en octets, propre à chaque worker"""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self._entries = OrderedDict()  # clé -> (expiration, valeur, tags)
+        self._tags: Dict[str, Set[str]] = {}  # tag -> clés
+        self._lock = threading.Lock()
+
+    def _remove(self, key: str):
+        _, value, tags = self._entries.pop(key)
+        self.bytes -= len(key) + len(value)
+        for tag in tags:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+
+    async def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= time.monotonic():
+                if entry is not None:
+                    self._remove(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    async def set(self, key: str, value: bytes, tags: Iterable[str], ttl: float):
+        size = len(key) + len(value)
+        if size > self.max_bytes:
+            return
+        tags = frozenset(tags)
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (time.monotonic() + ttl, value, tags)
+            self.bytes += size
+            for tag in tags:
+                self._tags.setdefault(tag, set()).add(key)
+            while self.bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    async def invalidate_tags(self, tags: Iterable[str]) -> int:
+        with self._lock:
+            keys = set()
+            for tag in tags:
+                keys |= self._tags.get(tag, set())
+            for key in keys:
+                self._remove(key)
+            self.invalidations += len(keys)
+            return len(keys)
+
+    async def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._tags.clear()
+            self.bytes = 0
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "backend": "memory",
+            "entries": len(self._entries),
+            "bytes": self.bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
+
+class ResponseCache:
+    """Cache des réponses JSON servies aux visiteurs anonymes
+
+    Une entrée est invalidée précisément par les routes d'écriture via ses
+    tags ; le TTL court borne l'obsolescence restante (autres workers,
+    écritures concurrentes à un remplissage).
+    """
+
+    def __init__(self, backend: CacheBackend, ttl: float):
+        self.backend = backend
+        self.ttl = ttl
+
+    async def get(self, key: str) -> Optional[Response]:
+        """Réponse en cache pour cette clé, ou None"""
+        value = await self.backend.get(key)
+        if value is None:
+            return None
+        raw_headers, _, body = value.partition(b"\n")
+        return Response(content=body, media_type="application/json", headers=json.loads(raw_headers))
+
+    async def store(self, key: str, content, tags: Iterable[str], headers: Optional[dict] = None) -> Response:
+        """Sérialise le contenu, le met en cache et retourne la réponse"""
+        body = dumps(content)
+        headers = headers or {}
+        value = json.dumps(headers).encode("utf-8") + b"\n" + body
+        await self.backend.set(key, value, tags, self.ttl)
+        return Response(content=body, media_type="application/json", headers=headers)
+
+    async def invalidate(self, *tags: str) -> int:
+        """Invalide toutes les entrées portant l'un des tags"""
+        return await self.backend.invalidate_tags(tags)
+
+    def stats(self) -> dict:
+        return self.backend.stats()
+
+def _create_backend() -> CacheBackend:
+    if RESPONSE_CACHE_BACKEND == "memory":
+        return MemoryBackend(RESPONSE_CACHE_MAX_BYTES)
+    return NullBackend()
+
+response_cache = ResponseCache(_create_backend(), RESPONSE_CACHE_TTL)
\ No newline at end of file
@@ -1,108 +1,207 @@
 from fastapi import APIRouter, Depends, HTTPException, Cookie, Response
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 from typing import Optional
-from database import get_db
+from database import DBSession, get_async_db
 from models import User
-from schemas import UserCreate, UserLogin, LoginResponse, LogoutResponse, User as UserSchema
+from schemas import UserCreate, UserLogin, LoginResponse, LogoutResponse, RefreshResponse, User as UserSchema
 from auth import (
-    get_password_hash, 
-    authenticate_user, 
+    hash_password_async, 
+    verify_password_async, 
+    get_active_user, 
     create_session, 
     get_current_user, 
-    invalidate_session
+    invalidate_session,
+    invalidate_tokens,
+    create_access_token,
+    refresh_access_token,
+    SESSION_MODE,
+    SESSION_EXPIRE_DAYS,
+    ACCESS_TOKEN_EXPIRE_SECONDS
 )
 
 router = APIRouter(prefix="/auth", tags=["authentication"])
 
-@router.post("/register", response_model=LoginResponse)
-def register(user_data: UserCreate, response: Response, db: Session = Depends(get_db)):
-    """Inscription d'un nouvel utilisateur"""
-    
-    # Vérifier si l'utilisateur existe déjà
+# Cookie de la session de rafraîchissement (mode token), envoyé uniquement aux routes /auth
+REFRESH_COOKIE = "refresh_token"
+
+def set_access_cookie(response: Response, value: str, max_age: int):
+    response.set_cookie(
+        key="session_id",
+        value=value,
+        httponly=True,
+        secure=False,  # True en production avec HTTPS
+        samesite="lax",
+        max_age=max_age
+    )
+
+def set_session_cookies(response: Response, user_id: int, session_id: str):
+    """Cookies de la session créée : identifiant opaque, ou jeton d'accès + rafraîchissement"""
+    if SESSION_MODE != "token":
+        set_access_cookie(response, session_id, SESSION_EXPIRE_DAYS * 24 * 60 * 60)
+        return
+    set_access_cookie(response, create_access_token(user_id), ACCESS_TOKEN_EXPIRE_SECONDS)
+    response.set_cookie(
+        key=REFRESH_COOKIE,
+        value=session_id,
+        httponly=True,
+        secure=False,  # True en production avec HTTPS
+        samesite="strict",
+        path="/auth",
+        max_age=SESSION_EXPIRE_DAYS * 24 * 60 * 60
+    )
+
+def clear_session_cookies(response: Response):
+    """Supprime les cookies de session (logout, suppression du compte)"""
+    response.delete_cookie(key="session_id")
+    if SESSION_MODE == "token":
+        response.delete_cookie(key=REFRESH_COOKIE, path="/auth")
+
+def check_available(db: Session, username: str, email: str):
+    """Lève une 400 si le nom d'utilisateur ou l'email est déjà pris"""
     existing_user = db.query(User).filter(
-        (User.username == user_data.username) | (User.email == user_data.email)
+        (User.username == username) | (User.email == email)
     ).first()
     
     if existing_user:
-        if existing_user.username == user_data.username:
+        if existing_user.username == username:
             raise HTTPException(status_code=400, detail="Username already taken")
         else:
             raise HTTPException(status_code=400, detail="Email already registered")
+
+@router.post("/register", response_model=LoginResponse)
+async def register(user_data: UserCreate, response: Response, db: DBSession = Depends(get_async_db)):
+    """Inscription d'un nouvel utilisateur"""
     
-    # Créer le nouvel utilisateur
-    hashed_password = get_password_hash(user_data.password)
-    db_user = User(
-        username=user_data.username,
-        email=user_data.email,
-        password_hash=hashed_password,
-        display_name=user_data.display_name,
-        bio=user_data.bio,
-        avatar_url=user_data.avatar_url
-    )
+    def check(db: Session):
+        # Vérifier si l'utilisateur existe déjà
+        check_available(db, user_data.username, user_data.email)
+        # Rendre la connexion au pool pendant le hachage
+        db.close()
     
-    db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    await db.run(check)
     
-    # Créer une session automatiquement
-    session_id = create_session(db, db_user.id)
-    response.set_cookie(
-        key="session_id",
-        value=session_id,
-        httponly=True,
-        secure=False,  # True en production avec HTTPS
-        samesite="lax",
-        max_age=7 * 24 * 60 * 60  # 7 jours
-    )
+    # Hacher le mot de passe dans le pool bcrypt dédié (503 si saturé)
+    hashed_password = await hash_password_async(user_data.password)
     
-    return LoginResponse(
-        message="Registration successful",
-        user=UserSchema.from_orm(db_user)
-    )
+    def handler(db: Session):
+        # Créer le nouvel utilisateur
+        db_user = User(
+            username=user_data.username,
+            email=user_data.email,
+            password_hash=hashed_password,
+            display_name=user_data.display_name,
+            bio=user_data.bio,
+            avatar_url=user_data.avatar_url
+        )
+        
+        db.add(db_user)
+        try:
+            db.commit()
+        except IntegrityError:
+            # Inscription concurrente avec le même nom ou email, entre la vérification et l'insertion
+            db.rollback()
+            check_available(db, user_data.username, user_data.email)
+            raise
+        db.refresh(db_user)
+        
+        # Créer une session automatiquement
+        session_id = create_session(db, db_user.id)
+        set_session_cookies(response, db_user.id, session_id)
+        
+        return LoginResponse(
+            message="Registration successful",
+            user=UserSchema.from_orm(db_user)
+        )
+    
+    return await db.run(handler)
 
 @router.post("/login", response_model=LoginResponse)
-def login(user_data: UserLogin, response: Response, db: Session = Depends(get_db)):
+async def login(user_data: UserLogin, response: Response, db: DBSession = Depends(get_async_db)):
     """Connexion utilisateur"""
     
-    # Authentifier l'utilisateur
-    user = authenticate_user(user_data.username, user_data.password, db)
+    def find_user(db: Session) -> Optional[User]:
+        user = get_active_user(user_data.username, db)
+        # Rendre la connexion au pool pendant la vérification (l'utilisateur reste chargé)
+        db.close()
+        return user
+    
+    # Authentifier l'utilisateur (vérification bcrypt dans le pool dédié, 503 si saturé)
+    user = await db.run(find_user)
     if not user:
         raise HTTPException(status_code=401, detail="Invalid username or password")
     
-    # Créer une session
-    session_id = create_session(db, user.id)
-    response.set_cookie(
-        key="session_id",
-        value=session_id,
-        httponly=True,
-        secure=False,  # True en production
-        samesite="lax",
-        max_age=7 * 24 * 60 * 60  # 7 jours
-    )
+    is_valid, new_hash = await verify_password_async(user_data.password, user.password_hash)
+    if not is_valid:
+        raise HTTPException(status_code=401, detail="Invalid username or password")
     
-    return LoginResponse(
-        message="Login successful",
-        user=UserSchema.from_orm(user)
-    )
+    def handler(db: Session):
+        # Hash d'un ancien coût : le remplacer (enregistré avec la session)
+        if new_hash:
+            db.query(User).filter(User.id == user.id).update(
+                {User.password_hash: new_hash, User.updated_at: User.updated_at},
+                synchronize_session=False
+            )
+        
+        # Créer une session
+        session_id = create_session(db, user.id)
+        set_session_cookies(response, user.id, session_id)
+        
+        return LoginResponse(
+            message="Login successful",
+            user=UserSchema.from_orm(user)
+        )
+    
+    return await db.run(handler)
+
+@router.post("/refresh", response_model=RefreshResponse)
+async def refresh(
+    response: Response,
+    refresh_token: Optional[str] = Cookie(None),
+    db: DBSession = Depends(get_async_db)
+):
+    """Nouveau jeton d'accès à partir de la session de rafraîchissement (SESSION_MODE=token)"""
+    if SESSION_MODE != "token":
+        raise HTTPException(status_code=400, detail="Token sessions are disabled")
+    
+    access_token = await db.run(lambda db: refresh_access_token(refresh_token, db))
+    if not access_token:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    
+    set_access_cookie(response, access_token, ACCESS_TOKEN_EXPIRE_SECONDS)
+    return RefreshResponse(message="Token refreshed", expires_in=ACCESS_TOKEN_EXPIRE_SECONDS)
 
 @router.post("/logout", response_model=LogoutResponse)
-def logout(response: Response, session_id: Optional[str] = Cookie(None), db: Session = Depends(get_db)):
+async def logout(
+    response: Response,
+    session_id: Optional[str] = Cookie(None),
+    refresh_token: Optional[str] = Cookie(None),
+    db: DBSession = Depends(get_async_db)
+):
     """Déconnexion utilisateur"""
     
-    if session_id:
-        invalidate_session(session_id, db)
-    
-    # Supprimer le cookie
-    response.delete_cookie(key="session_id")
+    def handler(db: Session):
+        if SESSION_MODE == "token":
+            invalidate_tokens(session_id, refresh_token, db)
+        elif session_id:
+            invalidate_session(session_id, db)
+        
+        # Supprimer les cookies
+        clear_session_cookies(response)
+        
+        return LogoutResponse(message="Logout successful")
     
-    return LogoutResponse(message="Logout successful")
+    return await db.run(handler)
 
 @router.get("/me", response_model=UserSchema)
-def get_current_user_info(session_id: Optional[str] = Cookie(None), db: Session = Depends(get_db)):
+async def get_current_user_info(session_id: Optional[str] = Cookie(None), db: DBSession = Depends(get_async_db)):
     """Récupérer les informations de l'utilisateur connecté"""
     
-    user = get_current_user(session_id, db)
-    if not user:
-        raise HTTPException(status_code=401, detail="Not authenticated")
+    def handler(db: Session):
+        user = get_current_user(session_id, db)
+        if not user:
+            raise HTTPException(status_code=401, detail="Not authenticated")
+        
+        return UserSchema.from_orm(user)
     
-    return UserSchema.from_orm(user)
\ No newline at end of file
+    return await db.run(handler)
\ No newline at end of file
@@ -1,182 +1,270 @@
-from fastapi import APIRouter, Depends, HTTPException, Cookie
+from fastapi import APIRouter, Depends, HTTPException, Cookie, Header, Query, Response
 from sqlalchemy.orm import Session
-from sqlalchemy import func
-from typing import Optional, List
-from database import get_db
-from models import User, Comment, CommentLike, Post
+from typing import Optional, List, Union
+from database import DBSession, get_async_db
+from replicas import get_read_db
+from models import User, Comment, Post
 from schemas import (
     CommentCreate, CommentUpdate, Comment as CommentSchema,
-    LikeResponse
+    CompactCommentPage, LikeResponse
 )
 from auth import get_current_user
+from enrichment import comments_query, enrich_comments
+from serialization import json_response
+from conditional import comments_page, page_response
+from pagination import MAX_PAGE_SIZE, NEXT_CURSOR_HEADER, keyset_after, set_next_cursor
+from response_cache import response_cache, post_tag
+from likes import COMMENT_LIKES, set_like, toggle_like
+from search import search_ids
+from query_budget import query_budget
 
 router = APIRouter(prefix="/comments", tags=["comments"])
 
-def get_current_user_required(session_id: Optional[str] = Cookie(None), db: Session = Depends(get_db)):
+async def get_current_user_optional(session_id: Optional[str] = Cookie(None), db: DBSession = Depends(get_async_db)):
+    """Récupère l'utilisateur actuel (optionnel pour les vues publiques)"""
+    if session_id:
+        return await db.run(lambda db: get_current_user(session_id, db))
+    return None
+
+async def get_current_user_required(session_id: Optional[str] = Cookie(None), db: DBSession = Depends(get_async_db)):
     """Récupère l'utilisateur actuel (obligatoire)"""
-    user = get_current_user(session_id, db)
+    user = await db.run(lambda db: get_current_user(session_id, db))
     if not user:
         raise HTTPException(status_code=401, detail="Authentication required")
     return user
 
 @router.post("/", response_model=CommentSchema)
-def create_comment(
+async def create_comment(
     comment_data: CommentCreate,
     current_user: User = Depends(get_current_user_required),
-    db: Session = Depends(get_db)
+    db: DBSession = Depends(get_async_db)
 ):
     """Créer un nouveau commentaire"""
     
-    # Vérifier que le post existe
-    post = db.query(Post).filter(Post.id == comment_data.post_id).first()
-    if not post:
-        raise HTTPException(status_code=404, detail="Post not found")
+    def handler(db: Session):
+        # Vérifier que le post existe
+        post = db.query(Post).filter(Post.id == comment_data.post_id, Post.deleted_at.is_(None)).first()
+        if not post:
+            raise HTTPException(status_code=404, detail="Post not found")
+        
+        db_comment = Comment(
+            post_id=comment_data.post_id,
+            user_id=current_user.id,
+            content=comment_data.content
+        )
+        
+        db.add(db_comment)
+        
+        # Incrémenter le compteur de commentaires dans la même transaction
+        db.query(Post).filter(Post.id == comment_data.post_id).update(
+            {Post.comment_count: Post.comment_count + 1, Post.updated_at: Post.updated_at},
+            synchronize_session=False
+        )
+        db.commit()
+        db.refresh(db_comment)
+        
+        # Charger le commentaire avec l'auteur
+        comment_with_author = db.query(Comment).filter(Comment.id == db_comment.id).first()
+        
+        result = CommentSchema.from_orm(comment_with_author)
+        result.like_count = 0
+        result.is_liked = False
+        
+        return result
     
-    db_comment = Comment(
-        post_id=comment_data.post_id,
-        user_id=current_user.id,
-        content=comment_data.content
-    )
+    result = await db.run(handler)
     
-    db.add(db_comment)
-    db.commit()
-    db.refresh(db_comment)
+    # Le compteur de commentaires du post a changé
+    await response_cache.invalidate(post_tag(comment_data.post_id))
+    return result
+
+@router.get("/search", response_model=Union[List[CommentSchema], CompactCommentPage])
+@query_budget(5)
+async def search_comments(
+    response: Response,
+    q: str = Query(..., min_length=1, max_length=200),
+    cursor: Optional[str] = None,
+    limit: int = 20,
+    compact: bool = False,
+    current_user: Optional[User] = Depends(get_current_user_optional),
+    db: DBSession = Depends(get_read_db)
+):
+    """Rechercher des commentaires par mots-clés, du plus pertinent au moins pertinent
     
-    # Charger le commentaire avec l'auteur
-    comment_with_author = db.query(Comment).filter(Comment.id == db_comment.id).first()
+    Avec `compact=true`, auteurs regroupés dans `users` (CompactCommentPage).
+    """
+    limit = min(limit, MAX_PAGE_SIZE)
     
-    result = CommentSchema.from_orm(comment_with_author)
-    result.like_count = 0
-    result.is_liked = False
+    def handler(db: Session):
+        comment_ids, next_page = search_ids(db, "comments", q, cursor, limit)
+        if next_page:
+            response.headers[NEXT_CURSOR_HEADER] = next_page
+        if not comment_ids:
+            return enrich_comments(db, [], current_user, compact)
+        
+        # Charger les commentaires trouvés (hors posts supprimés) et conserver l'ordre de pertinence
+        comments = {comment.id: comment for comment in comments_query(db, compact).join(Comment.post).filter(
+            Comment.id.in_(comment_ids),
+            Post.deleted_at.is_(None)
+        )}
+        comments = [comments[comment_id] for comment_id in comment_ids if comment_id in comments]
+        return enrich_comments(db, comments, current_user, compact)
     
-    return result
+    return json_response(await db.run(handler), response)
 
-@router.get("/post/{post_id}", response_model=List[CommentSchema])
-def get_post_comments(
+@router.get("/post/{post_id}", response_model=Union[List[CommentSchema], CompactCommentPage])
+@query_budget(4)
+async def get_post_comments(
     post_id: int,
-    current_user: Optional[User] = Depends(lambda session_id: get_current_user(session_id, next(get_db())) if session_id else None),
-    db: Session = Depends(get_db)
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: int = 50,
+    compact: bool = False,
+    if_none_match: Optional[str] = Header(None),
+    current_user: Optional[User] = Depends(get_current_user_optional),
+    db: DBSession = Depends(get_read_db)
 ):
-    """Récupérer tous les commentaires d'un post"""
-    
-    # Vérifier que le post existe
-    post = db.query(Post).filter(Post.id == post_id).first()
-    if not post:
-        raise HTTPException(status_code=404, detail="Post not found")
-    
-    comments = db.query(Comment).join(User).filter(
-        Comment.post_id == post_id,
-        User.is_active == True
-    ).order_by(Comment.created_at).all()
-    
-    # Enrichir les commentaires avec les likes
-    result = []
-    for comment in comments:
-        like_count = db.query(func.count(CommentLike.id)).filter(
-            CommentLike.comment_id == comment.id
-        ).scalar() or 0
-        
-        is_liked = False
-        if current_user:
-            is_liked = db.query(CommentLike).filter(
-                CommentLike.comment_id == comment.id,
-                CommentLike.user_id == current_user.id
-            ).first() is not None
-        
-        comment_data = CommentSchema.from_orm(comment)
-        comment_data.like_count = like_count
-        comment_data.is_liked = is_liked
-        result.append(comment_data)
+    """Récupérer les commentaires d'un post, du plus ancien au plus récent
     
-    return result
+    Paginé par curseur : la page suivante s'obtient avec la valeur de
+    l'en-tête X-Next-Cursor. Avec `compact=true`, auteurs regroupés dans `users`.
+    Réponse 304 si If-None-Match porte l'ETag de la page courante.
+    """
+    limit = min(limit, MAX_PAGE_SIZE)
+    
+    def handler(db: Session):
+        # Vérifier que le post existe
+        post_exists = db.query(Post.id).filter(Post.id == post_id, Post.deleted_at.is_(None)).first()
+        if not post_exists:
+            raise HTTPException(status_code=404, detail="Post not found")
+        
+        query = comments_query(db, compact).filter(Comment.post_id == post_id).order_by(
+            Comment.created_at, Comment.id
+        )
+        if cursor:
+            query = query.filter(keyset_after(Comment, cursor))
+        
+        comments = query.limit(limit).all()
+        set_next_cursor(response, comments, limit)
+        
+        # Enrichir les commentaires avec les likes, sauf si le client a déjà la page
+        return comments_page(db, comments, current_user, compact, if_none_match)
+    
+    return page_response(await db.run(handler), response)
 
 @router.put("/{comment_id}", response_model=CommentSchema)
-def update_comment(
+async def update_comment(
     comment_id: int,
     comment_data: CommentUpdate,
     current_user: User = Depends(get_current_user_required),
-    db: Session = Depends(get_db)
+    db: DBSession = Depends(get_async_db)
 ):
     """Modifier un commentaire (seulement par son auteur)"""
     
-    comment = db.query(Comment).filter(Comment.id == comment_id).first()
-    if not comment:
-        raise HTTPException(status_code=404, detail="Comment not found")
-    
-    if comment.user_id != current_user.id:
-        raise HTTPException(status_code=403, detail="Not authorized to edit this comment")
-    
-    # Mettre à jour les champs fournis
-    update_data = comment_data.dict(exclude_unset=True)
-    for field, value in update_data.items():
-        setattr(comment, field, value)
-    
-    db.commit()
-    db.refresh(comment)
-    
-    result = CommentSchema.from_orm(comment)
-    result.like_count = db.query(CommentLike).filter(CommentLike.comment_id == comment_id).count()
-    result.is_liked = False
+    def handler(db: Session):
+        comment = db.query(Comment).filter(Comment.id == comment_id).first()
+        if not comment:
+            raise HTTPException(status_code=404, detail="Comment not found")
+        
+        if comment.user_id != current_user.id:
+            raise HTTPException(status_code=403, detail="Not authorized to edit this comment")
+        
+        # Mettre à jour les champs fournis
+        update_data = comment_data.dict(exclude_unset=True)
+        for field, value in update_data.items():
+            setattr(comment, field, value)
+        
+        db.commit()
+        db.refresh(comment)
+        
+        result = CommentSchema.from_orm(comment)
+        result.is_liked = False
+        
+        return result
     
-    return result
+    return await db.run(handler)
 
 @router.delete("/{comment_id}")
-def delete_comment(
+async def delete_comment(
     comment_id: int,
     current_user: User = Depends(get_current_user_required),
-    db: Session = Depends(get_db)
+    db: DBSession = Depends(get_async_db)
 ):
     """Supprimer un commentaire (seulement par son auteur)"""
     
-    comment = db.query(Comment).filter(Comment.id == comment_id).first()
-    if not comment:
-        raise HTTPException(status_code=404, detail="Comment not found")
+    def handler(db: Session):
+        comment = db.query(Comment).filter(Comment.id == comment_id).first()
+        if not comment:
+            raise HTTPException(status_code=404, detail="Comment not found")
+        
+        if comment.user_id != current_user.id:
+            raise HTTPException(status_code=403, detail="Not authorized to delete this comment")
+        
+        post_id = comment.post_id
+        db.delete(comment)
+        
+        # Décrémenter le compteur de commentaires dans la même transaction
+        db.query(Post).filter(Post.id == post_id).update(
+            {Post.comment_count: Post.comment_count - 1, Post.updated_at: Post.updated_at},
+            synchronize_session=False
+        )
+        db.commit()
+        
+        return post_id
     
-    if comment.user_id != current_user.id:
-        raise HTTPException(status_code=403, detail="Not authorized to delete this comment")
+    post_id = await db.run(handler)
     
-    db.delete(comment)
-    db.commit()
+    # Le compteur de commentaires du post a changé
+    await response_cache.invalidate(post_tag(post_id))
     
     return {"message": "Comment deleted successfully"}
 
-@router.post("/{comment_id}/like", response_model=LikeResponse)
-def toggle_comment_like(
-    comment_id: int,
-    current_user: User = Depends(get_current_user_required),
-    db: Session = Depends(get_db)
-):
-    """Liker/unliker un commentaire"""
-    
-    comment = db.query(Comment).filter(Comment.id == comment_id).first()
-    if not comment:
-        raise HTTPException(status_code=404, detail="Comment not found")
+async def change_comment_like(db: DBSession, comment_id: int, user: User, liked: Optional[bool]) -> LikeResponse:
+    """Applique un like, un unlike (liked) ou une inversion (liked=None)"""
     
-    # Vérifier si le like existe déjà
-    existing_like = db.query(CommentLike).filter(
-        CommentLike.comment_id == comment_id,
-        CommentLike.user_id == current_user.id
-    ).first()
-    
-    if existing_like:
-        # Unliker
-        db.delete(existing_like)
-        db.commit()
-        is_liked = False
-        message = "Comment unliked"
-    else:
-        # Liker
-        new_like = CommentLike(comment_id=comment_id, user_id=current_user.id)
-        db.add(new_like)
-        db.commit()
-        is_liked = True
-        message = "Comment liked"
+    def handler(db: Session):
+        if liked is None:
+            result = toggle_like(db, COMMENT_LIKES, comment_id, user.id)
+        else:
+            result = set_like(db, COMMENT_LIKES, comment_id, user.id, liked)
+        if result is None:
+            raise HTTPException(status_code=404, detail="Comment not found")
+        return result
     
-    # Compter les likes totaux
-    like_count = db.query(CommentLike).filter(CommentLike.comment_id == comment_id).count()
+    is_liked, like_count = await db.run(handler)
     
     return LikeResponse(
-        message=message,
+        message="Comment liked" if is_liked else "Comment unliked",
         like_count=like_count,
         is_liked=is_liked
-    )
\ No newline at end of file
+    )
+
+@router.post("/{comment_id}/like", response_model=LikeResponse)
+@query_budget(5)
+async def toggle_comment_like(
+    comment_id: int,
+    current_user: User = Depends(get_current_user_required),
+    db: DBSession = Depends(get_async_db)
+):
+    """Liker/unliker un commentaire"""
+    return await change_comment_like(db, comment_id, current_user, None)
+
+@router.put("/{comment_id}/like", response_model=LikeResponse)
+@query_budget(5)
+async def like_comment(
+    comment_id: int,
+    current_user: User = Depends(get_current_user_required),
+    db: DBSession = Depends(get_async_db)
+):
+    """Liker un commentaire (idempotent)"""
+    return await change_comment_like(db, comment_id, current_user, True)
+
+@router.delete("/{comment_id}/like", response_model=LikeResponse)
+@query_budget(5)
+async def unlike_comment(
+    comment_id: int,
+    current_user: User = Depends(get_current_user_required),
+    db: DBSession = Depends(get_async_db)
+):
+    """Retirer son like d'un commentaire (idempotent)"""
+    return await change_comment_like(db, comment_id, current_user, False)
\ No newline at end of file
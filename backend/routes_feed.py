@@ -0,0 +1,53 @@
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Cookie, Header, Response
+from sqlalchemy.orm import Session
+from typing import Optional, List, Union
+from database import DBSession, get_async_db
+from models import User
+from schemas import Post as PostSchema, CompactPostPage
+from auth import get_current_user
+from conditional import posts_page, page_response
+from pagination import MAX_PAGE_SIZE, set_next_cursor
+from timeline import load_feed_page, trim_timeline_task
+from query_budget import query_budget
+
+router = APIRouter(prefix="/feed", tags=["feed"])
+
+async def get_current_user_required(session_id: Optional[str] = Cookie(None), db: DBSession = Depends(get_async_db)):
+    """Récupère l'utilisateur actuel (obligatoire)"""
+    user = await db.run(lambda db: get_current_user(session_id, db))
+    if not user:
+        raise HTTPException(status_code=401, detail="Authentication required")
+    return user
+
+@router.get("/", response_model=Union[List[PostSchema], CompactPostPage])
+@query_budget(10)
+async def get_feed(
+    response: Response,
+    background_tasks: BackgroundTasks,
+    cursor: Optional[str] = None,
+    limit: int = 20,
+    compact: bool = False,
+    if_none_match: Optional[str] = Header(None),
+    current_user: User = Depends(get_current_user_required),
+    db: DBSession = Depends(get_async_db)
+):
+    """Récupérer sa timeline personnalisée (posts des comptes suivis et les siens)
+    
+    Paginée par curseur comme GET /posts (en-tête X-Next-Cursor). Avec
+    `compact=true`, chaque auteur apparaît une fois dans `users`. Réponse
+    304 si If-None-Match porte l'ETag de la page courante.
+    """
+    limit = min(limit, MAX_PAGE_SIZE)
+    user_id = current_user.id
+    
+    def handler(db: Session):
+        posts = load_feed_page(db, current_user, cursor, limit, compact)
+        set_next_cursor(response, posts, limit)
+        return posts_page(db, posts, current_user, compact, if_none_match)
+    
+    page = await db.run(handler)
+    
+    # Borner la longueur de la timeline hors du chemin de lecture
+    if not cursor:
+        background_tasks.add_task(trim_timeline_task, user_id)
+    return page_response(page, response)
\ No newline at end of file
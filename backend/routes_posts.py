@@ -1,240 +1,350 @@
-from fastapi import APIRouter, Depends, HTTPException, Cookie
+from datetime import datetime
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Cookie, Header, Query, Response
 from sqlalchemy.orm import Session
-from sqlalchemy import desc, func
-from typing import Optional, List
-from database import get_db
-from models import User, Post, PostLike, Comment, CommentLike
+from sqlalchemy import desc
+from typing import Optional, List, Union
+from database import DBSession, get_async_db
+from replicas import get_read_db
+from models import User, Post, PostLike
 from schemas import (
     PostCreate, PostUpdate, PostResponse, Post as PostSchema,
-    LikeResponse
+    CompactPostPage, LikeResponse
 )
 from auth import get_current_user
+from enrichment import posts_query, enrich_posts, serialize_post
+from serialization import json_response
+from conditional import (
+    posts_page, posts_etag, etag_matches, validator_headers, page_response, revalidate
+)
+from pagination import MAX_PAGE_SIZE, NEXT_CURSOR_HEADER, keyset_before, set_next_cursor
+from response_cache import response_cache, TAG_POST_LISTS, post_tag, user_tag
+from purge import PURGE_THRESHOLD
+from timeline import add_to_own_timeline, fan_out_post_task
+from likes import POST_LIKES, set_like, toggle_like
+from search import search_ids
+from query_budget import query_budget
 
 router = APIRouter(prefix="/posts", tags=["posts"])
 
-def get_current_user_optional(session_id: Optional[str] = Cookie(None), db: Session = Depends(get_db)):
+async def get_current_user_optional(session_id: Optional[str] = Cookie(None), db: DBSession = Depends(get_async_db)):
     """Récupère l'utilisateur actuel (optionnel pour les vues publiques)"""
     if session_id:
-        return get_current_user(session_id, db)
+        return await db.run(lambda db: get_current_user(session_id, db))
     return None
 
-def get_current_user_required(session_id: Optional[str] = Cookie(None), db: Session = Depends(get_db)):
+async def get_current_user_required(session_id: Optional[str] = Cookie(None), db: DBSession = Depends(get_async_db)):
     """Récupère l'utilisateur actuel (obligatoire)"""
-    user = get_current_user(session_id, db)
+    user = await db.run(lambda db: get_current_user(session_id, db))
     if not user:
         raise HTTPException(status_code=401, detail="Authentication required")
     return user
 
-@router.get("/", response_model=List[PostSchema])
-def get_posts(
+@router.get("/", response_model=Union[List[PostSchema], CompactPostPage])
+@query_budget(4)
+async def get_posts(
+    response: Response,
     skip: int = 0, 
     limit: int = 20,
+    cursor: Optional[str] = None,
+    compact: bool = False,
+    session_id: Optional[str] = Cookie(None),
+    if_none_match: Optional[str] = Header(None),
+    current_user: Optional[User] = Depends(get_current_user_optional),
+    db: DBSession = Depends(get_read_db)
+):
+    """Récupérer la liste des posts (timeline publique)
+    
+    Avec `cursor` (valeur de l'en-tête X-Next-Cursor de la page précédente),
+    la pagination se fait par clé (created_at, id) et `skip` est ignoré.
+    Avec `compact=true`, les posts portent seulement `user_id` et chaque
+    auteur apparaît une fois dans `users` (CompactPostPage).
+    Les visiteurs anonymes sont servis depuis le cache des réponses.
+    Réponse 304 si If-None-Match porte l'ETag de la page courante.
+    """
+    limit = min(limit, MAX_PAGE_SIZE)
+    
+    cache_key = None
+    if session_id is None:
+        cache_key = f"posts:list:{skip}:{limit}:{cursor or ''}:{int(compact)}"
+        cached = await response_cache.get(cache_key)
+        if cached is not None:
+            return revalidate(cached, if_none_match)
+    
+    def handler(db: Session):
+        # Requête de base pour les posts avec leurs auteurs, triés par date
+        # (id pour départager les égalités)
+        query = posts_query(db, compact).order_by(desc(Post.created_at), desc(Post.id))
+        
+        if cursor:
+            query = query.filter(keyset_before(Post, cursor))
+        else:
+            query = query.offset(skip)
+        
+        posts = query.limit(limit).all()
+        set_next_cursor(response, posts, limit)
+        
+        # Likes de l'utilisateur, puis sérialisation seulement si le client
+        # n'a pas déjà cette version de la page
+        return posts_page(db, posts, current_user, compact, if_none_match)
+    
+    if cache_key is None:
+        return page_response(await db.run(handler), response)
+    
+    # Remplissage depuis la réplique : une page lue en retard juste après une
+    # écriture (déjà invalidée) reste au plus RESPONSE_CACHE_TTL secondes en cache
+    etag, result = await db.run(handler)
+    if result is None:
+        return page_response((etag, None), response)
+    
+    # Mettre la page en cache, étiquetée par post et par auteur
+    posts = result["items"] if compact else result
+    tags = {TAG_POST_LISTS}
+    tags.update(post_tag(post["id"]) for post in posts)
+    tags.update(user_tag(post["user_id"]) for post in posts)
+    headers = validator_headers(etag)
+    if NEXT_CURSOR_HEADER in response.headers:
+        headers[NEXT_CURSOR_HEADER] = response.headers[NEXT_CURSOR_HEADER]
+    return await response_cache.store(cache_key, result, tags, headers)
+
+@router.get("/search", response_model=Union[List[PostSchema], CompactPostPage])
+@query_budget(5)
+async def search_posts(
+    response: Response,
+    q: str = Query(..., min_length=1, max_length=200),
+    cursor: Optional[str] = None,
+    limit: int = 20,
+    compact: bool = False,
     current_user: Optional[User] = Depends(get_current_user_optional),
-    db: Session = Depends(get_db)
+    db: DBSession = Depends(get_read_db)
 ):
-    """Récupérer la liste des posts (timeline publique)"""
+    """Rechercher des posts par mots-clés, du plus pertinent au moins pertinent
+    
+    Paginé par curseur (en-tête X-Next-Cursor), comme la timeline ;
+    `compact=true` comme pour GET /posts.
+    """
+    limit = min(limit, MAX_PAGE_SIZE)
     
-    # Requête de base pour les posts avec leurs auteurs
-    query = db.query(Post).join(User).filter(User.is_active == True)
+    def handler(db: Session):
+        post_ids, next_page = search_ids(db, "posts", q, cursor, limit)
+        if next_page:
+            response.headers[NEXT_CURSOR_HEADER] = next_page
+        if not post_ids:
+            return enrich_posts(db, [], current_user, compact)
+        
+        # Charger les posts trouvés et conserver l'ordre de pertinence
+        posts = {post.id: post for post in posts_query(db, compact).filter(Post.id.in_(post_ids))}
+        posts = [posts[post_id] for post_id in post_ids if post_id in posts]
+        return enrich_posts(db, posts, current_user, compact)
+    
+    return json_response(await db.run(handler), response)
+
+@router.get("/{post_id}", response_model=PostSchema)
+@query_budget(4)
+async def get_post(
+    post_id: int,
+    session_id: Optional[str] = Cookie(None),
+    if_none_match: Optional[str] = Header(None),
+    current_user: Optional[User] = Depends(get_current_user_optional),
+    db: DBSession = Depends(get_read_db)
+):
+    """Récupérer un post spécifique (304 si If-None-Match porte son ETag courant)"""
     
-    # Récupérer les posts triés par date
-    posts = query.order_by(desc(Post.created_at)).offset(skip).limit(limit).all()
+    cache_key = None
+    if session_id is None:
+        cache_key = f"posts:detail:{post_id}"
+        cached = await response_cache.get(cache_key)
+        if cached is not None:
+            return revalidate(cached, if_none_match)
     
-    # Enrichir avec les données de comptage et likes
-    result = []
-    for post in posts:
-        # Compter les likes et commentaires
-        like_count = db.query(PostLike).filter(PostLike.post_id == post.id).count()
-        comment_count = db.query(Comment).filter(Comment.post_id == post.id).count()
+    def handler(db: Session):
+        post = posts_query(db).filter(Post.id == post_id).first()
+        
+        if not post:
+            raise HTTPException(status_code=404, detail="Post not found")
         
         # Vérifier si l'utilisateur actuel a liké
         is_liked = False
         if current_user:
             is_liked = db.query(PostLike).filter(
-                PostLike.post_id == post.id,
+                PostLike.post_id == post_id,
                 PostLike.user_id == current_user.id
             ).first() is not None
         
-        # Créer l'objet post enrichi
-        post_data = PostSchema.from_orm(post)
-        post_data.like_count = like_count
-        post_data.comment_count = comment_count
-        post_data.is_liked = is_liked
+        etag = posts_etag([post], [post_id] if is_liked else [], "detail")
+        if etag_matches(if_none_match, etag):
+            return etag, None
         
-        result.append(post_data)
+        # Compteurs dénormalisés lus sur le post, auteur chargé par posts_query
+        return etag, serialize_post(post, is_liked=is_liked)
     
-    return result
-
-@router.get("/{post_id}", response_model=PostSchema)
-def get_post(
-    post_id: int,
-    current_user: Optional[User] = Depends(get_current_user_optional),
-    db: Session = Depends(get_db)
-):
-    """Récupérer un post spécifique"""
-    
-    post = db.query(Post).join(User).filter(
-        Post.id == post_id,
-        User.is_active == True
-    ).first()
-    
-    if not post:
-        raise HTTPException(status_code=404, detail="Post not found")
-    
-    # Compter les likes et commentaires
-    like_count = db.query(func.count(PostLike.id)).filter(PostLike.post_id == post_id).scalar() or 0
-    comment_count = db.query(func.count(Comment.id)).filter(Comment.post_id == post_id).scalar() or 0
-    
-    # Vérifier si l'utilisateur actuel a liké
-    is_liked = False
-    if current_user:
-        is_liked = db.query(PostLike).filter(
-            PostLike.post_id == post_id,
-            PostLike.user_id == current_user.id
-        ).first() is not None
-    
-    # Enrichir le post avec les métadonnées
-    post_dict = {
-        "id": post.id,
-        "content": post.content,
-        "image_url": post.image_url,
-        "user_id": post.user_id,
-        "created_at": post.created_at,
-        "updated_at": post.updated_at,
-        "author": {
-            "id": post.author.id,
-            "username": post.author.username,
-            "email": post.author.email,
-            "display_name": post.author.display_name,
-            "bio": post.author.bio,
-            "avatar_url": post.author.avatar_url,
-            "is_active": post.author.is_active,
-            "created_at": post.author.created_at,
-            "updated_at": post.author.updated_at
-        },
-        "like_count": like_count,
-        "comment_count": comment_count,
-        "is_liked": is_liked
-    }
-    
-    return post_dict
+    if cache_key is None:
+        return page_response(await db.run(handler))
+    
+    # Réponse mise en cache : lue sur la réplique (voir get_posts)
+    etag, post_data = await db.run(handler)
+    if post_data is None:
+        return page_response((etag, None))
+    
+    tags = [post_tag(post_id), user_tag(post_data["user_id"])]
+    return await response_cache.store(cache_key, post_data, tags, validator_headers(etag))
 
 @router.post("/", response_model=PostSchema)
-def create_post(
+async def create_post(
     post_data: PostCreate,
+    background_tasks: BackgroundTasks,
     current_user: User = Depends(get_current_user_required),
-    db: Session = Depends(get_db)
+    db: DBSession = Depends(get_async_db)
 ):
     """Créer un nouveau post"""
     
-    db_post = Post(
-        user_id=current_user.id,
-        content=post_data.content,
-        image_url=post_data.image_url
-    )
-    
-    db.add(db_post)
-    db.commit()
-    db.refresh(db_post)
+    def handler(db: Session):
+        db_post = Post(
+            user_id=current_user.id,
+            content=post_data.content,
+            image_url=post_data.image_url
+        )
+        
+        db.add(db_post)
+        db.flush()
+        
+        # L'auteur voit son post immédiatement dans sa propre timeline
+        add_to_own_timeline(db, current_user, db_post)
+        db.commit()
+        db.refresh(db_post)
+        
+        # Charger le post avec l'auteur
+        post_with_author = db.query(Post).filter(Post.id == db_post.id).first()
+        
+        result = PostSchema.from_orm(post_with_author)
+        result.like_count = 0
+        result.comment_count = 0
+        result.is_liked = False
+        
+        return result
     
-    # Charger le post avec l'auteur
-    post_with_author = db.query(Post).filter(Post.id == db_post.id).first()
+    result = await db.run(handler)
     
-    result = PostSchema.from_orm(post_with_author)
-    result.like_count = 0
-    result.comment_count = 0
-    result.is_liked = False
+    # Copie dans les timelines des abonnés après l'envoi de la réponse
+    background_tasks.add_task(fan_out_post_task, result.id)
     
+    # Toutes les pages de la timeline sont décalées par le nouveau post
+    await response_cache.invalidate(TAG_POST_LISTS)
     return result
 
 @router.put("/{post_id}", response_model=PostSchema)
-def update_post(
+async def update_post(
     post_id: int,
     post_data: PostUpdate,
     current_user: User = Depends(get_current_user_required),
-    db: Session = Depends(get_db)
+    db: DBSession = Depends(get_async_db)
 ):
     """Modifier un post (seulement par son auteur)"""
     
-    post = db.query(Post).filter(Post.id == post_id).first()
-    if not post:
-        raise HTTPException(status_code=404, detail="Post not found")
-    
-    if post.user_id != current_user.id:
-        raise HTTPException(status_code=403, detail="Not authorized to edit this post")
-    
-    # Mettre à jour les champs fournis
-    update_data = post_data.dict(exclude_unset=True)
-    for field, value in update_data.items():
-        setattr(post, field, value)
-    
-    db.commit()
-    db.refresh(post)
-    
-    result = PostSchema.from_orm(post)
-    result.like_count = db.query(PostLike).filter(PostLike.post_id == post_id).count()
-    result.comment_count = db.query(Comment).filter(Comment.post_id == post_id).count()
-    result.is_liked = False  # L'auteur n'a pas forcément liké son propre post
+    def handler(db: Session):
+        post = db.query(Post).filter(Post.id == post_id, Post.deleted_at.is_(None)).first()
+        if not post:
+            raise HTTPException(status_code=404, detail="Post not found")
+        
+        if post.user_id != current_user.id:
+            raise HTTPException(status_code=403, detail="Not authorized to edit this post")
+        
+        # Mettre à jour les champs fournis
+        update_data = post_data.dict(exclude_unset=True)
+        for field, value in update_data.items():
+            setattr(post, field, value)
+        
+        db.commit()
+        db.refresh(post)
+        
+        result = PostSchema.from_orm(post)
+        result.is_liked = False  # L'auteur n'a pas forcément liké son propre post
+        
+        return result
     
+    result = await db.run(handler)
+    await response_cache.invalidate(post_tag(post_id))
     return result
 
 @router.delete("/{post_id}")
-def delete_post(
+async def delete_post(
     post_id: int,
     current_user: User = Depends(get_current_user_required),
-    db: Session = Depends(get_db)
+    db: DBSession = Depends(get_async_db)
 ):
-    """Supprimer un post (seulement par son auteur)"""
-    
-    post = db.query(Post).filter(Post.id == post_id).first()
-    if not post:
-        raise HTTPException(status_code=404, detail="Post not found")
+    """Supprimer un post (seulement par son auteur)
     
-    if post.user_id != current_user.id:
-        raise HTTPException(status_code=403, detail="Not authorized to delete this post")
+    Au-delà de PURGE_THRESHOLD likes et commentaires, le post est masqué
+    immédiatement et ses lignes filles sont supprimées en tâche de fond.
+    """
     
-    db.delete(post)
-    db.commit()
+    def handler(db: Session):
+        post = db.query(Post).filter(Post.id == post_id, Post.deleted_at.is_(None)).first()
+        if not post:
+            raise HTTPException(status_code=404, detail="Post not found")
+        
+        if post.user_id != current_user.id:
+            raise HTTPException(status_code=403, detail="Not authorized to delete this post")
+        
+        if post.like_count + post.comment_count > PURGE_THRESHOLD:
+            post.deleted_at = datetime.utcnow()
+        else:
+            # Commentaires, likes et entrées de timeline supprimés par ON DELETE CASCADE
+            db.delete(post)
+        db.commit()
+        
+        return {"message": "Post deleted successfully"}
     
-    return {"message": "Post deleted successfully"}
+    result = await db.run(handler)
+    await response_cache.invalidate(post_tag(post_id), TAG_POST_LISTS)
+    return result
 
-@router.post("/{post_id}/like", response_model=LikeResponse)
-def toggle_post_like(
-    post_id: int,
-    current_user: User = Depends(get_current_user_required),
-    db: Session = Depends(get_db)
-):
-    """Liker/unliker un post"""
+async def change_post_like(db: DBSession, post_id: int, user: User, liked: Optional[bool]) -> LikeResponse:
+    """Applique un like, un unlike (liked) ou une inversion (liked=None)"""
     
-    post = db.query(Post).filter(Post.id == post_id).first()
-    if not post:
-        raise HTTPException(status_code=404, detail="Post not found")
+    def handler(db: Session):
+        if liked is None:
+            result = toggle_like(db, POST_LIKES, post_id, user.id)
+        else:
+            result = set_like(db, POST_LIKES, post_id, user.id, liked)
+        if result is None:
+            raise HTTPException(status_code=404, detail="Post not found")
+        return result
     
-    # Vérifier si le like existe déjà
-    existing_like = db.query(PostLike).filter(
-        PostLike.post_id == post_id,
-        PostLike.user_id == current_user.id
-    ).first()
-    
-    if existing_like:
-        # Unliker
-        db.delete(existing_like)
-        db.commit()
-        is_liked = False
-        message = "Post unliked"
-    else:
-        # Liker
-        new_like = PostLike(post_id=post_id, user_id=current_user.id)
-        db.add(new_like)
-        db.commit()
-        is_liked = True
-        message = "Post liked"
-    
-    # Compter les likes totaux
-    like_count = db.query(PostLike).filter(PostLike.post_id == post_id).count()
+    is_liked, like_count = await db.run(handler)
     
+    await response_cache.invalidate(post_tag(post_id))
     return LikeResponse(
-        message=message,
+        message="Post liked" if is_liked else "Post unliked",
         like_count=like_count,
         is_liked=is_liked
-    )
\ No newline at end of file
+    )
+
+@router.post("/{post_id}/like", response_model=LikeResponse)
+@query_budget(5)
+async def toggle_post_like(
+    post_id: int,
+    current_user: User = Depends(get_current_user_required),
+    db: DBSession = Depends(get_async_db)
+):
+    """Liker/unliker un post"""
+    return await change_post_like(db, post_id, current_user, None)
+
+@router.put("/{post_id}/like", response_model=LikeResponse)
+@query_budget(5)
+async def like_post(
+    post_id: int,
+    current_user: User = Depends(get_current_user_required),
+    db: DBSession = Depends(get_async_db)
+):
+    """Liker un post (idempotent)"""
+    return await change_post_like(db, post_id, current_user, True)
+
+@router.delete("/{post_id}/like", response_model=LikeResponse)
+@query_budget(5)
+async def unlike_post(
+    post_id: int,
+    current_user: User = Depends(get_current_user_required),
+    db: DBSession = Depends(get_async_db)
+):
+    """Retirer son like d'un post (idempotent)"""
+    return await change_post_like(db, post_id, current_user, False)
\ No newline at end of file
@@ -1,146 +1,315 @@
-from fastapi import APIRouter, Depends, HTTPException, Cookie
+from fastapi import APIRouter, Depends, HTTPException, Cookie, Header, Request, Response
+from fastapi.responses import StreamingResponse
+from datetime import datetime
 from sqlalchemy.orm import Session
 from sqlalchemy import func, desc
-from typing import Optional, List
-from database import get_db
-from models import User, Post, Comment, PostLike
+from typing import Optional, List, Union
+from database import DBSession, get_async_db
+from replicas import get_read_db, open_read_db
+from models import User, Post, Follow
 from schemas import (
     UserUpdate, User as UserSchema, UserProfile, UserProfileResponse,
-    Post as PostSchema
+    Post as PostSchema, CompactPostPage, FollowResponse, MessageResponse
 )
-from auth import get_current_user
+from auth import get_current_user, delete_user_sessions
+from routes_auth import clear_session_cookies
+from enrichment import posts_query, enrich_posts
+from serialization import RowSerializer, dumps, json_response
+from conditional import posts_page, page_response
+from pagination import MAX_PAGE_SIZE, keyset_before, next_cursor, set_next_cursor
+from response_cache import response_cache, user_tag, TAG_POST_LISTS
+from timeline import follow_user, unfollow_user
+from query_budget import query_budget
 
 router = APIRouter(prefix="/users", tags=["users"])
 
-def get_current_user_optional(session_id: Optional[str] = Cookie(None), db: Session = Depends(get_db)):
+# Nombre de posts lus par lot lors d'un export NDJSON
+EXPORT_BATCH_SIZE = 500
+
+# Sérialiseurs des profils (liste des utilisateurs, profil avec ses posts)
+serialize_profile = RowSerializer(UserProfile, User)
+serialize_profile_response = RowSerializer(UserProfileResponse, User)
+
+async def get_current_user_optional(session_id: Optional[str] = Cookie(None), db: DBSession = Depends(get_async_db)):
     """Récupère l'utilisateur actuel (optionnel)"""
     if session_id:
-        return get_current_user(session_id, db)
+        return await db.run(lambda db: get_current_user(session_id, db))
     return None
 
-def get_current_user_required(session_id: Optional[str] = Cookie(None), db: Session = Depends(get_db)):
+async def get_current_user_required(session_id: Optional[str] = Cookie(None), db: DBSession = Depends(get_async_db)):
     """Récupère l'utilisateur actuel (obligatoire)"""
-    user = get_current_user(session_id, db)
+    user = await db.run(lambda db: get_current_user(session_id, db))
     if not user:
         raise HTTPException(status_code=401, detail="Authentication required")
     return user
 
+def load_user_posts_page(
+    db: Session,
+    user_id: int,
+    cursor: Optional[str],
+    limit: int,
+    compact: bool = False
+) -> List[Post]:
+    """Charge une page de posts d'un utilisateur, du plus récent au plus ancien"""
+    query = posts_query(db, compact).filter(Post.user_id == user_id).order_by(
+        desc(Post.created_at), desc(Post.id)
+    )
+    if cursor:
+        query = query.filter(keyset_before(Post, cursor))
+    return query.limit(limit).all()
+
+def get_active_user_or_404(db: Session, username: str) -> User:
+    """Récupère un utilisateur actif ou lève une 404"""
+    user = db.query(User).filter(
+        User.username == username,
+        User.is_active == True
+    ).first()
+    
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+    return user
+
 @router.get("/", response_model=List[UserProfile])
-def get_users(
+@query_budget(3, scans=("users",))
+async def get_users(
     skip: int = 0,
     limit: int = 20,
-    db: Session = Depends(get_db)
+    db: DBSession = Depends(get_read_db)
 ):
     """Récupérer la liste des utilisateurs"""
     
-    users = db.query(User).filter(User.is_active == True).offset(skip).limit(limit).all()
-    
-    # Enrichir avec les compteurs
-    result = []
-    for user in users:
-        post_count = db.query(func.count(Post.id)).filter(Post.user_id == user.id).scalar() or 0
+    def handler(db: Session):
+        users = db.query(User).filter(User.is_active == True).offset(skip).limit(limit).all()
         
-        user_profile = UserProfile.from_orm(user)
-        user_profile.post_count = post_count
-        user_profile.follower_count = 0  # Pour l'instant, pas de système de follow
+        # Compter les posts de toute la page en une seule requête groupée
+        post_counts = dict(db.query(Post.user_id, func.count(Post.id)).filter(
+            Post.user_id.in_([user.id for user in users]),
+            Post.deleted_at.is_(None)
+        ).group_by(Post.user_id).all()) if users else {}
         
-        result.append(user_profile)
+        return [serialize_profile(user, post_count=post_counts.get(user.id, 0)) for user in users]
     
-    return result
+    return json_response(await db.run(handler))
 
 @router.get("/{username}", response_model=UserProfileResponse)
-def get_user_profile(
+@query_budget(6)
+async def get_user_profile(
     username: str,
+    response: Response,
+    limit: int = 20,
     current_user: Optional[User] = Depends(get_current_user_optional),
-    db: Session = Depends(get_db)
+    db: DBSession = Depends(get_read_db)
 ):
-    """Récupérer le profil d'un utilisateur avec ses posts"""
-    
-    user = db.query(User).filter(
-        User.username == username,
-        User.is_active == True
-    ).first()
+    """Récupérer le profil d'un utilisateur avec la première page de ses posts
     
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
+    Les pages suivantes sont servies par GET /users/{username}/posts
+    avec le curseur renvoyé dans l'en-tête X-Next-Cursor.
+    """
+    limit = min(limit, MAX_PAGE_SIZE)
     
-    # Récupérer les posts de l'utilisateur
-    posts = db.query(Post).filter(Post.user_id == user.id).order_by(desc(Post.created_at)).all()
-    
-    # Enrichir les posts
-    enriched_posts = []
-    for post in posts:
-        like_count = db.query(func.count(PostLike.id)).filter(PostLike.post_id == post.id).scalar() or 0
-        comment_count = db.query(func.count(Comment.id)).filter(Comment.post_id == post.id).scalar() or 0
+    def handler(db: Session):
+        user = get_active_user_or_404(db, username)
         
-        is_liked = False
-        if current_user:
-            is_liked = db.query(PostLike).filter(
-                PostLike.post_id == post.id,
-                PostLike.user_id == current_user.id
-            ).first() is not None
+        # Première page des posts de l'utilisateur
+        posts = load_user_posts_page(db, user.id, None, limit)
+        set_next_cursor(response, posts, limit)
         
-        post_data = PostSchema.from_orm(post)
-        post_data.like_count = like_count
-        post_data.comment_count = comment_count
-        post_data.is_liked = is_liked
+        post_count = db.query(func.count(Post.id)).filter(
+            Post.user_id == user.id,
+            Post.deleted_at.is_(None)
+        ).scalar() or 0
         
-        enriched_posts.append(post_data)
-    
-    # Créer le profil utilisateur
-    user_profile = UserProfileResponse.from_orm(user)
-    user_profile.post_count = len(enriched_posts)
-    user_profile.follower_count = 0
-    user_profile.posts = enriched_posts
+        is_following = False
+        if current_user and current_user.id != user.id:
+            is_following = db.query(Follow.id).filter(
+                Follow.follower_id == current_user.id,
+                Follow.followed_id == user.id
+            ).first() is not None
+        
+        # Créer le profil utilisateur
+        return serialize_profile_response(
+            user,
+            post_count=post_count,
+            posts=enrich_posts(db, posts, current_user),
+            is_following=is_following
+        )
     
-    return user_profile
+    return json_response(await db.run(handler), response)
 
 @router.put("/me", response_model=UserSchema)
-def update_profile(
+async def update_profile(
     user_data: UserUpdate,
     current_user: User = Depends(get_current_user_required),
-    db: Session = Depends(get_db)
+    db: DBSession = Depends(get_async_db)
 ):
     """Mettre à jour son profil utilisateur"""
     
-    # Mettre à jour les champs fournis
-    update_data = user_data.dict(exclude_unset=True)
-    for field, value in update_data.items():
-        setattr(current_user, field, value)
+    def handler(db: Session):
+        # Mettre à jour les champs fournis
+        update_data = user_data.dict(exclude_unset=True)
+        for field, value in update_data.items():
+            setattr(current_user, field, value)
+        
+        db.commit()
+        db.refresh(current_user)
+        
+        return UserSchema.from_orm(current_user)
     
-    db.commit()
-    db.refresh(current_user)
+    result = await db.run(handler)
     
-    return UserSchema.from_orm(current_user)
+    # Les posts en cache embarquent le profil de leur auteur
+    await response_cache.invalidate(user_tag(result.id))
+    return result
 
-@router.get("/me/posts", response_model=List[PostSchema])
-def get_my_posts(
+@router.delete("/me", response_model=MessageResponse)
+async def delete_account(
+    response: Response,
     current_user: User = Depends(get_current_user_required),
-    db: Session = Depends(get_db)
+    db: DBSession = Depends(get_async_db)
 ):
-    """Récupérer ses propres posts"""
+    """Supprimer son compte
     
-    posts = db.query(Post).filter(
-        Post.user_id == current_user.id
-    ).order_by(desc(Post.created_at)).all()
+    Le compte est désactivé immédiatement (profil, posts et commentaires
+    masqués, sessions supprimées) ; ses données sont purgées en tâche de fond.
+    """
+    user_id = current_user.id
     
-    # Enrichir les posts
-    result = []
-    for post in posts:
-        like_count = db.query(func.count(PostLike.id)).filter(PostLike.post_id == post.id).scalar() or 0
-        comment_count = db.query(func.count(Comment.id)).filter(Comment.post_id == post.id).scalar() or 0
+    def handler(db: Session):
+        db.query(User).filter(User.id == user_id).update(
+            {User.is_active: False, User.deleted_at: datetime.utcnow()},
+            synchronize_session=False
+        )
+        delete_user_sessions(db, user_id)
+        db.commit()
+    
+    await db.run(handler)
+    clear_session_cookies(response)
+    
+    # Les listes et posts en cache contiennent ceux du compte
+    await response_cache.invalidate(user_tag(user_id), TAG_POST_LISTS)
+    return MessageResponse(message="Account deleted")
+
+@router.post("/{username}/follow", response_model=FollowResponse)
+async def follow(
+    username: str,
+    current_user: User = Depends(get_current_user_required),
+    db: DBSession = Depends(get_async_db)
+):
+    """S'abonner à un utilisateur (idempotent)"""
+    
+    def handler(db: Session):
+        user = get_active_user_or_404(db, username)
+        if user.id == current_user.id:
+            raise HTTPException(status_code=400, detail="You cannot follow yourself")
         
-        # L'utilisateur peut voir s'il a liké ses propres posts
-        is_liked = db.query(PostLike).filter(
-            PostLike.post_id == post.id,
-            PostLike.user_id == current_user.id
-        ).first() is not None
+        created = follow_user(db, current_user, user)
+        db.refresh(user)
         
-        post_data = PostSchema.from_orm(post)
-        post_data.like_count = like_count
-        post_data.comment_count = comment_count
-        post_data.is_liked = is_liked
+        return FollowResponse(
+            message="User followed" if created else "Already following",
+            follower_count=user.follower_count,
+            is_following=True
+        )
+    
+    return await db.run(handler)
+
+@router.delete("/{username}/follow", response_model=FollowResponse)
+async def unfollow(
+    username: str,
+    current_user: User = Depends(get_current_user_required),
+    db: DBSession = Depends(get_async_db)
+):
+    """Se désabonner d'un utilisateur (idempotent)"""
+    
+    def handler(db: Session):
+        user = get_active_user_or_404(db, username)
+        
+        deleted = unfollow_user(db, current_user, user)
+        db.refresh(user)
         
-        result.append(post_data)
+        return FollowResponse(
+            message="User unfollowed" if deleted else "Not following",
+            follower_count=user.follower_count,
+            is_following=False
+        )
+    
+    return await db.run(handler)
+
+@router.get("/me/posts", response_model=Union[List[PostSchema], CompactPostPage])
+@query_budget(4)
+async def get_my_posts(
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: int = 20,
+    compact: bool = False,
+    if_none_match: Optional[str] = Header(None),
+    current_user: User = Depends(get_current_user_required),
+    db: DBSession = Depends(get_read_db)
+):
+    """Récupérer ses propres posts (paginés par curseur, `compact=true` et ETag comme GET /posts)"""
+    limit = min(limit, MAX_PAGE_SIZE)
+    
+    def handler(db: Session):
+        posts = load_user_posts_page(db, current_user.id, cursor, limit, compact)
+        set_next_cursor(response, posts, limit)
+        # L'utilisateur peut voir s'il a liké ses propres posts
+        return posts_page(db, posts, current_user, compact, if_none_match)
+    
+    return page_response(await db.run(handler), response)
+
+@router.get("/{username}/posts", response_model=Union[List[PostSchema], CompactPostPage])
+@query_budget(4)
+async def get_user_posts(
+    username: str,
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: int = 20,
+    compact: bool = False,
+    if_none_match: Optional[str] = Header(None),
+    current_user: Optional[User] = Depends(get_current_user_optional),
+    db: DBSession = Depends(get_read_db)
+):
+    """Récupérer les posts d'un utilisateur (paginés par curseur, `compact=true` et ETag comme GET /posts)"""
+    limit = min(limit, MAX_PAGE_SIZE)
+    
+    def handler(db: Session):
+        user = get_active_user_or_404(db, username)
+        posts = load_user_posts_page(db, user.id, cursor, limit, compact)
+        set_next_cursor(response, posts, limit)
+        return posts_page(db, posts, current_user, compact, if_none_match)
+    
+    return page_response(await db.run(handler), response)
+
+@router.get("/{username}/posts/export")
+async def export_user_posts(
+    username: str,
+    request: Request,
+    current_user: Optional[User] = Depends(get_current_user_optional),
+    db: DBSession = Depends(get_read_db)
+):
+    """Exporter tous les posts d'un utilisateur en NDJSON (un post par ligne)
+    
+    Les posts sont lus et envoyés par lots : la mémoire utilisée ne dépend
+    pas du nombre de posts du compte.
+    """
+    user_id = await db.run(lambda db: get_active_user_or_404(db, username).id)
+    
+    def load_batch(db: Session, cursor: Optional[str]):
+        posts = load_user_posts_page(db, user_id, cursor, EXPORT_BATCH_SIZE)
+        lines = b"".join(dumps(post_data) + b"\n" for post_data in enrich_posts(db, posts, current_user))
+        # Libérer les objets du lot avant le suivant
+        db.expunge_all()
+        return lines, next_cursor(posts, EXPORT_BATCH_SIZE)
+    
+    async def stream():
+        # Session dédiée : elle reste ouverte pendant toute la durée du streaming
+        async with open_read_db(request) as export_db:
+            cursor = None
+            while True:
+                lines, cursor = await export_db.run(load_batch, cursor)
+                if lines:
+                    yield lines
+                if not cursor:
+                    break
     
-    return result
\ No newline at end of file
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
\ No newline at end of file
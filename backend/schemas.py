@@ -1,5 +1,5 @@
 from datetime import datetime
-from typing import Optional, List
+from typing import Optional, List, Dict
 from pydantic import BaseModel, EmailStr
 
 # Base schemas
@@ -34,6 +34,7 @@ class User(UserBase):
 class UserProfile(User):
     post_count: int = 0
     follower_count: int = 0
+    following_count: int = 0
 
 # Post schemas
 class PostBase(BaseModel):
@@ -83,12 +84,56 @@ class Comment(CommentBase):
     class Config:
         from_attributes = True
 
+# Compact schemas (?compact=true) : auteurs regroupés dans une table par réponse
+class Author(BaseModel):
+    """Projection publique d'un auteur"""
+    id: int
+    username: str
+    display_name: str
+    avatar_url: Optional[str] = None
+    
+    class Config:
+        from_attributes = True
+
+class CompactPost(PostBase):
+    id: int
+    user_id: int  # Clé de l'auteur dans `users`
+    created_at: datetime
+    updated_at: datetime
+    like_count: int = 0
+    comment_count: int = 0
+    is_liked: bool = False
+    
+    class Config:
+        from_attributes = True
+
+class CompactComment(CommentBase):
+    id: int
+    post_id: int
+    user_id: int  # Clé de l'auteur dans `users`
+    created_at: datetime
+    updated_at: datetime
+    like_count: int = 0
+    is_liked: bool = False
+    
+    class Config:
+        from_attributes = True
+
+class CompactPostPage(BaseModel):
+    items: List[CompactPost]
+    users: Dict[int, Author]  # Chaque auteur de la page, une seule fois
+
+class CompactCommentPage(BaseModel):
+    items: List[CompactComment]
+    users: Dict[int, Author]
+
 # Response schemas
 class PostResponse(Post):
     comments: List[Comment] = []
 
 class UserProfileResponse(UserProfile):
     posts: List[Post] = []
+    is_following: bool = False  # Si l'utilisateur actuel suit ce profil
 
 # Authentication schemas
 class LoginResponse(BaseModel):
@@ -98,12 +143,22 @@ class LoginResponse(BaseModel):
 class LogoutResponse(BaseModel):
     message: str
 
+class RefreshResponse(BaseModel):
+    message: str
+    expires_in: int  # secondes de validité du jeton d'accès
+
 # Like schemas
 class LikeResponse(BaseModel):
     message: str
     like_count: int
     is_liked: bool
 
+# Follow schemas
+class FollowResponse(BaseModel):
+    message: str
+    follower_count: int
+    is_following: bool
+
 # Generic response
 class MessageResponse(BaseModel):
     message: str
\ No newline at end of file
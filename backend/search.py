@@ -0,0 +1,116 @@
+"""Recherche plein texte dans les posts et commentaires
+
+L'index inversé est maintenu par la base elle-même :
+- MariaDB : index FULLTEXT sur `content`, score MATCH ... AGAINST ;
+- SQLite (développement local) : tables virtuelles FTS5 synchronisées par
+  des triggers, score bm25.
+
+Les résultats sont triés par pertinence puis par id, et paginés par un
+curseur (score, id) : le coût d'une page dépend du nombre de documents
+correspondant à la recherche, pas de la taille des tables.
+"""
+import re
+from typing import List, Optional, Tuple
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+from pagination import decode_rank_cursor, encode_rank_cursor
+
+# Tables indexées (noms fixes, jamais issus de la requête)
+SEARCH_TABLES = ("posts", "comments")
+
+# Nombre maximal de mots pris en compte dans une recherche
+MAX_SEARCH_TERMS = 8
+
+_WORD = re.compile(r"\w+", re.UNICODE)
+
+def _is_mysql(dialect) -> bool:
+    return dialect.name in ("mysql", "mariadb")
+
+def search_terms(query: str) -> List[str]:
+    """Mots de la recherche, sans la syntaxe propre au moteur"""
+    return _WORD.findall(query.lower())[:MAX_SEARCH_TERMS]
+
+def setup_search_index(engine: Engine):
+    """Crée les index plein texte s'ils n'existent pas (idempotent)"""
+    with engine.begin() as conn:
+        if _is_mysql(engine.dialect):
+            for table in SEARCH_TABLES:
+                conn.execute(text(
+                    f"CREATE FULLTEXT INDEX IF NOT EXISTS ft_{table}_content ON {table} (content)"
+                ))
+        elif engine.dialect.name == "sqlite":
+            for table in SEARCH_TABLES:
+                exists = conn.execute(text(
+                    "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"
+                ), {"name": f"{table}_fts"}).first()
+                if exists:
+                    continue
+                conn.execute(text(
+                    f"CREATE VIRTUAL TABLE {table}_fts USING fts5("
+                    f"content, content='{table}', content_rowid='id')"
+                ))
+                conn.execute(text(
+                    f"CREATE TRIGGER {table}_fts_insert AFTER INSERT ON {table} BEGIN "
+                    f"INSERT INTO {table}_fts(rowid, content) VALUES (new.id, new.content); END"
+                ))
+                conn.execute(text(
+                    f"CREATE TRIGGER {table}_fts_delete AFTER DELETE ON {table} BEGIN "
+                    f"INSERT INTO {table}_fts({table}_fts, rowid, content) VALUES ('delete', old.id, old.content); END"
+                ))
+                conn.execute(text(
+                    f"CREATE TRIGGER {table}_fts_update AFTER UPDATE OF content ON {table} BEGIN "
+                    f"INSERT INTO {table}_fts({table}_fts, rowid, content) VALUES ('delete', old.id, old.content); "
+                    f"INSERT INTO {table}_fts(rowid, content) VALUES (new.id, new.content); END"
+                ))
+                # Indexer les lignes existantes
+                conn.execute(text(f"INSERT INTO {table}_fts({table}_fts) VALUES ('rebuild')"))
+
+def _ranked_matches(dialect, table: str) -> str:
+    """Sous-requête (id, score) des documents correspondant à :terms"""
+    if _is_mysql(dialect):
+        against = "MATCH(content) AGAINST(:terms IN NATURAL LANGUAGE MODE)"
+        return f"SELECT id, {against} AS score FROM {table} WHERE {against}"
+    # bm25 : plus petit = plus pertinent, on l'inverse pour trier comme MariaDB
+    return (
+        f"SELECT rowid AS id, -bm25({table}_fts) AS score FROM {table}_fts "
+        f"WHERE {table}_fts MATCH :terms"
+    )
+
+def search_ids(
+    db: Session,
+    table: str,
+    query: str,
+    cursor: Optional[str],
+    limit: int
+) -> Tuple[List[int], Optional[str]]:
+    """Ids des documents correspondants, du plus pertinent au moins pertinent
+
+    Retourne aussi le curseur de la page suivante (None si la page n'est pas pleine).
+    """
+    if table not in SEARCH_TABLES:
+        raise ValueError(f"Table not searchable: {table}")
+    terms = search_terms(query)
+    if not terms:
+        return [], None
+
+    dialect = db.get_bind().dialect
+    matches = _ranked_matches(dialect, table)
+    params = {"limit": limit}
+    if _is_mysql(dialect):
+        params["terms"] = " ".join(terms)
+    else:
+        # FTS5 : chaque mot entre guillemets, au moins un mot doit apparaître (comme MATCH ... AGAINST)
+        params["terms"] = " OR ".join(f'"{term}"' for term in terms)
+
+    sql = f"SELECT id, score FROM ({matches}) AS matches"
+    if cursor:
+        params["rank"], params["row_id"] = decode_rank_cursor(cursor)
+        sql += " WHERE score < :rank OR (score = :rank AND id < :row_id)"
+    sql += " ORDER BY score DESC, id DESC LIMIT :limit"
+
+    rows = db.execute(text(sql), params).all()
+    next_page = None
+    if len(rows) == limit:
+        next_page = encode_rank_cursor(rows[-1].score, rows[-1].id)
+    return [row.id for row in rows], next_page
\ No newline at end of file
@@ -0,0 +1,202 @@
+"""Génération d'un jeu de données synthétique à grande échelle (tests de charge)
+
+Les distributions sont volontairement asymétriques, comme en production :
+- quelques auteurs très prolifiques (loi de puissance sur l'auteur des posts) ;
+- likes par post en loi de puissance (beaucoup de posts à 0, quelques posts viraux) ;
+- abonnements concentrés sur les auteurs les plus actifs.
+
+Le générateur est déterministe pour une graine donnée et insère par lots
+(INSERT multi-lignes) ; les compteurs dénormalisés sont calculés pendant
+la génération. Tous les comptes ont le mot de passe LOADTEST_PASSWORD.
+
+Usage :
+    python seed_data.py [--users 10000] [--posts 1000000] [--likes 10000000]
+                        [--comments 500000] [--follows-per-user 20] [--seed 42]
+"""
+import argparse
+import bisect
+import itertools
+import random
+import time
+from datetime import datetime, timedelta
+from typing import Iterable, Iterator, List
+from sqlalchemy import func, insert, select
+from database import engine
+from models import User, Post, PostLike, Comment, Follow
+from auth import get_password_hash
+from migrate import upgrade
+
+# Comptes générés : lt_user_0 ... lt_user_{n-1}
+USERNAME_PREFIX = "lt_user_"
+LOADTEST_PASSWORD = "loadtest"
+
+def username(index: int) -> str:
+    return f"{USERNAME_PREFIX}{index}"
+
+def power_law_weights(n: int, exponent: float) -> List[float]:
+    """Poids cumulés d'une loi de Zipf sur n rangs (le rang 0 est le plus probable)"""
+    return list(itertools.accumulate(1.0 / (rank + 1) ** exponent for rank in range(n)))
+
+def pick(rng: random.Random, cumulative: List[float]) -> int:
+    """Tire un rang selon des poids cumulés"""
+    return bisect.bisect_left(cumulative, rng.random() * cumulative[-1])
+
+def batched(rows: Iterable[dict], size: int) -> Iterator[List[dict]]:
+    iterator = iter(rows)
+    while True:
+        batch = list(itertools.islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+def insert_batches(conn, model, rows: Iterable[dict], batch_size: int, label: str) -> int:
+    """Insère les lignes par lots (une transaction par lot) et affiche la progression"""
+    total = 0
+    start = time.perf_counter()
+    for batch in batched(rows, batch_size):
+        with conn.begin():
+            conn.execute(insert(model), batch)
+        total += len(batch)
+        if total % (batch_size * 50) == 0:
+            print(f"   {label} : {total} ({total / (time.perf_counter() - start):.0f}/s)")
+    print(f"✅ {label} : {total} ligne(s) en {time.perf_counter() - start:.1f}s")
+    return total
+
+def first_id(conn, model) -> int:
+    """Plus petit id de la table (les ids générés sont consécutifs à partir de celui-ci)"""
+    with conn.begin():
+        return conn.execute(select(func.min(model.id))).scalar() or 1
+
+def generate(
+    users: int,
+    posts: int,
+    likes: int,
+    comments: int,
+    follows_per_user: int,
+    exponent: float = 1.1,
+    seed: int = 42,
+    batch_size: int = 5000,
+    days: int = 365
+) -> dict:
+    """Génère et insère le jeu de données, retourne le nombre de lignes par table"""
+    rng = random.Random(seed)
+    now = datetime.utcnow().replace(microsecond=0)
+    first_post_at = now - timedelta(days=days)
+
+    # Les auteurs sont classés par activité dans un ordre aléatoire (les gros comptes ne sont pas les premiers inscrits)
+    author_ranks = list(range(users))
+    rng.shuffle(author_ranks)
+    author_weights = power_law_weights(users, exponent)
+
+    # Auteur de chaque post et nombre de likes (loi de puissance, borné par le nombre d'utilisateurs)
+    post_authors = [author_ranks[pick(rng, author_weights)] for _ in range(posts)]
+    post_weights = [rng.paretovariate(exponent) for _ in range(posts)]
+    scale = likes / sum(post_weights) if posts else 0
+    # Arrondi aléatoire : le total reste proche de `likes` malgré les petites valeurs
+    post_likes = [min(users, int(weight * scale + rng.random())) for weight in post_weights]
+    # Les commentaires suivent la même popularité que les likes
+    post_comments = [0] * posts
+    popularity = list(itertools.accumulate(post_weights))
+    comment_posts = [pick(rng, popularity) for _ in range(comments)] if posts else []
+    for post_index in comment_posts:
+        post_comments[post_index] += 1
+
+    # Abonnements : chaque utilisateur suit des auteurs tirés selon leur activité
+    follows = set()
+    for follower in range(users):
+        for _ in range(min(follows_per_user, users - 1)):
+            followed = author_ranks[pick(rng, author_weights)]
+            if followed != follower:
+                follows.add((follower, followed))
+    follower_counts = [0] * users
+    following_counts = [0] * users
+    for follower, followed in follows:
+        follower_counts[followed] += 1
+        following_counts[follower] += 1
+
+    password_hash = get_password_hash(LOADTEST_PASSWORD)
+    span = (now - first_post_at).total_seconds()
+
+    with engine.connect() as conn:
+        report = {}
+        report["users"] = insert_batches(conn, User, ({
+            "username": username(index),
+            "email": f"{username(index)}@example.com",
+            "password_hash": password_hash,
+            "display_name": f"Load test {index}",
+            "follower_count": follower_counts[index],
+            "following_count": following_counts[index],
+        } for index in range(users)), batch_size, "users")
+
+        # Les index générés sont décalés sur les ids réellement attribués
+        first_user_id = first_id(conn, User)
+
+        # Dates croissantes avec l'id, comme des posts publiés au fil du temps
+        report["posts"] = insert_batches(conn, Post, ({
+            "user_id": first_user_id + post_authors[index],
+            "content": f"Post {index} " + " ".join(rng.choice(WORDS) for _ in range(rng.randint(5, 30))),
+            "like_count": post_likes[index],
+            "comment_count": post_comments[index],
+            "created_at": first_post_at + timedelta(seconds=span * index / max(posts, 1)),
+        } for index in range(posts)), batch_size, "posts")
+
+        first_post_id = first_id(conn, Post)
+
+        def like_rows():
+            for index, count in enumerate(post_likes):
+                for user_index in rng.sample(range(users), count):
+                    yield {"post_id": first_post_id + index, "user_id": first_user_id + user_index}
+
+        report["post_likes"] = insert_batches(conn, PostLike, like_rows(), batch_size, "post_likes")
+
+        report["comments"] = insert_batches(conn, Comment, ({
+            "post_id": first_post_id + post_index,
+            "user_id": first_user_id + rng.randrange(users),
+            "content": " ".join(rng.choice(WORDS) for _ in range(rng.randint(3, 15))),
+        } for post_index in comment_posts), batch_size, "comments")
+
+        report["follows"] = insert_batches(conn, Follow, ({
+            "follower_id": first_user_id + follower,
+            "followed_id": first_user_id + followed,
+        } for follower, followed in sorted(follows)), batch_size, "follows")
+    return report
+
+# Vocabulaire des contenus générés (permet aussi de tester la recherche)
+WORDS = (
+    "forum api python fastapi base données index cache latence débit requête réponse "
+    "serveur client session utilisateur post commentaire like abonnement timeline "
+    "recherche performance mémoire réseau disque pool connexion transaction verrou "
+    "mariadb sqlite docker vue frontend backend charge test mesure percentile"
+).split()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Génère un jeu de données synthétique pour les tests de charge")
+    parser.add_argument("--users", type=int, default=10000, help="Nombre d'utilisateurs")
+    parser.add_argument("--posts", type=int, default=1000000, help="Nombre de posts")
+    parser.add_argument("--likes", type=int, default=10000000, help="Nombre approximatif de likes de posts")
+    parser.add_argument("--comments", type=int, default=500000, help="Nombre de commentaires")
+    parser.add_argument("--follows-per-user", type=int, default=20, help="Abonnements tirés par utilisateur")
+    parser.add_argument("--exponent", type=float, default=1.1, help="Exposant des lois de puissance")
+    parser.add_argument("--seed", type=int, default=42, help="Graine du générateur (reproductibilité)")
+    parser.add_argument("--batch-size", type=int, default=5000, help="Lignes par INSERT")
+    args = parser.parse_args()
+
+    # Les instructions ne sont pas journalisées pendant l'import
+    engine.echo = False
+    upgrade(engine)
+
+    with engine.connect() as conn:
+        if conn.execute(select(func.count(User.id))).scalar():
+            raise SystemExit("❌ La base contient déjà des utilisateurs : utilisez une base vide")
+
+    report = generate(
+        users=args.users,
+        posts=args.posts,
+        likes=args.likes,
+        comments=args.comments,
+        follows_per_user=args.follows_per_user,
+        exponent=args.exponent,
+        seed=args.seed,
+        batch_size=args.batch_size
+    )
+    print(f"✅ Jeu de données généré : {report}")
\ No newline at end of file
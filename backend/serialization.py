@@ -0,0 +1,95 @@
+"""Sérialisation rapide des réponses de lecture
+
+Par défaut, un handler construit des schémas Pydantic (from_orm) que FastAPI
+valide une seconde fois contre response_model, puis encode avec json. Sur
+les routes de lecture, les objets ORM sont convertis directement en dicts par
+un RowSerializer, préparé une fois par schéma au chargement du module, et la
+route retourne une FastJSONResponse encodée par orjson : FastAPI ne revalide
+pas une Response.
+
+Le JSON produit est identique octet par octet à celui des schémas (ordre des
+champs, dates ISO 8601, UTF-8 non échappé) ; response_model reste déclaré
+pour la documentation OpenAPI.
+"""
+import typing
+from operator import attrgetter
+from typing import Any, Optional
+import orjson
+from fastapi import Response
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+from sqlalchemy import inspect
+
+def _default(value):
+    if isinstance(value, BaseModel):
+        return value.model_dump(mode="json")
+    raise TypeError(f"Type not serializable: {type(value).__name__}")
+
+def dumps(content: Any) -> bytes:
+    """Encode en JSON compact (mêmes octets que JSONResponse, schémas Pydantic acceptés)"""
+    return orjson.dumps(content, default=_default)
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse encodée par orjson"""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+def json_response(content: Any, response: Optional[Response] = None) -> FastJSONResponse:
+    """Réponse d'un contenu déjà conforme à response_model, sans revalidation
+
+    Les en-têtes posés sur la Response injectée dans la route (X-Next-Cursor)
+    sont repris, comme FastAPI le fait pour une valeur de retour ordinaire.
+    """
+    result = FastJSONResponse(content)
+    if response is not None:
+        result.raw_headers.extend(response.headers.raw)
+    return result
+
+def _nested_schema(annotation):
+    """Schéma d'un champ relation (Post.author, UserProfileResponse.posts) et s'il est une liste"""
+    if isinstance(annotation, type) and issubclass(annotation, BaseModel):
+        return annotation, False
+    if typing.get_origin(annotation) is list:
+        (item,) = typing.get_args(annotation)
+        if isinstance(item, type) and issubclass(item, BaseModel):
+            return item, True
+    return None, False
+
+class RowSerializer:
+    """Conversion d'un objet ORM en dict, dans l'ordre des champs d'un schéma
+
+    Équivaut à `schema.from_orm(obj).model_dump(mode="json")` pour des
+    colonnes déjà du bon type, sans validation. Un champ absent du modèle
+    ORM (is_liked, post_count...) prend la valeur passée à l'appel, sinon sa
+    valeur par défaut ; une relation est convertie par son propre sérialiseur.
+    """
+
+    def __init__(self, schema, model):
+        self.schema = schema
+        relationships = inspect(model).relationships
+        # (nom, lecture sur l'objet, sérialiseur de la relation, relation multiple, valeur par défaut)
+        self.fields = []
+        for name, field in schema.model_fields.items():
+            if not hasattr(model, name):
+                self.fields.append((name, None, None, False, field.get_default(call_default_factory=True)))
+                continue
+            nested_schema, many = _nested_schema(field.annotation)
+            nested = None
+            if nested_schema is not None:
+                nested = RowSerializer(nested_schema, relationships[name].mapper.class_)
+            self.fields.append((name, attrgetter(name), nested, many, None))
+
+    def __call__(self, obj, **values) -> dict:
+        data = {}
+        for name, getter, nested, many, default in self.fields:
+            if name in values:
+                data[name] = values[name]
+            elif getter is None:
+                data[name] = default
+            else:
+                value = getter(obj)
+                if nested is not None and value is not None:
+                    value = [nested(item) for item in value] if many else nested(value)
+                data[name] = value
+        return data
\ No newline at end of file
@@ -0,0 +1,62 @@
+"""Configuration commune des tests : API sur une base SQLite temporaire
+
+Les variables d'environnement sont fixées avant le premier import des
+modules du backend, qui les lisent au chargement.
+"""
+import os
+import sys
+import tempfile
+from itertools import count
+
+DB_PATH = os.path.join(tempfile.mkdtemp(prefix="forum-tests-"), "forum.db")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{DB_PATH}")
+os.environ.setdefault("ADMIN_TOKEN", "test-admin-token")
+# Coût minimal : les tests ne mesurent pas bcrypt
+os.environ.setdefault("BCRYPT_ROUNDS", "4")
+# Purge de fond au démarrage seulement : les tests lancent la leur (test_purge.py)
+os.environ.setdefault("PURGE_INTERVAL", "3600")
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import pytest
+from fastapi.testclient import TestClient
+
+ADMIN_HEADERS = {"Authorization": f"Bearer {os.environ['ADMIN_TOKEN']}"}
+
+_user_numbers = count(1)
+
+@pytest.fixture(scope="session")
+def app():
+    """Application démarrée une fois (migrations, tâches de fond) pour toute la session"""
+    import main
+    with TestClient(main.app):
+        yield main.app
+
+@pytest.fixture
+def client(app) -> TestClient:
+    """Client anonyme, avec son propre stock de cookies"""
+    return TestClient(app)
+
+@pytest.fixture
+def make_user(app):
+    """Fabrique de clients connectés, chacun avec un nouvel utilisateur"""
+    def make(prefix: str = "user") -> TestClient:
+        name = f"{prefix}{next(_user_numbers)}"
+        user_client = TestClient(app)
+        response = user_client.post("/auth/register", json={
+            "username": name,
+            "email": f"{name}@example.com",
+            "password": "password123",
+            "display_name": name.title()
+        })
+        assert response.status_code == 200, response.text
+        user_client.user = response.json()["user"]
+        return user_client
+    return make
+
+@pytest.fixture
+def post_id(make_user) -> int:
+    """Post d'un nouvel auteur"""
+    author = make_user("author")
+    response = author.post("/posts/", json={"content": "Un post de test"})
+    assert response.status_code == 200, response.text
+    return response.json()["id"]
\ No newline at end of file
@@ -0,0 +1,78 @@
+"""Export / import en flux : import interrompu puis repris depuis son point de reprise"""
+import json
+import pytest
+from sqlalchemy import create_engine, func, select
+import backup
+from backup import TABLES, export_data, import_data, read_checkpoint
+from database import engine as source_engine, enable_sqlite_foreign_keys
+from migrate import upgrade
+
+class Crash(Exception):
+    pass
+
+@pytest.fixture
+def dump(make_user, tmp_path):
+    """Export de la base des tests, avec au moins quelques lignes dans chaque table"""
+    author = make_user("author")
+    reader = make_user()
+    post_id = author.post("/posts/", json={"content": "À exporter"}).json()["id"]
+    comment_id = reader.post("/comments/", json={"post_id": post_id, "content": "Aussi"}).json()["id"]
+    reader.put(f"/posts/{post_id}/like")
+    reader.put(f"/comments/{comment_id}/like")
+    reader.post(f"/users/{author.user['username']}/follow")
+
+    path = str(tmp_path / "forum.ndjson.gz")
+    export_data(path, batch_size=7)
+    return path
+
+@pytest.fixture
+def target(tmp_path, monkeypatch):
+    """Base vide, migrée, sur laquelle backup importe"""
+    engine = create_engine(f"sqlite:///{tmp_path / 'target.db'}")
+    enable_sqlite_foreign_keys(engine)
+    upgrade(engine)
+    monkeypatch.setattr(backup, "engine", engine)
+    yield engine
+    engine.dispose()
+
+def table_ids(engine) -> dict:
+    with engine.connect() as conn:
+        return {name: conn.execute(select(table.c.id).order_by(table.c.id)).scalars().all()
+                for name, table in TABLES.items()}
+
+def test_import_resumes_after_crash_before_checkpoint(dump, target, tmp_path, monkeypatch):
+    checkpoint = str(tmp_path / "forum.ndjson.gz.checkpoint")
+    write_checkpoint = backup.write_checkpoint
+    calls = []
+
+    def crash_after_third_batch(path, line, report):
+        # Appel 1 : point de reprise initial ; appel 4 : après la validation du troisième lot
+        calls.append(line)
+        if len(calls) == 4:
+            raise Crash()
+        write_checkpoint(path, line, report)
+
+    monkeypatch.setattr(backup, "write_checkpoint", crash_after_third_batch)
+    with pytest.raises(Crash):
+        import_data(dump, checkpoint, batch_size=5)
+    # Le point de reprise est resté au lot précédent, déjà validé en base
+    line, _ = read_checkpoint(checkpoint)
+    assert 0 < line < calls[-1]
+
+    monkeypatch.setattr(backup, "write_checkpoint", write_checkpoint)
+    report = import_data(dump, checkpoint, batch_size=5)
+
+    source_ids = table_ids(source_engine)
+    assert table_ids(target) == source_ids
+    assert report == {name: len(ids) for name, ids in source_ids.items()}
+
+def test_completed_import_not_replayed(dump, target, tmp_path):
+    checkpoint = str(tmp_path / "forum.ndjson.gz.checkpoint")
+    first = import_data(dump, checkpoint, batch_size=50)
+
+    # Relancer la même commande : tout est déjà importé, rien n'est réinséré
+    assert import_data(dump, checkpoint, batch_size=50) == first
+    with open(checkpoint, encoding="utf-8") as file:
+        assert json.load(file)["rows"] == first
+    with target.connect() as conn:
+        assert conn.execute(select(func.count()).select_from(TABLES["users"])).scalar() == first["users"]
\ No newline at end of file
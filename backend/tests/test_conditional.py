@@ -0,0 +1,51 @@
+"""Requêtes conditionnelles (ETag / If-None-Match) et compression des réponses"""
+
+def test_post_etag_round_trip(make_user, post_id):
+    reader = make_user()
+    response = reader.get(f"/posts/{post_id}")
+    etag = response.headers["etag"]
+    assert etag.startswith('W/"')
+    assert response.headers["cache-control"] == "private, no-cache"
+
+    not_modified = reader.get(f"/posts/{post_id}", headers={"If-None-Match": etag})
+    assert not_modified.status_code == 304
+    assert not_modified.content == b""
+    assert not_modified.headers["etag"] == etag
+
+    # Le like de l'utilisateur change la réponse, donc l'ETag
+    reader.put(f"/posts/{post_id}/like")
+    changed = reader.get(f"/posts/{post_id}", headers={"If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.json()["is_liked"] is True
+    assert changed.headers["etag"] != etag
+
+def test_anonymous_cached_page_revalidated(client, post_id):
+    etag = client.get(f"/posts/{post_id}").headers["etag"]
+    # Deuxième lecture servie depuis le cache des réponses anonymes
+    assert client.get(f"/posts/{post_id}", headers={"If-None-Match": etag}).status_code == 304
+    assert client.get(f"/posts/{post_id}", headers={"If-None-Match": 'W/"other"'}).status_code == 200
+
+def test_list_and_comments_etag(make_user, post_id):
+    reader = make_user()
+    for url in ("/posts/?limit=5", f"/comments/post/{post_id}"):
+        etag = reader.get(url).headers["etag"]
+        assert reader.get(url, headers={"If-None-Match": etag}).status_code == 304
+
+    # Nouveau commentaire : la page de commentaires change
+    reader.post("/comments/", json={"post_id": post_id, "content": "Nouveau"})
+    assert reader.get(f"/comments/post/{post_id}", headers={"If-None-Match": etag}).status_code == 200
+
+def test_large_json_response_compressed(make_user):
+    author = make_user("author")
+    for index in range(30):
+        author.post("/posts/", json={"content": f"Post assez long pour la compression n°{index} " * 3})
+
+    response = author.get("/posts/?limit=30", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert "Accept-Encoding" in response.headers["vary"]
+    assert len(response.json()) == 30
+
+    # Sans Accept-Encoding, même contenu non compressé
+    raw = author.get("/posts/?limit=30", headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in raw.headers
+    assert raw.json() == response.json()
\ No newline at end of file
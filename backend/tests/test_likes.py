@@ -0,0 +1,60 @@
+"""Likes idempotents (PUT / DELETE) et compteurs regroupés (LIKE_COALESCE)"""
+import likes
+from database import SessionLocal
+from likes import LikeCounterBuffer
+from models import Post, PostLike
+
+def stored_like_count(post_id: int) -> int:
+    with SessionLocal() as db:
+        return db.get(Post, post_id).like_count
+
+def like_rows(post_id: int) -> int:
+    with SessionLocal() as db:
+        return db.query(PostLike).filter(PostLike.post_id == post_id).count()
+
+def test_repeated_put_likes_once(make_user, post_id):
+    reader = make_user()
+    for _ in range(3):
+        response = reader.put(f"/posts/{post_id}/like")
+        assert response.status_code == 200, response.text
+        assert response.json()["is_liked"] is True
+        assert response.json()["like_count"] == 1
+    assert stored_like_count(post_id) == 1
+    assert like_rows(post_id) == 1
+
+def test_repeated_delete_unlikes_once(make_user, post_id):
+    reader = make_user()
+    reader.put(f"/posts/{post_id}/like")
+    for _ in range(3):
+        response = reader.delete(f"/posts/{post_id}/like")
+        assert response.status_code == 200, response.text
+        assert response.json()["is_liked"] is False
+        assert response.json()["like_count"] == 0
+    assert stored_like_count(post_id) == 0
+    assert like_rows(post_id) == 0
+
+def test_like_unknown_post(make_user):
+    reader = make_user()
+    assert reader.put("/posts/999999/like").status_code == 404
+    assert reader.delete("/posts/999999/like").status_code == 404
+
+def test_coalesced_counter_after_flush(make_user, post_id, monkeypatch):
+    # Seuil 1 : regroupé dès le deuxième like de l'intervalle
+    buffer = LikeCounterBuffer(enabled=True, threshold=1, interval=60)
+    monkeypatch.setattr(likes, "like_buffer", buffer)
+    readers = [make_user() for _ in range(4)]
+
+    for expected, reader in enumerate(readers, start=1):
+        assert reader.put(f"/posts/{post_id}/like").json()["like_count"] == expected
+        # Répété : ni variation ni double comptage du tampon
+        assert reader.put(f"/posts/{post_id}/like").json()["like_count"] == expected
+    assert readers[0].delete(f"/posts/{post_id}/like").json()["like_count"] == 3
+    assert buffer.pending(likes.POST_LIKES, post_id) != 0
+    assert stored_like_count(post_id) != 3
+
+    with SessionLocal() as db:
+        buffer.flush(db)
+    assert buffer.pending(likes.POST_LIKES, post_id) == 0
+    assert stored_like_count(post_id) == 3
+    assert like_rows(post_id) == 3
+    assert readers[1].put(f"/posts/{post_id}/like").json()["like_count"] == 3
\ No newline at end of file
@@ -0,0 +1,65 @@
+"""Migrations versionnées : base vide, base en baseline, base antérieure à la baseline"""
+import pytest
+from sqlalchemy import create_engine, inspect, text
+from database import Base, enable_sqlite_foreign_keys
+from migrate import BASELINE_VERSION, MIGRATIONS, head_version, upgrade
+from search import setup_search_index
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'forum.db'}")
+    enable_sqlite_foreign_keys(engine)
+    yield engine
+    engine.dispose()
+
+def recorded_versions(engine) -> list:
+    with engine.connect() as conn:
+        return [version for (version,) in conn.execute(text("SELECT version FROM schema_migrations ORDER BY version"))]
+
+def test_bootstrap_empty_database(engine):
+    # Schéma complet depuis les modèles : aucune migration à exécuter
+    assert upgrade(engine) == []
+    assert recorded_versions(engine) == [BASELINE_VERSION] + [step.version for step in MIGRATIONS]
+
+    inspector = inspect(engine)
+    assert {"users", "posts", "timeline_entries", "token_revocations", "posts_fts"} <= set(inspector.get_table_names())
+    assert "timeline_read_at" in {column["name"] for column in inspector.get_columns("users")}
+
+    # Base à jour : rien à faire
+    assert upgrade(engine) == []
+
+def test_upgrade_from_baseline(engine):
+    # Base au schéma de la version 6, sans schema_migrations (init.sql ou create_all d'avant)
+    Base.metadata.create_all(engine)
+    setup_search_index(engine)
+    with engine.begin() as conn:
+        conn.execute(text("DROP INDEX idx_posts_user_created"))
+        conn.execute(text("ALTER TABLE users DROP COLUMN timeline_read_at"))
+        conn.execute(text(
+            "INSERT INTO users (username, email, password_hash, display_name, timeline_built_at, updated_at) "
+            "VALUES ('u1', 'u1@example.com', 'x', 'U1', '2024-01-01 10:00:00', '2024-01-02 10:00:00')"
+        ))
+
+    assert upgrade(engine) == [step.version for step in MIGRATIONS if step.version > BASELINE_VERSION]
+    assert recorded_versions(engine)[-1] == head_version()
+
+    inspector = inspect(engine)
+    assert "idx_posts_user_created" in {index["name"] for index in inspector.get_indexes("posts")}
+    with engine.connect() as conn:
+        row = conn.execute(text("SELECT timeline_read_at, updated_at FROM users")).one()
+    # Timeline existante : lue à sa date de construction ; updated_at inchangé
+    assert row == ("2024-01-01 10:00:00", "2024-01-02 10:00:00")
+
+def test_database_older_than_baseline_rejected(engine):
+    # Schéma d'avant les compteurs dénormalisés et le graphe de suivi
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE users (id INTEGER PRIMARY KEY, username VARCHAR(50))"))
+        conn.execute(text("CREATE TABLE posts (id INTEGER PRIMARY KEY, content TEXT)"))
+        conn.execute(text("CREATE TABLE comments (id INTEGER PRIMARY KEY, content TEXT)"))
+
+    with pytest.raises(RuntimeError) as error:
+        upgrade(engine)
+    assert "db/migrations/001_denormalized_counters.sql" in str(error.value)
+    assert "db/migrations/002_follow_graph.sql" in str(error.value)
+    # Rien n'est enregistré : la base n'est pas marquée en baseline
+    assert not inspect(engine).has_table("schema_migrations")
\ No newline at end of file
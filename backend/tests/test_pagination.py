@@ -0,0 +1,72 @@
+"""Pagination par curseur sur des lignes partageant la même date (SQLite en mémoire)
+
+Les dates sont écrites sous les deux formes rencontrées en pratique :
+CURRENT_TIMESTAMP (server_default) et datetime Python (ORM, imports, timelines).
+
+    cd backend && python -m pytest -q tests
+"""
+import os
+import sys
+from datetime import datetime
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from sqlalchemy import create_engine, desc, text
+from sqlalchemy.orm import Session
+from database import Base
+from models import User, Post, Comment, TimelineEntry
+from pagination import keyset_after, keyset_before, next_cursor
+
+SECOND = datetime(2024, 1, 1, 10, 0, 0)
+
+def make_session() -> Session:
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    db = Session(engine)
+    db.add(User(id=1, username="u1", email="u1@example.com", password_hash="x", display_name="U1"))
+    db.flush()
+    # Moitié des posts sous la forme texte de CURRENT_TIMESTAMP, moitié depuis Python
+    for post_id in range(1, 5):
+        db.execute(text(
+            "INSERT INTO posts (id, user_id, content, created_at) VALUES (:id, 1, 'p', :created_at)"
+        ), {"id": post_id, "created_at": SECOND.isoformat(sep=" ")})
+    db.add_all(Post(id=post_id, user_id=1, content="p", created_at=SECOND) for post_id in range(5, 9))
+    db.flush()
+    db.add_all(TimelineEntry(user_id=1, post_id=post_id, author_id=1, created_at=SECOND) for post_id in range(1, 9))
+    db.add_all(Comment(id=comment_id, post_id=1, user_id=1, content="c", created_at=SECOND) for comment_id in range(1, 9))
+    db.commit()
+    return db
+
+def pages(query, model, keyset, limit=3, **keyset_args):
+    """Identifiants lus page par page en suivant le curseur"""
+    seen = []
+    cursor = None
+    # Borné : un curseur qui n'avance plus relirait la même page sans fin
+    for _ in range(10):
+        page = query
+        if cursor:
+            page = page.filter(keyset(model, cursor, **keyset_args))
+        rows = page.limit(limit).all()
+        seen += [row.id for row in rows]
+        cursor = next_cursor(rows, limit)
+        if not cursor:
+            return seen
+    return seen
+
+def test_posts_same_second():
+    db = make_session()
+    query = db.query(Post).order_by(desc(Post.created_at), desc(Post.id))
+    assert pages(query, Post, keyset_before) == [8, 7, 6, 5, 4, 3, 2, 1]
+
+def test_timeline_same_second():
+    db = make_session()
+    query = db.query(Post).join(TimelineEntry, TimelineEntry.post_id == Post.id).order_by(
+        desc(TimelineEntry.created_at), desc(TimelineEntry.post_id)
+    )
+    assert pages(query, TimelineEntry, keyset_before, id_column=TimelineEntry.post_id) == [8, 7, 6, 5, 4, 3, 2, 1]
+
+def test_comments_same_second():
+    db = make_session()
+    query = db.query(Comment).order_by(Comment.created_at, Comment.id)
+    assert pages(query, Comment, keyset_after) == [1, 2, 3, 4, 5, 6, 7, 8]
\ No newline at end of file
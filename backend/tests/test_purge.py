@@ -0,0 +1,76 @@
+"""Suppression différée : purge par lots des gros posts et des comptes supprimés"""
+import asyncio
+import routes_posts
+from database import SessionLocal
+from models import User, Post, Comment, PostLike, CommentLike, Follow
+from purge import Purger
+
+def run_purge() -> Purger:
+    # Lots d'une ligne : chaque étape passe par plusieurs lots
+    purger = Purger(interval=3600, batch_size=1, pause=0)
+    asyncio.run(purger.purge())
+    return purger
+
+def count(model, *conditions) -> int:
+    with SessionLocal() as db:
+        return db.query(model).filter(*conditions).count()
+
+def test_large_post_hidden_then_purged(make_user, monkeypatch):
+    monkeypatch.setattr(routes_posts, "PURGE_THRESHOLD", 2)
+    author = make_user("author")
+    post_id = author.post("/posts/", json={"content": "Très populaire"}).json()["id"]
+    readers = [make_user() for _ in range(2)]
+    comment_ids = []
+    for reader in readers:
+        reader.put(f"/posts/{post_id}/like")
+        comment_ids.append(reader.post("/comments/", json={"post_id": post_id, "content": "Bravo"}).json()["id"])
+        reader.put(f"/comments/{comment_ids[0]}/like")
+
+    # Au-delà du seuil : masqué immédiatement, lignes filles conservées jusqu'à la purge
+    assert author.delete(f"/posts/{post_id}").status_code == 200
+    assert author.get(f"/posts/{post_id}").status_code == 404
+    assert count(Post, Post.id == post_id) == 1
+    assert count(PostLike, PostLike.post_id == post_id) == 2
+
+    purger = run_purge()
+    assert purger.posts_purged >= 1
+    assert count(Post, Post.id == post_id) == 0
+    assert count(PostLike, PostLike.post_id == post_id) == 0
+    assert count(Comment, Comment.post_id == post_id) == 0
+    assert count(CommentLike, CommentLike.comment_id.in_(comment_ids)) == 0
+
+def test_small_post_deleted_immediately(make_user):
+    author = make_user("author")
+    post_id = author.post("/posts/", json={"content": "Discret"}).json()["id"]
+    make_user().put(f"/posts/{post_id}/like")
+
+    assert author.delete(f"/posts/{post_id}").status_code == 200
+    assert count(Post, Post.id == post_id) == 0
+    assert count(PostLike, PostLike.post_id == post_id) == 0
+
+def test_deleted_account_purged_with_counters(make_user):
+    author = make_user("author")
+    post_id = author.post("/posts/", json={"content": "Post d'un autre"}).json()["id"]
+    comment_id = author.post("/comments/", json={"post_id": post_id, "content": "Premier"}).json()["id"]
+
+    leaving = make_user("leaving")
+    leaving_id = leaving.user["id"]
+    leaving.post("/posts/", json={"content": "Post du compte supprimé"})
+    leaving.put(f"/posts/{post_id}/like")
+    leaving.put(f"/comments/{comment_id}/like")
+    leaving.post("/comments/", json={"post_id": post_id, "content": "Au revoir"})
+    assert leaving.post(f"/users/{author.user['username']}/follow").status_code == 200
+
+    assert leaving.delete("/users/me").status_code == 200
+    run_purge()
+
+    with SessionLocal() as db:
+        assert db.get(User, leaving_id) is None
+        post = db.get(Post, post_id)
+        assert (post.like_count, post.comment_count) == (0, 1)
+        assert db.get(Comment, comment_id).like_count == 0
+        assert db.get(User, author.user["id"]).follower_count == 0
+    assert count(Post, Post.user_id == leaving_id) == 0
+    assert count(Comment, Comment.user_id == leaving_id) == 0
+    assert count(PostLike, PostLike.user_id == leaving_id) == 0
+    assert count(Follow, Follow.follower_id == leaving_id) == 0
\ No newline at end of file
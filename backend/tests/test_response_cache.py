@@ -0,0 +1,48 @@
+"""Cache des réponses anonymes : invalidation par les écritures et accès à /admin/cache"""
+from conftest import ADMIN_HEADERS
+from response_cache import response_cache
+
+def test_detail_served_from_cache_until_write(make_user, client):
+    author = make_user("author")
+    post_id = author.post("/posts/", json={"content": "Version 1"}).json()["id"]
+
+    assert client.get(f"/posts/{post_id}").json()["content"] == "Version 1"
+    hits = response_cache.stats()["hits"]
+    assert client.get(f"/posts/{post_id}").json()["content"] == "Version 1"
+    assert response_cache.stats()["hits"] == hits + 1
+
+    # Modification par l'auteur : l'entrée étiquetée par le post est invalidée
+    assert author.put(f"/posts/{post_id}", json={"content": "Version 2"}).status_code == 200
+    assert client.get(f"/posts/{post_id}").json()["content"] == "Version 2"
+
+    # Un like change le compteur affiché aux anonymes
+    make_user().put(f"/posts/{post_id}/like")
+    assert client.get(f"/posts/{post_id}").json()["like_count"] == 1
+
+    # Suppression : plus servi depuis le cache
+    assert author.delete(f"/posts/{post_id}").status_code == 200
+    assert client.get(f"/posts/{post_id}").status_code == 404
+
+def test_list_invalidated_by_new_post(make_user, client):
+    author = make_user("author")
+    first = author.post("/posts/", json={"content": "Premier"}).json()["id"]
+    assert client.get("/posts/", params={"limit": 5}).json()[0]["id"] == first
+
+    second = author.post("/posts/", json={"content": "Second"}).json()["id"]
+    assert client.get("/posts/", params={"limit": 5}).json()[0]["id"] == second
+
+def test_detail_invalidated_by_comment(make_user, client):
+    author = make_user("author")
+    post_id = author.post("/posts/", json={"content": "Commenté"}).json()["id"]
+    assert client.get(f"/posts/{post_id}").json()["comment_count"] == 0
+
+    assert author.post("/comments/", json={"post_id": post_id, "content": "Oui"}).status_code == 200
+    assert client.get(f"/posts/{post_id}").json()["comment_count"] == 1
+
+def test_admin_cache_requires_token(client):
+    assert client.get("/admin/cache").status_code == 401
+    assert client.get("/admin/cache", headers={"Authorization": "Bearer wrong"}).status_code == 401
+
+    response = client.get("/admin/cache", headers=ADMIN_HEADERS)
+    assert response.status_code == 200
+    assert "response_cache" in response.json()
\ No newline at end of file
@@ -0,0 +1,55 @@
+"""Recherche plein texte : pertinence et pagination par curseur (score, id)"""
+from itertools import count
+
+_words = count(1)
+
+def unique_word() -> str:
+    """Mot absent des autres tests (les posts sont partagés par la session)"""
+    return f"zorglub{next(_words)}"
+
+def search_pages(user_client, url: str, query: str, limit: int) -> list:
+    """Ids lus page par page en suivant X-Next-Cursor"""
+    pages = []
+    params = {"q": query, "limit": limit}
+    for _ in range(10):
+        response = user_client.get(url, params=params)
+        assert response.status_code == 200, response.text
+        pages.append([item["id"] for item in response.json()])
+        cursor = response.headers.get("x-next-cursor")
+        if not cursor:
+            return pages
+        params["cursor"] = cursor
+    raise AssertionError("Le curseur n'avance plus")
+
+def test_posts_search_pages(make_user):
+    author = make_user("author")
+    word = unique_word()
+    # Scores égaux : départagés par id décroissant
+    same_score = [author.post("/posts/", json={"content": f"Un post sur {word}"}).json()["id"] for _ in range(6)]
+    best = author.post("/posts/", json={"content": f"{word} {word} {word}"}).json()["id"]
+    author.post("/posts/", json={"content": "Sans rapport"})
+
+    pages = search_pages(author, "/posts/search", word, limit=3)
+    assert [len(page) for page in pages] == [3, 3, 1]
+    ids = [post_id for page in pages for post_id in page]
+    assert ids == [best] + sorted(same_score, reverse=True)
+
+def test_posts_search_any_word(make_user, client):
+    author = make_user("author")
+    first, second = unique_word(), unique_word()
+    ids = {author.post("/posts/", json={"content": f"Avec {word}"}).json()["id"] for word in (first, second)}
+    found = client.get("/posts/search", params={"q": f"{first} {second}"}).json()
+    assert {post["id"] for post in found} == ids
+    assert client.get("/posts/search", params={"q": unique_word()}).json() == []
+
+def test_comments_search_pages(make_user, post_id):
+    reader = make_user()
+    word = unique_word()
+    comment_ids = [
+        reader.post("/comments/", json={"post_id": post_id, "content": f"Réponse {word}"}).json()["id"]
+        for _ in range(5)
+    ]
+
+    pages = search_pages(reader, "/comments/search", word, limit=2)
+    assert [len(page) for page in pages] == [2, 2, 1]
+    assert [comment_id for page in pages for comment_id in page] == sorted(comment_ids, reverse=True)
\ No newline at end of file
@@ -0,0 +1,50 @@
+"""Cache des sessions résolues : invalidation au logout, à la désactivation et à la modification"""
+from auth import session_cache
+from database import SessionLocal
+from models import User
+
+def replay(user_client, session_id: str):
+    """Requête authentifiée avec un cookie de session conservé par le client"""
+    user_client.cookies.set("session_id", session_id)
+    return user_client.get("/auth/me")
+
+def test_session_served_from_cache(make_user):
+    user = make_user()
+    assert user.get("/auth/me").status_code == 200
+    hits = session_cache.stats()["hits"]
+    assert user.get("/auth/me").status_code == 200
+    assert session_cache.stats()["hits"] == hits + 1
+
+def test_logout_invalidates_cached_session(make_user):
+    user = make_user()
+    session_id = user.cookies["session_id"]
+    assert user.get("/auth/me").status_code == 200
+
+    assert user.post("/auth/logout").status_code == 200
+    assert session_cache.get(session_id) is None
+    assert replay(user, session_id).status_code == 401
+
+def test_account_deletion_invalidates_cached_session(make_user):
+    user = make_user()
+    session_id = user.cookies["session_id"]
+    assert user.get("/auth/me").status_code == 200
+
+    assert user.delete("/users/me").status_code == 200
+    assert replay(user, session_id).status_code == 401
+
+def test_deactivation_outside_request_invalidates_cached_session(make_user):
+    user = make_user()
+    assert user.get("/auth/me").status_code == 200
+
+    # Désactivation par un autre chemin (administration) : événement after_update de l'ORM
+    with SessionLocal() as db:
+        db.get(User, user.user["id"]).is_active = False
+        db.commit()
+    assert user.get("/auth/me").status_code == 401
+
+def test_profile_update_visible_immediately(make_user):
+    user = make_user()
+    assert user.get("/auth/me").json()["bio"] is None
+
+    assert user.put("/users/me", json={"bio": "Nouvelle bio"}).status_code == 200
+    assert user.get("/auth/me").json()["bio"] == "Nouvelle bio"
\ No newline at end of file
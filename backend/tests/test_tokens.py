@@ -0,0 +1,78 @@
+"""Sessions en jetons signés (SESSION_MODE=token) : rafraîchissement, révocation, désactivation"""
+import pytest
+from jose import jwt
+import auth
+import routes_auth
+from auth import TokenRevocationList, decode_access_token
+from database import SessionLocal
+from models import User
+
+@pytest.fixture(autouse=True)
+def token_mode(monkeypatch):
+    monkeypatch.setattr(auth, "SESSION_MODE", "token")
+    monkeypatch.setattr(routes_auth, "SESSION_MODE", "token")
+    monkeypatch.setattr(auth, "SECRET_KEY", "test-secret-key")
+
+def replay(user_client, access_token: str):
+    user_client.cookies.set("session_id", access_token)
+    return user_client.get("/auth/me")
+
+def test_login_sets_access_and_refresh_tokens(make_user):
+    user = make_user()
+    access_token = user.cookies["session_id"]
+    assert decode_access_token(access_token) == user.user["id"]
+    assert user.cookies["refresh_token"]
+    assert user.get("/auth/me").json()["id"] == user.user["id"]
+
+def test_refresh_issues_new_access_token(make_user, client):
+    user = make_user()
+    old_token = user.cookies["session_id"]
+
+    response = user.post("/auth/refresh")
+    assert response.status_code == 200
+    new_token = response.cookies["session_id"]
+    assert new_token != old_token
+    assert decode_access_token(new_token) == user.user["id"]
+
+    # Sans session de rafraîchissement
+    assert client.post("/auth/refresh").status_code == 401
+
+def test_logout_revokes_tokens(make_user):
+    user = make_user()
+    access_token = user.cookies["session_id"]
+    refresh_token = user.cookies["refresh_token"]
+    assert user.get("/auth/me").status_code == 200
+
+    assert user.post("/auth/logout").status_code == 200
+    assert replay(user, access_token).status_code == 401
+    user.cookies.set("refresh_token", refresh_token, path="/auth")
+    assert user.post("/auth/refresh").status_code == 401
+
+def test_revocation_reaches_other_workers(make_user):
+    user = make_user()
+    access_token = user.cookies["session_id"]
+    user.post("/auth/logout")
+
+    # Autre worker : la révocation est chargée depuis la table token_revocations
+    other_worker = TokenRevocationList(ttl=auth.ACCESS_TOKEN_EXPIRE_SECONDS, interval=60)
+    with SessionLocal() as db:
+        other_worker.sync(db)
+    issued_at = jwt.get_unverified_claims(access_token)["iat"]
+    assert other_worker.is_revoked(user.user["id"], issued_at)
+
+def test_deactivated_account_rejected(make_user):
+    user = make_user()
+    assert user.get("/auth/me").status_code == 200
+
+    # Désactivation hors de toute requête : le jeton reste signé et non révoqué
+    with SessionLocal() as db:
+        db.get(User, user.user["id"]).is_active = False
+        db.commit()
+    assert user.get("/auth/me").status_code == 401
+    assert user.post("/auth/refresh").status_code == 401
+
+def test_account_deletion_rejects_token(make_user):
+    user = make_user()
+    access_token = user.cookies["session_id"]
+    assert user.delete("/users/me").status_code == 200
+    assert replay(user, access_token).status_code == 401
\ No newline at end of file
@@ -0,0 +1,249 @@
+"""Timelines personnalisées (GET /feed)
+
+Chaque utilisateur a une timeline matérialisée dans `timeline_entries` :
+- fan-out à l'écriture : un nouveau post est copié dans la timeline des
+  abonnés de son auteur ;
+- fan-out à la lecture pour les auteurs très suivis (au-delà de
+  FANOUT_CELEBRITY_THRESHOLD abonnés) : leurs posts sont fusionnés au
+  moment de la lecture au lieu d'être copiés chez chaque abonné ;
+- une timeline n'est entretenue que TIMELINE_TTL_DAYS jours après sa
+  dernière lecture ; au-delà elle est reconstruite à la lecture suivante.
+  La date de lecture n'est réécrite qu'une fois par
+  TIMELINE_READ_TOUCH_INTERVAL, pas à chaque page.
+"""
+import os
+from datetime import datetime, timedelta
+from typing import List, Optional
+from sqlalchemy import desc, insert, literal, or_, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from database import open_async_db
+from auth import invalidate_user_sessions
+from models import User, Post, Follow, TimelineEntry
+from enrichment import posts_query
+from pagination import encode_cursor, keyset_before
+
+# Configuration des timelines
+FANOUT_CELEBRITY_THRESHOLD = int(os.getenv("FANOUT_CELEBRITY_THRESHOLD", "10000"))
+TIMELINE_MAX_LENGTH = int(os.getenv("TIMELINE_MAX_LENGTH", "800"))
+TIMELINE_TTL_DAYS = int(os.getenv("TIMELINE_TTL_DAYS", "7"))
+# Précision de la date de dernière lecture (une écriture au plus par intervalle)
+TIMELINE_READ_TOUCH_INTERVAL = timedelta(hours=1)
+
+TIMELINE_COLUMNS = ["user_id", "post_id", "author_id", "created_at"]
+
+def insert_entries(rows):
+    """INSERT ... SELECT d'entrées de timeline, sans échec sur celles déjà présentes
+
+    Un post peut être ajouté à une timeline par plusieurs chemins concurrents
+    (fan-out, reconstruction, abonnement) : la contrainte unique
+    (user_id, post_id) fait foi, comme pour les likes.
+    """
+    return insert(TimelineEntry).from_select(TIMELINE_COLUMNS, rows).prefix_with(
+        "IGNORE", dialect="mysql"
+    ).prefix_with("IGNORE", dialect="mariadb").prefix_with("OR IGNORE", dialect="sqlite")
+
+def _live_since() -> datetime:
+    """Date de dernière lecture minimale d'une timeline encore entretenue"""
+    return datetime.utcnow() - timedelta(days=TIMELINE_TTL_DAYS)
+
+def is_timeline_live(user: User) -> bool:
+    """La timeline de l'utilisateur est-elle construite et entretenue ?"""
+    return user.timeline_read_at is not None and user.timeline_read_at >= _live_since()
+
+def touch_timeline(db: Session, user: User):
+    """Enregistre la lecture d'une timeline entretenue, au plus une fois par intervalle"""
+    now = datetime.utcnow()
+    if user.timeline_read_at >= now - TIMELINE_READ_TOUCH_INTERVAL:
+        return
+    db.query(User).filter(User.id == user.id).update(
+        {User.timeline_read_at: now, User.updated_at: User.updated_at},
+        synchronize_session=False
+    )
+    db.commit()
+    invalidate_user_sessions(user.id)
+
+def rebuild_timeline(db: Session, user_id: int):
+    """Reconstruit la timeline à partir des posts récents des auteurs suivis"""
+    db.query(TimelineEntry).filter(TimelineEntry.user_id == user_id).delete(synchronize_session=False)
+
+    # Auteurs suivis alimentés par fan-out à l'écriture (les auteurs très suivis sont lus à la volée)
+    fanout_authors = select(Follow.followed_id).join(User, User.id == Follow.followed_id).where(
+        Follow.follower_id == user_id,
+        User.follower_count < FANOUT_CELEBRITY_THRESHOLD
+    )
+    recent_posts = select(literal(user_id), Post.id, Post.user_id, Post.created_at).where(
+        or_(Post.user_id.in_(fanout_authors), Post.user_id == user_id),
+        Post.deleted_at.is_(None)
+    ).order_by(desc(Post.created_at), desc(Post.id)).limit(TIMELINE_MAX_LENGTH)
+    db.execute(insert_entries(recent_posts))
+
+    now = datetime.utcnow()
+    db.query(User).filter(User.id == user_id).update(
+        {User.timeline_built_at: now, User.timeline_read_at: now, User.updated_at: User.updated_at},
+        synchronize_session=False
+    )
+    db.commit()
+    # Les utilisateurs en cache portent encore l'ancienne date de construction
+    invalidate_user_sessions(user_id)
+
+def add_to_own_timeline(db: Session, user: User, post: Post):
+    """Ajoute un post à la timeline de son auteur (sans commit)"""
+    if is_timeline_live(user):
+        db.add(TimelineEntry(
+            user_id=user.id,
+            post_id=post.id,
+            author_id=user.id,
+            created_at=post.created_at
+        ))
+
+def fan_out_post(db: Session, post_id: int) -> int:
+    """Copie un post dans la timeline entretenue de chaque abonné de son auteur"""
+    author = db.query(User).join(Post, Post.user_id == User.id).filter(Post.id == post_id).first()
+    if not author or author.follower_count >= FANOUT_CELEBRITY_THRESHOLD:
+        return 0
+
+    # Un seul INSERT ... SELECT, quel que soit le nombre d'abonnés
+    followers = select(Follow.follower_id, Post.id, Post.user_id, Post.created_at).join(
+        Post, Post.user_id == Follow.followed_id
+    ).join(
+        User, User.id == Follow.follower_id
+    ).where(
+        Post.id == post_id,
+        User.timeline_read_at >= _live_since()
+    )
+    result = db.execute(insert_entries(followers))
+    db.commit()
+    return result.rowcount
+
+def follow_user(db: Session, follower: User, followed: User) -> bool:
+    """Abonne follower à followed ; retourne False si l'abonnement existait déjà"""
+    existing = db.query(Follow.id).filter(
+        Follow.follower_id == follower.id,
+        Follow.followed_id == followed.id
+    ).first()
+    if existing:
+        return False
+
+    db.add(Follow(follower_id=follower.id, followed_id=followed.id))
+    db.query(User).filter(User.id == followed.id).update(
+        {User.follower_count: User.follower_count + 1, User.updated_at: User.updated_at},
+        synchronize_session=False
+    )
+    db.query(User).filter(User.id == follower.id).update(
+        {User.following_count: User.following_count + 1, User.updated_at: User.updated_at},
+        synchronize_session=False
+    )
+
+    # Reprendre les posts récents du nouvel auteur dans la timeline entretenue
+    if is_timeline_live(follower) and followed.follower_count < FANOUT_CELEBRITY_THRESHOLD:
+        db.flush()
+        recent_posts = select(literal(follower.id), Post.id, Post.user_id, Post.created_at).where(
+            Post.user_id == followed.id,
+            Post.deleted_at.is_(None)
+        ).order_by(desc(Post.created_at), desc(Post.id)).limit(TIMELINE_MAX_LENGTH)
+        db.execute(insert_entries(recent_posts))
+
+    try:
+        db.commit()
+    except IntegrityError:
+        # Double clic concurrent : l'abonnement a été créé par l'autre requête
+        db.rollback()
+        return False
+    # Compteurs modifiés en masse : rafraîchir les utilisateurs en cache
+    invalidate_user_sessions(follower.id)
+    invalidate_user_sessions(followed.id)
+    return True
+
+def unfollow_user(db: Session, follower: User, followed: User) -> bool:
+    """Désabonne follower de followed ; retourne False s'il n'était pas abonné"""
+    deleted = db.query(Follow).filter(
+        Follow.follower_id == follower.id,
+        Follow.followed_id == followed.id
+    ).delete(synchronize_session=False)
+    if not deleted:
+        return False
+
+    db.query(User).filter(User.id == followed.id).update(
+        {User.follower_count: User.follower_count - 1, User.updated_at: User.updated_at},
+        synchronize_session=False
+    )
+    db.query(User).filter(User.id == follower.id).update(
+        {User.following_count: User.following_count - 1, User.updated_at: User.updated_at},
+        synchronize_session=False
+    )
+    db.query(TimelineEntry).filter(
+        TimelineEntry.user_id == follower.id,
+        TimelineEntry.author_id == followed.id
+    ).delete(synchronize_session=False)
+    db.commit()
+    invalidate_user_sessions(follower.id)
+    invalidate_user_sessions(followed.id)
+    return True
+
+def load_feed_page(db: Session, user: User, cursor: Optional[str], limit: int, compact: bool = False) -> List[Post]:
+    """Page de la timeline : entrées matérialisées fusionnées avec les auteurs très suivis
+
+    `compact` : auteurs chargés avec les seules colonnes publiques (voir posts_query).
+    """
+    if is_timeline_live(user):
+        touch_timeline(db, user)
+    else:
+        rebuild_timeline(db, user.id)
+
+    # Fan-out à l'écriture : lecture de la timeline matérialisée via son index
+    query = posts_query(db, compact).join(TimelineEntry, TimelineEntry.post_id == Post.id).filter(
+        TimelineEntry.user_id == user.id
+    ).order_by(desc(TimelineEntry.created_at), desc(TimelineEntry.post_id))
+    if cursor:
+        query = query.filter(keyset_before(TimelineEntry, cursor, id_column=TimelineEntry.post_id))
+    posts = query.limit(limit).all()
+
+    # Fan-out à la lecture : posts des auteurs très suivis
+    celebrity_ids = [followed_id for (followed_id,) in db.query(Follow.followed_id).join(
+        User, User.id == Follow.followed_id
+    ).filter(
+        Follow.follower_id == user.id,
+        User.follower_count >= FANOUT_CELEBRITY_THRESHOLD
+    )]
+    if celebrity_ids:
+        query = posts_query(db, compact).filter(Post.user_id.in_(celebrity_ids)).order_by(
+            desc(Post.created_at), desc(Post.id)
+        )
+        if cursor:
+            query = query.filter(keyset_before(Post, cursor))
+        posts += query.limit(limit).all()
+
+        # Fusionner (un post peut venir des deux sources si l'auteur a franchi le seuil)
+        unique_posts = {post.id: post for post in posts}
+        posts = sorted(unique_posts.values(), key=lambda post: (post.created_at, post.id), reverse=True)
+
+    return posts[:limit]
+
+def trim_timeline(db: Session, user_id: int) -> int:
+    """Supprime les entrées au-delà de TIMELINE_MAX_LENGTH"""
+    last_kept = db.query(TimelineEntry.created_at, TimelineEntry.post_id).filter(
+        TimelineEntry.user_id == user_id
+    ).order_by(
+        desc(TimelineEntry.created_at), desc(TimelineEntry.post_id)
+    ).offset(TIMELINE_MAX_LENGTH - 1).first()
+    if not last_kept:
+        return 0
+
+    cursor = encode_cursor(last_kept.created_at, last_kept.post_id)
+    deleted = db.query(TimelineEntry).filter(
+        TimelineEntry.user_id == user_id,
+        keyset_before(TimelineEntry, cursor, id_column=TimelineEntry.post_id)
+    ).delete(synchronize_session=False)
+    db.commit()
+    return deleted
+
+# Tâches de fond (exécutées après l'envoi de la réponse, avec leur propre session)
+
+async def fan_out_post_task(post_id: int):
+    async with open_async_db() as db:
+        await db.run(fan_out_post, post_id)
+
+async def trim_timeline_task(user_id: int):
+    async with open_async_db() as db:
+        await db.run(trim_timeline, user_id)
\ No newline at end of file
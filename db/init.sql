@@ -15,8 +15,14 @@ CREATE TABLE users (
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
     is_active BOOLEAN DEFAULT TRUE,
+    follower_count INT NOT NULL DEFAULT 0,
+    following_count INT NOT NULL DEFAULT 0,
+    timeline_built_at DATETIME NULL,
+    timeline_read_at DATETIME NULL,
+    deleted_at DATETIME NULL,
     INDEX idx_username (username),
-    INDEX idx_email (email)
+    INDEX idx_email (email),
+    INDEX idx_deleted_at (deleted_at)
 );
 
 -- Table des posts
@@ -25,11 +31,16 @@ CREATE TABLE posts (
     user_id INT NOT NULL,
     content TEXT NOT NULL,
     image_url VARCHAR(255),
+    like_count INT NOT NULL DEFAULT 0,
+    comment_count INT NOT NULL DEFAULT 0,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    deleted_at DATETIME NULL,
     FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
-    INDEX idx_user_id (user_id),
-    INDEX idx_created_at (created_at)
+    INDEX idx_posts_user_created (user_id, created_at),
+    INDEX idx_created_at (created_at),
+    INDEX idx_deleted_at (deleted_at),
+    FULLTEXT INDEX ft_posts_content (content)
 );
 
 -- Table des commentaires
@@ -38,13 +49,15 @@ CREATE TABLE comments (
     post_id INT NOT NULL,
     user_id INT NOT NULL,
     content TEXT NOT NULL,
+    like_count INT NOT NULL DEFAULT 0,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
     FOREIGN KEY (post_id) REFERENCES posts(id) ON DELETE CASCADE,
     FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
-    INDEX idx_post_id (post_id),
+    INDEX idx_comments_post_created (post_id, created_at),
     INDEX idx_user_id (user_id),
-    INDEX idx_created_at (created_at)
+    INDEX idx_created_at (created_at),
+    FULLTEXT INDEX ft_comments_content (content)
 );
 
 -- Table des likes pour les posts
@@ -82,34 +95,59 @@ CREATE TABLE user_sessions (
     expires_at TIMESTAMP NOT NULL,
     is_active BOOLEAN DEFAULT TRUE,
     FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
-    INDEX idx_session_id (session_id),
+    -- Prédicat de get_current_user (session_id, is_active, expires_at), couvrant user_id
+    INDEX idx_session_lookup (session_id, is_active, expires_at, user_id),
     INDEX idx_user_id (user_id),
     INDEX idx_expires_at (expires_at)
 );
 
--- Vue pour compter les likes des posts
-CREATE VIEW post_like_counts AS
-SELECT 
-    post_id,
-    COUNT(*) as like_count
-FROM post_likes 
-GROUP BY post_id;
+-- Révocations des jetons d'accès signés (SESSION_MODE=token), gardées le temps de vie d'un jeton
+CREATE TABLE token_revocations (
+    user_id INT PRIMARY KEY,
+    revoked_at DATETIME(6) NOT NULL,
+    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
+    INDEX idx_revoked_at (revoked_at)
+);
 
--- Vue pour compter les likes des commentaires
-CREATE VIEW comment_like_counts AS
-SELECT 
-    comment_id,
-    COUNT(*) as like_count
-FROM comment_likes 
-GROUP BY comment_id;
+-- Table des abonnements (follower suit followed)
+CREATE TABLE follows (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    follower_id INT NOT NULL,
+    followed_id INT NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (follower_id) REFERENCES users(id) ON DELETE CASCADE,
+    FOREIGN KEY (followed_id) REFERENCES users(id) ON DELETE CASCADE,
+    UNIQUE KEY unique_follow (follower_id, followed_id),
+    INDEX idx_followed_id (followed_id)
+);
 
--- Vue pour compter les commentaires par post
-CREATE VIEW post_comment_counts AS
-SELECT 
-    post_id,
-    COUNT(*) as comment_count
-FROM comments 
-GROUP BY post_id;
+-- Timelines matérialisées (une ligne par post et par lecteur)
+CREATE TABLE timeline_entries (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    user_id INT NOT NULL,
+    post_id INT NOT NULL,
+    author_id INT NOT NULL,
+    created_at DATETIME NOT NULL,
+    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
+    FOREIGN KEY (post_id) REFERENCES posts(id) ON DELETE CASCADE,
+    FOREIGN KEY (author_id) REFERENCES users(id) ON DELETE CASCADE,
+    UNIQUE KEY unique_timeline_entry (user_id, post_id),
+    INDEX idx_timeline_user_created (user_id, created_at, post_id)
+);
+
+-- Version du schéma (migrations appliquées par backend/migrate.py)
+CREATE TABLE schema_migrations (
+    version INT PRIMARY KEY,
+    name VARCHAR(100) NOT NULL,
+    applied_at DATETIME NOT NULL
+);
+
+-- Ce script contient déjà toutes les migrations
+INSERT INTO schema_migrations (version, name, applied_at) VALUES
+(6, 'baseline', NOW()),
+(7, 'query_indexes', NOW()),
+(8, 'sqlite_second_timestamps', NOW()),
+(9, 'timeline_read_at', NOW());
 
 -- Insertion de données de test
 INSERT INTO users (username, email, password_hash, display_name, bio) VALUES
@@ -143,6 +181,14 @@ INSERT INTO comment_likes (comment_id, user_id) VALUES
 (3, 2),
 (4, 1), (4, 3);
 
+-- Initialisation des compteurs dénormalisés à partir des données de test
+UPDATE posts p SET
+    like_count = (SELECT COUNT(*) FROM post_likes pl WHERE pl.post_id = p.id),
+    comment_count = (SELECT COUNT(*) FROM comments c WHERE c.post_id = p.id);
+
+UPDATE comments c SET
+    like_count = (SELECT COUNT(*) FROM comment_likes cl WHERE cl.comment_id = c.id);
+
 -- Afficher un résumé de la base initialisée
 SELECT 'Base de données forum_db initialisée avec succès!' as status;
 SELECT 
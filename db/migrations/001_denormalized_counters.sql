@@ -0,0 +1,17 @@
+-- Migration : compteurs dénormalisés sur posts et comments
+-- À appliquer sur une base existante, puis lancer la réconciliation :
+--   python reconcile_counters.py
+
+USE forum_db;
+
+ALTER TABLE posts
+    ADD COLUMN like_count INT NOT NULL DEFAULT 0 AFTER image_url,
+    ADD COLUMN comment_count INT NOT NULL DEFAULT 0 AFTER like_count;
+
+ALTER TABLE comments
+    ADD COLUMN like_count INT NOT NULL DEFAULT 0 AFTER content;
+
+-- Les vues de comptage ne sont plus utilisées
+DROP VIEW IF EXISTS post_like_counts;
+DROP VIEW IF EXISTS comment_like_counts;
+DROP VIEW IF EXISTS post_comment_counts;
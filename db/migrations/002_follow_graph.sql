@@ -0,0 +1,35 @@
+-- Migration : abonnements et timelines matérialisées
+-- Les timelines sont construites à la première lecture de GET /feed.
+
+USE forum_db;
+
+ALTER TABLE users
+    ADD COLUMN follower_count INT NOT NULL DEFAULT 0 AFTER is_active,
+    ADD COLUMN following_count INT NOT NULL DEFAULT 0 AFTER follower_count,
+    ADD COLUMN timeline_built_at DATETIME NULL AFTER following_count;
+
+-- Table des abonnements (follower suit followed)
+CREATE TABLE follows (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    follower_id INT NOT NULL,
+    followed_id INT NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (follower_id) REFERENCES users(id) ON DELETE CASCADE,
+    FOREIGN KEY (followed_id) REFERENCES users(id) ON DELETE CASCADE,
+    UNIQUE KEY unique_follow (follower_id, followed_id),
+    INDEX idx_followed_id (followed_id)
+);
+
+-- Timelines matérialisées (une ligne par post et par lecteur)
+CREATE TABLE timeline_entries (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    user_id INT NOT NULL,
+    post_id INT NOT NULL,
+    author_id INT NOT NULL,
+    created_at DATETIME NOT NULL,
+    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
+    FOREIGN KEY (post_id) REFERENCES posts(id) ON DELETE CASCADE,
+    FOREIGN KEY (author_id) REFERENCES users(id) ON DELETE CASCADE,
+    UNIQUE KEY unique_timeline_entry (user_id, post_id),
+    INDEX idx_timeline_user_created (user_id, created_at, post_id)
+);
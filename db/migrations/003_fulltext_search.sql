@@ -0,0 +1,7 @@
+-- Migration : index plein texte pour GET /posts/search et GET /comments/search
+-- (l'API crée aussi ces index au démarrage s'ils manquent)
+
+USE forum_db;
+
+CREATE FULLTEXT INDEX IF NOT EXISTS ft_posts_content ON posts (content);
+CREATE FULLTEXT INDEX IF NOT EXISTS ft_comments_content ON comments (content);
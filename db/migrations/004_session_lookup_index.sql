@@ -0,0 +1,13 @@
+-- Migration : index de recherche des sessions et purge des sessions inactives
+-- Les sessions ne sont plus désactivées mais supprimées (logout, nouvelle connexion) ;
+-- les sessions expirées sont supprimées par lots par l'API (SESSION_REAP_*).
+
+USE forum_db;
+
+-- Index couvrant le prédicat de get_current_user
+CREATE INDEX IF NOT EXISTS idx_session_lookup ON user_sessions (session_id, is_active, expires_at, user_id);
+DROP INDEX IF EXISTS idx_session_id ON user_sessions;
+
+-- Sessions désactivées avant cette migration : elles expirent immédiatement et
+-- seront supprimées par lots par le nettoyage périodique
+UPDATE user_sessions SET expires_at = NOW() WHERE is_active = FALSE AND expires_at > NOW();
@@ -0,0 +1,10 @@
+-- Migration : révocations des jetons d'accès signés (SESSION_MODE=token)
+
+USE forum_db;
+
+CREATE TABLE IF NOT EXISTS token_revocations (
+    user_id INT PRIMARY KEY,
+    revoked_at DATETIME(6) NOT NULL,
+    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
+    INDEX idx_revoked_at (revoked_at)
+);
@@ -0,0 +1,13 @@
+-- Migration : suppression des gros posts et des comptes en tâche de fond
+-- Les lignes filles sont supprimées par les clés étrangères ON DELETE CASCADE
+-- déjà déclarées ; un post au-delà de PURGE_THRESHOLD likes et commentaires,
+-- ou un compte supprimé, est d'abord marqué (deleted_at) puis purgé par lots
+-- par l'API (PURGE_*).
+
+USE forum_db;
+
+ALTER TABLE posts ADD COLUMN IF NOT EXISTS deleted_at DATETIME NULL;
+CREATE INDEX IF NOT EXISTS idx_deleted_at ON posts (deleted_at);
+
+ALTER TABLE users ADD COLUMN IF NOT EXISTS deleted_at DATETIME NULL;
+CREATE INDEX IF NOT EXISTS idx_deleted_at ON users (deleted_at);
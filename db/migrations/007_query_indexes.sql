@@ -0,0 +1,25 @@
+-- Migration : index composites des requêtes les plus fréquentes
+-- Appliquée automatiquement par l'API (backend/migrate.py, version 7) ;
+-- ce script est l'équivalent pour une application manuelle. DDL en ligne :
+-- les tables restent lisibles et modifiables pendant la construction.
+-- La vérification d'une session a déjà son index (004_session_lookup_index.sql).
+
+USE forum_db;
+
+-- Posts d'un profil par date : remplace idx_user_id, dont il est un préfixe
+ALTER TABLE posts ADD INDEX IF NOT EXISTS idx_posts_user_created (user_id, created_at), ALGORITHM=INPLACE, LOCK=NONE;
+ALTER TABLE posts DROP INDEX IF EXISTS idx_user_id, ALGORITHM=INPLACE, LOCK=NONE;
+
+-- Commentaires d'un post par date : remplace idx_post_id
+ALTER TABLE comments ADD INDEX IF NOT EXISTS idx_comments_post_created (post_id, created_at), ALGORITHM=INPLACE, LOCK=NONE;
+ALTER TABLE comments DROP INDEX IF EXISTS idx_post_id, ALGORITHM=INPLACE, LOCK=NONE;
+
+-- Version du schéma : les migrations suivantes sont appliquées par l'API
+CREATE TABLE IF NOT EXISTS schema_migrations (
+    version INT PRIMARY KEY,
+    name VARCHAR(100) NOT NULL,
+    applied_at DATETIME NOT NULL
+);
+INSERT IGNORE INTO schema_migrations (version, name, applied_at) VALUES
+(6, 'baseline', NOW()),
+(7, 'query_indexes', NOW());
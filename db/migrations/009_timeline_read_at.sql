@@ -0,0 +1,18 @@
+-- Migration : date de dernière lecture des timelines
+-- Appliquée automatiquement par l'API (backend/migrate.py, version 9) ;
+-- ce script est l'équivalent pour une application manuelle (après 007).
+-- Une timeline est entretenue tant qu'elle est lue, et non plus
+-- TIMELINE_TTL_DAYS jours après sa construction.
+
+USE forum_db;
+
+ALTER TABLE users ADD COLUMN IF NOT EXISTS timeline_read_at DATETIME NULL AFTER timeline_built_at;
+
+-- Les timelines existantes partent de leur date de construction (updated_at inchangé)
+UPDATE users SET timeline_read_at = timeline_built_at, updated_at = updated_at
+WHERE timeline_read_at IS NULL AND timeline_built_at IS NOT NULL;
+
+-- Version du schéma (la migration 8 ne concerne que SQLite)
+INSERT IGNORE INTO schema_migrations (version, name, applied_at) VALUES
+(8, 'sqlite_second_timestamps', NOW()),
+(9, 'timeline_read_at', NOW());
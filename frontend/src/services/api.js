@@ -14,7 +14,19 @@ const api = axios.create({
 // Intercepteur pour gérer les erreurs globalement
 api.interceptors.response.use(
   (response) => response,
-  (error) => {
+  async (error) => {
+    const request = error.config
+    // Sessions par jetons signés (SESSION_MODE=token) : jeton d'accès expiré,
+    // en demander un nouveau une seule fois puis rejouer la requête
+    if (error.response?.status === 401 && request && !request._retried && !request.url.startsWith('/auth/')) {
+      request._retried = true
+      try {
+        await api.post('/auth/refresh')
+        return api(request)
+      } catch (refreshError) {
+        // Mode cookie ou session expirée : déconnexion ci-dessous
+      }
+    }
     if (error.response?.status === 401) {
       // Déconnexion automatique si non autorisé
       localStorage.removeItem('user')
@@ -55,6 +67,19 @@ export default {
     return response.data
   },
 
+  // Pagination par curseur : le curseur suivant est renvoyé dans l'en-tête X-Next-Cursor
+  async getPostsPage(cursor = null, limit = 20) {
+    const params = { limit }
+    if (cursor) {
+      params.cursor = cursor
+    }
+    const response = await api.get('/posts/', { params })
+    return {
+      posts: response.data,
+      nextCursor: response.headers['x-next-cursor'] || null
+    }
+  },
+
   async getPost(postId) {
     const response = await api.get(`/posts/${postId}`)
     return response.data
@@ -95,9 +120,16 @@ export default {
     return response.data
   },
 
-  async getPostComments(postId) {
-    const response = await api.get(`/comments/post/${postId}`)
-    return response.data
+  async getPostComments(postId, cursor = null, limit = 50) {
+    const params = { limit }
+    if (cursor) {
+      params.cursor = cursor
+    }
+    const response = await api.get(`/comments/post/${postId}`, { params })
+    return {
+      comments: response.data,
+      nextCursor: response.headers['x-next-cursor'] || null
+    }
   },
 
   async updateComment(commentId, content) {
@@ -117,14 +149,51 @@ export default {
     return response.data
   },
 
+  // Timeline personnalisée (comptes suivis), paginée comme getPostsPage
+  async getFeedPage(cursor = null, limit = 20) {
+    const params = { limit }
+    if (cursor) {
+      params.cursor = cursor
+    }
+    const response = await api.get('/feed/', { params })
+    return {
+      posts: response.data,
+      nextCursor: response.headers['x-next-cursor'] || null
+    }
+  },
+
   // Utilisateurs
   async getUsers(skip = 0, limit = 20) {
     const response = await api.get(`/users/?skip=${skip}&limit=${limit}`)
     return response.data
   },
 
+  // Profil + première page de posts ; les pages suivantes via getUserPostsPage
   async getUserProfile(username) {
     const response = await api.get(`/users/${username}`)
+    return {
+      user: response.data,
+      nextCursor: response.headers['x-next-cursor'] || null
+    }
+  },
+
+  async getUserPostsPage(username, cursor, limit = 20) {
+    const response = await api.get(`/users/${username}/posts`, {
+      params: { cursor, limit }
+    })
+    return {
+      posts: response.data,
+      nextCursor: response.headers['x-next-cursor'] || null
+    }
+  },
+
+  async followUser(username) {
+    const response = await api.post(`/users/${username}/follow`)
+    return response.data
+  },
+
+  async unfollowUser(username) {
+    const response = await api.delete(`/users/${username}/follow`)
     return response.data
   },
 
@@ -133,8 +202,15 @@ export default {
     return response.data
   },
 
-  async getMyPosts() {
-    const response = await api.get('/users/me/posts')
-    return response.data
+  async getMyPosts(cursor = null, limit = 20) {
+    const params = { limit }
+    if (cursor) {
+      params.cursor = cursor
+    }
+    const response = await api.get('/users/me/posts', { params })
+    return {
+      posts: response.data,
+      nextCursor: response.headers['x-next-cursor'] || null
+    }
   }
 }
\ No newline at end of file